@@ -1,7 +1,9 @@
+import json
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import UserProfile
-from simulation.models import Simulation, SimulationParameter, SimulationResult
+from simulation.models import Simulation, SimulationParameter, SimulationResult, SignalBand
+from simulation.raster import raster_to_json, legacy_points_requested
 
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -56,7 +58,9 @@ class SimulationParameterSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'simulation', 'technology', 'propagation_model', 'frequency',
             'bandwidth', 'antenna_height', 'antenna_power', 'terrain_type',
-            'location', 'radius', 'population_density', 'created_at', 'updated_at',
+            'location', 'radius', 'population_density', 'population_raster', 'clutter_raster',
+            'validity_fallback', 'evaluation_mode', 'grid_size', 'use_terrain', 'diffraction_method',
+            'created_at', 'updated_at',
             # Champs spécifiques 5G
             'scenario', 'los_condition', 'h_bs', 'h_ut', 'h', 'w'
         ]
@@ -93,14 +97,43 @@ class SimulationParameterSerializer(serializers.ModelSerializer):
         
         return data
 
+class SignalBandSerializer(serializers.ModelSerializer):
+    # Polygones de la classe en GeoJSON
+    geometry = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = SignalBand
+        exclude = ['id', 'result']
+    
+    def get_geometry(self, obj):
+        return json.loads(obj.geometry.geojson)
+
 class SimulationResultSerializer(serializers.ModelSerializer):
+    signal_bands = SignalBandSerializer(many=True, read_only=True)
+    # Raster compact : métadonnées + données encodées (en-tête et int16 compressés) en base64
+    signal_raster = serializers.SerializerMethodField()
+    # Dictionnaire "lon,lat" -> dBm : sur demande (?legacy=1), ou pour les anciens résultats sans raster
+    signal_strength_data = serializers.SerializerMethodField()
+    
     class Meta:
         model = SimulationResult
         fields = '__all__'
+    
+    def get_signal_raster(self, obj):
+        if not obj.signal_raster:
+            return None
+        return raster_to_json(obj.signal_raster)
+    
+    def get_signal_strength_data(self, obj):
+        request = self.context.get('request')
+        if obj.signal_raster and not (request is not None and legacy_points_requested(request.query_params)):
+            return None
+        return obj.signal_strength()
 
 class SimulationSerializer(serializers.ModelSerializer):
     parameters = SimulationParameterSerializer(many=True, read_only=True)
-    results = SimulationResultSerializer(many=True, read_only=True)
+    # Résultats propres et résultats du cache réutilisés par ses tâches
+    results = SimulationResultSerializer(many=True, read_only=True, source='all_results')
     
     class Meta:
         model = Simulation
@@ -12,6 +12,9 @@ from django.core.cache import cache
 
 from .models import UserProfile
 from simulation.models import Simulation, SimulationParameter
+from simulation.jobs import enqueue_simulation
+from simulation.views import check_grid_budget, job_to_json, job_url, job_status_code
+from simulation.propagation.kernels import compile_model
 from .serializers import UserSerializer, SimulationSerializer, SimulationParameterSerializer
 
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
@@ -235,21 +238,27 @@ class FiveGSimulationViewSet(viewsets.ViewSet):
                 simulation.delete()  # Supprimer la simulation en cas d'erreur
                 return Response(param_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
-            param_serializer.save()
+            # Budget de cellules de la grille et domaine de validité du modèle,
+            # vérifiés avant la mise en file (400 comme pour run_simulation)
+            candidate = SimulationParameter(**param_serializer.validated_data)
+            try:
+                check_grid_budget(candidate.radius, candidate.grid_size)
+                compile_model(candidate)
+            except ValueError as e:
+                simulation.delete()
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             
-            # Ici, vous pourriez appeler votre logique de simulation 5G
-            # Par exemple :
-            # from simulation.propagation_models_5g import FiveGPropagationModel
-            # model = FiveGPropagationModel(...)
-            # result = model.calculate_path_loss(...)
+            params = param_serializer.save()
+            
+            # Mise en file de la simulation : le calcul est fait par un worker,
+            # le client suit la tâche sur son URL de statut
+            job = enqueue_simulation(params)
             
-            # Pour l'instant, retourner une réponse de succès
             return Response({
-                'status': 'success',
-                'simulation_id': simulation.id,
-                'message': 'Simulation 5G démarrée avec succès',
+                **job_to_json(job, request),
+                'message': 'Simulation 5G mise en file',
                 'parameters': param_serializer.data
-            }, status=status.HTTP_201_CREATED)
+            }, status=job_status_code(job), headers={'Location': job_url(request, 'job_status', job.id)})
             
         except Exception as e:
             return Response(
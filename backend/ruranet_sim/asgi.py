@@ -3,6 +3,12 @@ ASGI config for ruranet_sim project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The live progress streams of the simulation jobs (/api/simulation/jobs/<id>/events/)
+are served without holding a thread per listener when the project runs under
+ASGI, e.g.:
+
+    gunicorn ruranet_sim.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 
@@ -154,9 +155,109 @@ STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Media files (fichiers des résultats de simulation)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Simulation engine
+# Nombre maximal de cellules de la grille d'une simulation (grid_size réglable)
+SIMULATION_MAX_GRID_CELLS = int(os.environ.get('SIMULATION_MAX_GRID_CELLS', 2_000_000))
+# Nombre maximal de combinaisons d'un balayage de paramètres (géométrie commune, résultats scalaires)
+SIMULATION_MAX_SWEEP_COMBINATIONS = int(os.environ.get('SIMULATION_MAX_SWEEP_COMBINATIONS', 500))
+# Lignes de la grille évaluées par bloc (la mémoire de travail dépend de ce bloc)
+SIMULATION_CHUNK_ROWS = int(os.environ.get('SIMULATION_CHUNK_ROWS', 256))
+# Processus de calcul d'une simulation, et taille de grille à partir de laquelle ils sont utilisés
+SIMULATION_WORKERS = int(os.environ.get('SIMULATION_WORKERS', os.cpu_count() or 1))
+SIMULATION_PARALLEL_MIN_CELLS = int(os.environ.get('SIMULATION_PARALLEL_MIN_CELLS', 250_000))
+# Tolérance de simplification des polygones de couverture, en cellules (0 : contours exacts des cellules)
+SIMULATION_CONTOUR_SIMPLIFY = float(os.environ.get('SIMULATION_CONTOUR_SIMPLIFY', 0.75))
+# Classes de signal calculées avec chaque résultat (polygones, surface et population par classe),
+# du meilleur au moins bon niveau : seuil bas en dBm par technologie ('default' pour les autres).
+# Remplaçable par un JSON de même structure dans SIMULATION_SIGNAL_BANDS.
+# Le seuil de la classe la plus basse est le seuil de couverture (-100 dBm) pour toutes les technologies.
+SIMULATION_SIGNAL_BANDS = {
+    'default': [
+        {'name': 'excellent', 'label': 'Excellent', 'min_signal': -70, 'color': '#4CAF50'},
+        {'name': 'good', 'label': 'Bon', 'min_signal': -85, 'color': '#8BC34A'},
+        {'name': 'fair', 'label': 'Moyen', 'min_signal': -100, 'color': '#FFC107'},
+    ],
+    # RSCP (UMTS)
+    '3G': [
+        {'name': 'excellent', 'label': 'Excellent', 'min_signal': -75, 'color': '#4CAF50'},
+        {'name': 'good', 'label': 'Bon', 'min_signal': -90, 'color': '#8BC34A'},
+        {'name': 'fair', 'label': 'Moyen', 'min_signal': -100, 'color': '#FFC107'},
+    ],
+    # RSRP (LTE) et SS-RSRP (NR)
+    '4G': [
+        {'name': 'excellent', 'label': 'Excellent', 'min_signal': -80, 'color': '#4CAF50'},
+        {'name': 'good', 'label': 'Bon', 'min_signal': -90, 'color': '#8BC34A'},
+        {'name': 'fair', 'label': 'Moyen', 'min_signal': -100, 'color': '#FFC107'},
+    ],
+    '5G': [
+        {'name': 'excellent', 'label': 'Excellent', 'min_signal': -80, 'color': '#4CAF50'},
+        {'name': 'good', 'label': 'Bon', 'min_signal': -90, 'color': '#8BC34A'},
+        {'name': 'fair', 'label': 'Moyen', 'min_signal': -100, 'color': '#FFC107'},
+    ],
+}
+if os.environ.get('SIMULATION_SIGNAL_BANDS'):
+    SIMULATION_SIGNAL_BANDS = json.loads(os.environ['SIMULATION_SIGNAL_BANDS'])
+# Répertoire des rasters de population (GeoTIFF, ou .npy + .json) et taille du cache de tuiles (Mo)
+SIMULATION_POPULATION_ROOT = os.environ.get('SIMULATION_POPULATION_ROOT', os.path.join(BASE_DIR, 'data', 'population'))
+SIMULATION_POPULATION_CACHE_MB = int(os.environ.get('SIMULATION_POPULATION_CACHE_MB', 256))
+# Répertoire des tuiles du modèle numérique de terrain (.hgt SRTM ou GeoTIFF) et taille du cache de tuiles (Mo)
+SIMULATION_DEM_ROOT = os.environ.get('SIMULATION_DEM_ROOT', os.path.join(BASE_DIR, 'data', 'dem'))
+SIMULATION_DEM_CACHE_MB = int(os.environ.get('SIMULATION_DEM_CACHE_MB', 512))
+# Répertoire des rasters d'occupation du sol (GeoTIFF, ou .npy + .json) et taille du cache de tuiles (Mo)
+SIMULATION_CLUTTER_ROOT = os.environ.get('SIMULATION_CLUTTER_ROOT', os.path.join(BASE_DIR, 'data', 'clutter'))
+SIMULATION_CLUTTER_CACHE_MB = int(os.environ.get('SIMULATION_CLUTTER_CACHE_MB', 128))
+# Type de zone Hata de chaque code d'occupation du sol (par défaut : classes ESA WorldCover).
+# Remplaçable par un JSON {code: type de zone} dans SIMULATION_CLUTTER_CLASSES.
+SIMULATION_CLUTTER_CLASSES = {
+    10: 'SUBURBAN',  # Forêt
+    20: 'RURAL',     # Arbustes
+    30: 'RURAL',     # Prairies
+    40: 'RURAL',     # Cultures
+    50: 'URBAN',     # Bâti
+    60: 'OPEN',      # Sol nu
+    70: 'OPEN',      # Neige et glace
+    80: 'OPEN',      # Eau
+    90: 'RURAL',     # Zones humides
+    95: 'SUBURBAN',  # Mangroves
+    100: 'OPEN',     # Mousses et lichens
+}
+if os.environ.get('SIMULATION_CLUTTER_CLASSES'):
+    SIMULATION_CLUTTER_CLASSES = json.loads(os.environ['SIMULATION_CLUTTER_CLASSES'])
+# Répertoire des rasters de résultats (fichiers .npy mappés en mémoire)
+SIMULATION_RESULTS_ROOT = os.environ.get('SIMULATION_RESULTS_ROOT', os.path.join(MEDIA_ROOT, 'results'))
+# Taille maximale (Mo) des résultats indexés pour être réutilisés par les simulations de mêmes paramètres
+# (les moins récemment utilisés sortent de l'index au-delà ; 0 désactive le cache). Ne borne pas le stockage :
+# un résultat sorti de l'index reste à ses simulations et n'est supprimé qu'avec elles.
+SIMULATION_RESULT_CACHE_MB = int(os.environ.get('SIMULATION_RESULT_CACHE_MB', 2048))
+# File des tâches de simulation : 'local://' (fils d'exécution du processus web),
+# 'sqlite:///chemin/relatif.sqlite3' ('sqlite:////' pour un chemin absolu) ou 'redis://hôte:6379/0'
+# (tâches exécutées par les processus « python manage.py simulation_worker »)
+SIMULATION_JOB_BROKER = os.environ.get('SIMULATION_JOB_BROKER', 'local://')
+# Fils d'exécution des tâches du broker local
+SIMULATION_JOB_THREADS = int(os.environ.get('SIMULATION_JOB_THREADS', 1))
+# Délai (s) après lequel une tâche prise par un worker arrêté est redistribuée (brokers SQLite et Redis ;
+# le bail est prolongé tant que la tâche progresse)
+SIMULATION_JOB_LEASE = int(os.environ.get('SIMULATION_JOB_LEASE', 3600))
+# Attente maximale (s) d'un export PDF identique en cours dans un autre processus
+SIMULATION_EXPORT_TIMEOUT = int(os.environ.get('SIMULATION_EXPORT_TIMEOUT', 300))
+
+# Cache partagé par les processus (verrous de calcul unique des simulations et exports) :
+# 'redis://hôte:6379/1' dans CACHE_URL, cache mémoire propre à chaque processus sinon
+if os.environ.get('CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_URL'],
+        }
+    }
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
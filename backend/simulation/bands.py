@@ -0,0 +1,55 @@
+"""
+Signal classes (excellent, good, fair...) of the coverage results.
+
+Bands are defined per technology in settings.SIMULATION_SIGNAL_BANDS, from
+the best to the worst, by their lower threshold in dBm: a cell belongs to
+the first band whose threshold it reaches, and to no band below the last
+threshold. Bands are computed once, when a result is written (band raster,
+one polygon set, area and population per band).
+"""
+import numpy as np
+
+# Band index of the cells without a value or below the last threshold
+NO_BAND = 0
+
+
+def signal_bands(technology):
+    """
+    Band definitions of a technology, best band first.
+
+    Returns:
+    - List of dicts with name, label, min_signal (dBm), max_signal (dBm,
+      None for the best band) and color
+    """
+    from django.conf import settings
+
+    definitions = settings.SIMULATION_SIGNAL_BANDS
+    bands = sorted(definitions.get(technology, definitions['default']),
+                   key=lambda band: band['min_signal'], reverse=True)
+
+    upper = None
+    result = []
+    for band in bands:
+        result.append({**band, 'min_signal': float(band['min_signal']), 'max_signal': upper})
+        upper = float(band['min_signal'])
+    return result
+
+
+def classify_bands(signal, thresholds):
+    """
+    Band of every cell.
+
+    Parameters:
+    - signal: Array of signal strengths in dBm (NaN for cells without value)
+    - thresholds: Lower thresholds of the bands in dBm, in decreasing order
+
+    Returns:
+    - uint8 array with the shape of signal: k for the k-th band (1 for the
+      best), NO_BAND for the cells below the last threshold or without value
+    """
+    thresholds = np.asarray(thresholds, dtype=float)
+    # Number of thresholds reached by every cell
+    reached = np.searchsorted(thresholds[::-1], signal, side='right')
+    bands = np.where(reached > 0, len(thresholds) + 1 - reached, NO_BAND)
+    bands[np.isnan(signal)] = NO_BAND
+    return bands.astype(np.uint8)
@@ -0,0 +1,178 @@
+"""
+Land-cover (clutter) rasters.
+
+A clutter raster gives the land-cover class code of every pixel of a
+north-up grid (GeoTIFF, or .npy + .json sidecar, see georaster). Codes are
+mapped to the area types of the Hata family (URBAN, SUBURBAN, RURAL, OPEN)
+by settings.SIMULATION_CLUTTER_CLASSES; unmapped codes and nodata pixels
+have no class.
+
+Rasters are registered by dropping them in settings.SIMULATION_CLUTTER_ROOT.
+Tiles are decoded once to uint8 area-type indices and kept in a process-wide
+TileCache, like the population and elevation tiles.
+"""
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from .georaster import GDALTiledRaster, NpyRaster, TiledRaster, list_rasters, raster_path
+from .propagation.okumura_hata import AREA_TYPES
+from .tilecache import TileCache
+
+# Area-type index of the pixels and cells without a class
+NO_CLASS = 255
+
+
+@lru_cache(maxsize=1)
+def _class_table(items):
+    codes = np.array([code for code, _ in items], dtype=float)
+    classes = np.array([AREA_TYPES.index(area_type) for _, area_type in items], dtype=np.uint8)
+    return codes, classes
+
+
+def clutter_classes():
+    """
+    Lookup table of the land-cover codes.
+
+    Returns:
+    - (codes, classes): sorted float array of codes and the index in
+      AREA_TYPES of every code
+    """
+    from django.conf import settings
+
+    mapping = {float(code): area_type for code, area_type in settings.SIMULATION_CLUTTER_CLASSES.items()}
+    for area_type in mapping.values():
+        if area_type not in AREA_TYPES:
+            raise ValueError(f"Type de zone invalide dans SIMULATION_CLUTTER_CLASSES: {area_type}")
+    return _class_table(tuple(sorted(mapping.items())))
+
+
+class ClutterRaster(TiledRaster):
+    """
+    North-up raster of land-cover codes, read as area-type indices.
+    """
+
+    def _decode(self, values):
+        codes, classes = clutter_classes()
+        values = np.asarray(values, dtype=float)
+        position = np.clip(np.searchsorted(codes, values), 0, len(codes) - 1)
+        mapped = codes[position] == values
+        # Nodata pixels have no class, even when their value is a mapped code
+        if self.nodata is not None:
+            mapped &= values != self.nodata
+        return np.where(mapped, classes[position], NO_CLASS).astype(np.uint8)
+
+    def tile_cache(self):
+        return get_clutter_tile_cache()
+
+    def cell_classes(self, grid, rows=slice(None), default=NO_CLASS):
+        """
+        Area-type index (in AREA_TYPES) of the cells of a LocalGrid (of the
+        given rows).
+
+        When the pixels are smaller than the cells, every cell takes the
+        majority class of the pixels whose centre it contains (ties go to
+        the densest area type). Otherwise the class is read at the cell
+        centre.
+
+        Parameters:
+        - grid: LocalGrid
+        - rows: Slice of rows (axis 0)
+        - default: Index of the cells without any classified pixel
+
+        Returns:
+        - uint8 array of shape (rows, grid.shape[1])
+        """
+        step = grid.cell_size * 1000  # m
+        x, y = grid.x[rows], grid.y
+        classes = np.full((len(x), len(y)), NO_CLASS, dtype=np.uint8)
+
+        if self.pixel_size() >= step:
+            row, col, inside = self.pixel_indices(*self.grid_centres(grid, rows))
+            if inside.any():
+                row, col = row[inside], col[inside]
+                row0, col0 = row.min(), col.min()
+                values = self.window(row0, row.max() + 1, col0, col.max() + 1)
+                classes[inside] = values[row - row0, col - col0]
+        else:
+            window = self._window_under(grid, x)
+            if window is not None:
+                values = self.window(*window)
+
+                # Majority vote: one bincount over (cell, class) pairs
+                pixel_rows, pixel_cols = np.nonzero(values != NO_CLASS)
+                i, j, inside = self.pixel_cells(grid, rows, window, pixel_rows, pixel_cols)
+                pairs = (i[inside] * len(y) + j[inside]) * len(AREA_TYPES) \
+                    + values[pixel_rows[inside], pixel_cols[inside]]
+                votes = np.bincount(pairs, minlength=classes.size * len(AREA_TYPES)).reshape(classes.size, -1)
+                voted = votes.any(axis=1)
+                classes.reshape(-1)[voted] = votes[voted].argmax(axis=1)
+
+        classes[classes == NO_CLASS] = default
+        return classes
+
+
+class NpyClutterRaster(NpyRaster, ClutterRaster):
+    """Binary land-cover grid (memory-mapped .npy array and .json sidecar)."""
+
+
+class GDALClutterRaster(GDALTiledRaster, ClutterRaster):
+    """Land-cover raster read by GDAL (first band of a GeoTIFF...)."""
+
+
+@lru_cache(maxsize=16)
+def _open_raster(path, mtime_ns):
+    if path.endswith('.npy'):
+        return NpyClutterRaster(path)
+    return GDALClutterRaster(path)
+
+
+def clutter_raster_path(name):
+    """Path of a registered clutter raster (file name in SIMULATION_CLUTTER_ROOT)."""
+    from django.conf import settings
+
+    return raster_path(settings.SIMULATION_CLUTTER_ROOT, name, "d'occupation du sol")
+
+
+def open_clutter_raster(name):
+    """
+    Registered clutter raster; opened rasters are reused until their file
+    changes.
+    """
+    path = clutter_raster_path(name)
+    return _open_raster(path, os.stat(path).st_mtime_ns)
+
+
+def list_clutter_rasters():
+    """File names of the registered clutter rasters."""
+    from django.conf import settings
+
+    return list_rasters(settings.SIMULATION_CLUTTER_ROOT)
+
+
+# Propagation models without area types, which do not use the clutter rasters
+CLUTTER_UNUSED_MODELS = ('3GPP_TR_38901',)
+
+
+def clutter_warning(propagation_model):
+    """
+    Warning returned with the results of a run given a clutter raster that
+    its propagation model does not use, or None.
+    """
+    if propagation_model in CLUTTER_UNUSED_MODELS:
+        return (f"Le raster d'occupation du sol n'est pas utilisé par le modèle {propagation_model} : "
+                "le même scénario s'applique à toutes les cellules")
+    return None
+
+
+_tile_cache = None
+
+
+def get_clutter_tile_cache():
+    """Process-wide tile cache of the clutter rasters."""
+    global _tile_cache
+    if _tile_cache is None:
+        from django.conf import settings
+        _tile_cache = TileCache(settings.SIMULATION_CLUTTER_CACHE_MB * 1024 * 1024)
+    return _tile_cache
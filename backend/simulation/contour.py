@@ -0,0 +1,227 @@
+"""
+Coverage polygons traced from the signal raster.
+
+Instead of one square per covered cell, the boundary of the covered mask is
+followed along the cell edges and closed into rings (outer rings
+counter-clockwise, holes clockwise, in cell-corner coordinates). Vertices
+between two collinear edges are dropped, and every polygon can then be
+simplified, so a coverage area becomes a handful of polygons with holes.
+"""
+import numpy as np
+
+# Unit step of the four edge directions: +x, +y, -x, -y
+_STEPS = np.array([[1, 0], [0, 1], [-1, 0], [0, -1]])
+
+
+def boundary_edges(mask):
+    """
+    Directed boundary edges of the True cells of a 2-D mask.
+
+    Cell (i, j) spans the corners (i, j) to (i + 1, j + 1); edges are
+    oriented with the True cell on their left.
+
+    Returns:
+    - (start, direction): (E, 2) corner coordinates of the edge origins and
+      (E,) direction indices into _STEPS
+    """
+    padded = np.pad(np.asarray(mask, dtype=bool), 1)
+    inner = padded[1:-1, 1:-1]
+
+    starts, directions = [], []
+    # (side, neighbour across that side, offset of the edge origin)
+    sides = [
+        (0, padded[1:-1, :-2], (0, 0)),  # south side, going east
+        (1, padded[2:, 1:-1], (1, 0)),   # east side, going north
+        (2, padded[1:-1, 2:], (1, 1)),   # north side, going west
+        (3, padded[:-2, 1:-1], (0, 1)),  # west side, going south
+    ]
+    for direction, neighbour, offset in sides:
+        i, j = np.nonzero(inner & ~neighbour)
+        starts.append(np.stack([i + offset[0], j + offset[1]], axis=1))
+        directions.append(np.full(len(i), direction))
+
+    return np.concatenate(starts), np.concatenate(directions)
+
+
+def _trace(mask):
+    """
+    Follow the boundary edges of a mask into closed rings.
+
+    Returns:
+    - (vertices, counts, areas, cells): ring corners concatenated ring by
+      ring, number of corners and signed area of every ring, and (R, 2)
+      index of a True cell lying on the left of every ring
+    """
+    start, direction = boundary_edges(mask)
+    if not len(direction):
+        return np.empty((0, 2), dtype=int), np.empty(0, dtype=int), np.empty(0), np.empty((0, 2), dtype=int)
+
+    # Successor of every edge: the edge leaving its end corner
+    end = start + _STEPS[direction]
+    stride = mask.shape[1] + 1
+    start_id = start[:, 0] * stride + start[:, 1]
+    end_id = end[:, 0] * stride + end[:, 1]
+
+    order = np.argsort(start_id, kind='stable')
+    first = np.searchsorted(start_id[order], end_id, side='left')
+    count = np.searchsorted(start_id[order], end_id, side='right') - first
+    following = order[first]
+
+    # Corners shared by two diagonal cells have two leaving edges (a left
+    # and a right turn): turning left keeps cells that only touch by a
+    # corner in separate polygons
+    other = order[np.minimum(first + 1, len(order) - 1)]
+    left_turn = (direction[other] - direction) % 4 == 1
+    following = np.where((count == 2) & left_turn, other, following).tolist()
+
+    # Edges ring by ring
+    sequence, bounds = [], [0]
+    visited = bytearray(len(following))
+    for edge in range(len(following)):
+        if visited[edge]:
+            continue
+        while not visited[edge]:
+            visited[edge] = 1
+            sequence.append(edge)
+            edge = following[edge]
+        bounds.append(len(sequence))
+    sequence = np.array(sequence)
+    ring_starts = np.array(bounds[:-1])
+    ring_ends = np.array(bounds[1:])
+
+    # Only the corners where the direction changes are kept
+    previous = np.roll(sequence, 1)
+    previous[ring_starts] = sequence[ring_ends - 1]
+    turns = direction[sequence] != direction[previous]
+    counts = np.add.reduceat(turns.astype(int), ring_starts)
+    vertices = start[sequence[turns]]
+
+    # Signed areas (shoelace formula), ring by ring
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    following_vertex = np.arange(1, len(vertices) + 1)
+    following_vertex[offsets[1:] - 1] = offsets[:-1]
+    x, y = vertices[:, 0], vertices[:, 1]
+    cross = x * y[following_vertex] - x[following_vertex] * y
+    areas = 0.5 * np.add.reduceat(cross, offsets[:-1])
+
+    # Cell on the left of the first edge of every ring
+    first_edges = sequence[ring_starts]
+    steps = _STEPS[direction[first_edges]]
+    left = np.stack([-steps[:, 1], steps[:, 0]], axis=1)
+    cells = (2 * start[first_edges] + steps + left) // 2
+
+    return vertices, counts, areas, cells
+
+
+def trace_rings(mask):
+    """
+    Closed boundary rings of the True cells of a mask.
+
+    Returns:
+    - List of (n, 2) integer arrays of corner coordinates (ring not
+      repeated at the end), counter-clockwise for outer boundaries and
+      clockwise for holes
+    """
+    vertices, counts, _, _ = _trace(mask)
+    return np.split(vertices, np.cumsum(counts)[:-1]) if len(counts) else []
+
+
+def ring_area(ring):
+    """Signed area of a ring (shoelace formula), positive if counter-clockwise."""
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def label_components(mask):
+    """
+    Label the 4-connected components of a mask.
+
+    Returns:
+    - Integer array with the shape of mask: for True cells, the flat index
+      of the smallest cell of their component (undefined elsewhere)
+    """
+    index = np.arange(mask.size).reshape(mask.shape)
+    vertical = mask[:-1, :] & mask[1:, :]
+    horizontal = mask[:, :-1] & mask[:, 1:]
+    a = np.concatenate([index[:-1, :][vertical], index[:, :-1][horizontal]])
+    b = np.concatenate([index[1:, :][vertical], index[:, 1:][horizontal]])
+
+    # Union-find by hooking roots onto the smallest neighbouring root, then
+    # path compression, until every pair of neighbours shares its root
+    parent = index.ravel().copy()
+    while True:
+        root_a, root_b = parent[a], parent[b]
+        differ = root_a != root_b
+        if not differ.any():
+            break
+        np.minimum.at(parent, np.maximum(root_a, root_b)[differ], np.minimum(root_a, root_b)[differ])
+        while True:
+            compressed = parent[parent]
+            if np.array_equal(compressed, parent):
+                break
+            parent = compressed
+    return parent.reshape(mask.shape)
+
+
+def mask_polygons(mask):
+    """
+    Polygons with holes covering the True cells of a mask.
+
+    Returns:
+    - List of (shell, holes): shell an (n, 2) array and holes a list of
+      (m, 2) arrays of corner coordinates
+    """
+    mask = np.asarray(mask, dtype=bool)
+    vertices, counts, areas, cells = _trace(mask)
+    if not len(counts):
+        return []
+    rings = np.split(vertices, np.cumsum(counts)[:-1])
+
+    # Every component has one outer ring (counter-clockwise) and one ring
+    # per hole; a ring belongs to the component of the cell on its left
+    components = label_components(mask)[cells[:, 0], cells[:, 1]]
+    shells = np.nonzero(areas > 0)[0]
+    polygons = {components[k]: (rings[k], []) for k in shells}
+    for k in np.nonzero(areas < 0)[0]:
+        polygons[components[k]][1].append(rings[k])
+    return list(polygons.values())
+
+
+def coverage_multipolygon(mask, grid, simplify=0.0):
+    """
+    GEOS MultiPolygon (WGS84) of the True cells of a mask laid out on a grid.
+
+    Parameters:
+    - mask: 2-D boolean array with the shape of the grid
+    - grid: LocalGrid
+    - simplify: Topology-preserving simplification tolerance in cells (0 to
+      keep the exact cell outlines)
+
+    Returns:
+    - MultiPolygon
+    """
+    from django.contrib.gis.geos import MultiPolygon, Polygon
+
+    step = grid.cell_size * 1000  # m
+
+    def local(ring):
+        # Cell corners in the local frame, ring closed
+        corners = np.vstack([ring, ring[:1]]) - 0.5
+        return list(zip(grid.x[0] + corners[:, 0] * step, grid.y[0] + corners[:, 1] * step))
+
+    polygons = []
+    for shell, holes in mask_polygons(mask):
+        polygon = Polygon(local(shell), *[local(hole) for hole in holes])
+        if simplify:
+            polygon = polygon.simplify(simplify * step, preserve_topology=True)
+        if polygon.empty:
+            continue
+
+        # Back to WGS84, ring by ring
+        rings = []
+        for ring in [polygon.exterior_ring, *polygon[1:]]:
+            x, y = np.array(ring.coords).T
+            rings.append(list(zip(*grid.to_wgs84(x, y))))
+        polygons.append(Polygon(*rings))
+
+    return MultiPolygon(polygons)
@@ -0,0 +1,233 @@
+"""
+Digital elevation model.
+
+Elevation tiles are read from a local directory (settings.SIMULATION_DEM_ROOT):
+- SRTM-style ``.hgt`` tiles (N45E002.hgt...): 1 x 1 degree, big-endian
+  int16 heights in m, 1201 x 1201 (3") or 3601 x 3601 (1") samples whose
+  first row is the northern edge and first column the western edge,
+  -32768 for voids;
+- GeoTIFF tiles in geographic coordinates (WGS84 lon/lat), read through
+  GDALRaster (first band).
+
+Decoded tiles are kept as float32 arrays (NaN for voids) in a size-bounded
+LRU TileCache shared by every request of the worker process, and heights
+are interpolated bilinearly for whole arrays of points at once.
+"""
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from .tilecache import TileCache
+
+HGT_NAME = re.compile(r'^([NS])(\d{2})([EW])(\d{3})\.hgt$', re.IGNORECASE)
+HGT_VOID = -32768
+
+GEOTIFF_EXTENSIONS = ('.tif', '.tiff')
+
+
+class DemTile:
+    """
+    Description of an elevation tile: file, pixel-centre lattice and
+    bounds (no data is read).
+
+    Sample (row, col) lies at (lon0 + col * dlon, lat0 + row * dlat).
+    """
+
+    def __init__(self, path, lon0, lat0, dlon, dlat, shape):
+        self.path = path
+        stat = os.stat(path)
+        self.key = (path, stat.st_mtime_ns, stat.st_size)
+        self.lon0, self.lat0 = float(lon0), float(lat0)
+        self.dlon, self.dlat = float(dlon), float(dlat)
+        self.shape = tuple(int(n) for n in shape)  # (rows, cols)
+
+    @property
+    def bounds(self):
+        """(west, south, east, north) of the sample lattice."""
+        lon1 = self.lon0 + (self.shape[1] - 1) * self.dlon
+        lat1 = self.lat0 + (self.shape[0] - 1) * self.dlat
+        return min(self.lon0, lon1), min(self.lat0, lat1), max(self.lon0, lon1), max(self.lat0, lat1)
+
+    def contains(self, lons, lats):
+        west, south, east, north = self.bounds
+        return (lons >= west) & (lons <= east) & (lats >= south) & (lats <= north)
+
+    def read(self):
+        """Heights in m as a float32 array (NaN for voids)."""
+        raise NotImplementedError
+
+
+class HgtTile(DemTile):
+
+    def __init__(self, path):
+        match = HGT_NAME.match(os.path.basename(path))
+        if match is None:
+            raise ValueError(f"Not an SRTM tile name: {path}")
+        lat = int(match.group(2)) * (1 if match.group(1).upper() == 'N' else -1)
+        lon = int(match.group(4)) * (1 if match.group(3).upper() == 'E' else -1)
+
+        samples = int(round(np.sqrt(os.path.getsize(path) / 2)))
+        if samples * samples * 2 != os.path.getsize(path):
+            raise ValueError(f"Invalid SRTM tile size: {path}")
+        step = 1.0 / (samples - 1)
+        super().__init__(path, lon, lat + 1, step, -step, (samples, samples))
+
+    def read(self):
+        heights = np.fromfile(self.path, dtype='>i2').reshape(self.shape)
+        values = heights.astype(np.float32)
+        values[heights == HGT_VOID] = np.nan
+        return values
+
+
+class GeoTiffTile(DemTile):
+
+    def __init__(self, path):
+        from django.contrib.gis.gdal import GDALRaster
+
+        raster = GDALRaster(path)
+        if raster.srs is None or not raster.srs.geographic:
+            raise ValueError(f"Elevation tiles must be in geographic coordinates: {path}")
+        x0, dx, rx, y0, ry, dy = raster.geotransform
+        if rx or ry:
+            raise ValueError(f"Rotated elevation tiles are not supported: {path}")
+        self.nodata = raster.bands[0].nodata_value
+        # Pixel centres (the geotransform gives the corner of the first pixel)
+        super().__init__(path, x0 + dx / 2, y0 + dy / 2, dx, dy, (raster.height, raster.width))
+
+    def read(self):
+        from django.contrib.gis.gdal import GDALRaster
+
+        values = np.array(GDALRaster(self.path).bands[0].data(), dtype=np.float32).reshape(self.shape)
+        if self.nodata is not None:
+            values[values == self.nodata] = np.nan
+        return values
+
+
+class ElevationModel:
+    """
+    Elevation tiles of a directory, queried by arrays of points.
+    """
+
+    def __init__(self, root, cache):
+        self.root = os.fspath(root)
+        self.cache = cache
+        self.tiles = []
+        # Tiles overlapping every 1 x 1 degree cell, by (floor(lat), floor(lon))
+        self._index = {}
+
+        for name in dem_files(self.root):
+            path = os.path.join(self.root, name)
+            tile = HgtTile(path) if HGT_NAME.match(name) else GeoTiffTile(path)
+            self.tiles.append(tile)
+            west, south, east, north = tile.bounds
+            for lat in range(int(np.floor(south)), int(np.floor(north)) + 1):
+                for lon in range(int(np.floor(west)), int(np.floor(east)) + 1):
+                    self._index.setdefault((lat, lon), []).append(tile)
+
+    def tile_heights(self, tile):
+        """Decoded heights of a tile, from the tile cache."""
+        return self.cache.get(tile.key, tile.read)
+
+    def heights(self, lons, lats):
+        """
+        Terrain heights in m at WGS84 points, interpolated bilinearly
+        between the four surrounding samples (void samples are left out
+        of the interpolation).
+
+        Parameters:
+        - lons, lats: Arrays of coordinates (broadcast together)
+
+        Returns:
+        - Array of heights, NaN where no tile covers the point
+        """
+        lons, lats = np.broadcast_arrays(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        heights = np.full(lons.shape, np.nan)
+        flat_lons, flat_lats = lons.ravel(), lats.ravel()
+        flat_heights = heights.reshape(-1)
+
+        # Points grouped by 1 x 1 degree cell
+        valid = np.isfinite(flat_lons) & np.isfinite(flat_lats)
+        cells = np.full(flat_lons.shape, -1, dtype=np.int64)
+        cells[valid] = ((np.floor(flat_lats[valid]).astype(np.int64) + 90) * 360
+                        + np.floor(flat_lons[valid]).astype(np.int64) + 180)
+        order = np.argsort(cells, kind='stable')
+        keys, starts = np.unique(cells[order], return_index=True)
+        stops = np.append(starts[1:], len(order))
+
+        for key, start, stop in zip(keys.tolist(), starts, stops):
+            points = order[start:stop]
+            lat, lon = divmod(key, 360)
+            for tile in self._index.get((lat - 90, lon - 180), []):
+                inside = tile.contains(flat_lons[points], flat_lats[points]) & np.isnan(flat_heights[points])
+                if inside.any():
+                    selected = points[inside]
+                    flat_heights[selected] = self._interpolate(tile, flat_lons[selected], flat_lats[selected])
+        return heights
+
+    def _interpolate(self, tile, lons, lats):
+        values = self.tile_heights(tile)
+        row = (lats - tile.lat0) / tile.dlat
+        col = (lons - tile.lon0) / tile.dlon
+        r = np.clip(np.floor(row).astype(np.int64), 0, tile.shape[0] - 2)
+        c = np.clip(np.floor(col).astype(np.int64), 0, tile.shape[1] - 2)
+        fr = np.clip(row - r, 0, 1)
+        fc = np.clip(col - c, 0, 1)
+
+        corners = np.stack([values[r, c], values[r, c + 1], values[r + 1, c], values[r + 1, c + 1]])
+        weights = np.stack([(1 - fr) * (1 - fc), (1 - fr) * fc, fr * (1 - fc), fr * fc])
+        # Void samples are left out, the weights of the others renormalised
+        weights = np.where(np.isnan(corners), 0, weights)
+        total = weights.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            heights = np.nansum(corners * weights, axis=0) / total
+            # Point on a void sample: mean of the valid surrounding samples
+            on_void = total == 0
+            if on_void.any():
+                heights[on_void] = np.nanmean(corners[:, on_void], axis=0)
+        return heights
+
+    def grid_heights(self, grid, rows=slice(None)):
+        """
+        Terrain heights in m at the cell centres of a LocalGrid (of the
+        given rows), array of shape (rows, grid.shape[1]).
+        """
+        i = np.arange(grid.shape[0])[rows]
+        cell_i, cell_j = np.meshgrid(i, np.arange(grid.shape[1]), indexing='ij')
+        return self.heights(*grid.lonlat(cell_i, cell_j))
+
+
+def dem_files(root):
+    """Names of the elevation tiles of a directory, sorted."""
+    names = sorted(os.listdir(root)) if os.path.isdir(root) else []
+    return [name for name in names if HGT_NAME.match(name) or name.lower().endswith(GEOTIFF_EXTENSIONS)]
+
+
+def dem_signature(root):
+    """
+    Name, modification time and size of every elevation tile of a
+    directory: changes when a tile is added, removed or rewritten in place.
+    """
+    signature = []
+    for name in dem_files(root):
+        stat = os.stat(os.path.join(root, name))
+        signature.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+@lru_cache(maxsize=1)
+def _elevation_model(root, cache_bytes, signature):
+    return ElevationModel(root, TileCache(cache_bytes))
+
+
+def get_elevation_model():
+    """
+    ElevationModel of settings.SIMULATION_DEM_ROOT, shared by the requests
+    of the process (rebuilt, with an empty cache, when a tile is added,
+    removed or rewritten).
+    """
+    from django.conf import settings
+
+    root = settings.SIMULATION_DEM_ROOT
+    return _elevation_model(root, settings.SIMULATION_DEM_CACHE_MB * 1024 * 1024, dem_signature(root))
@@ -0,0 +1,253 @@
+"""
+Knife-edge diffraction loss along the terrain profiles of a grid.
+
+The obstacles of every path (antenna to cell) are taken on the radial
+profiles of simulation.terrain: the path to a cell is the prefix of its
+radial up to the nearest sample of the cell. The dominant obstacle of a
+path is the sample with the largest Fresnel-Kirchhoff parameter v, and the
+secondary obstacles are searched on the two sub-paths on each side of it;
+losses are computed with the ITU-R P.526 approximation of the single
+knife-edge loss J(v), combined by the Deygout construction (limited to
+three edges) or the Epstein-Peterson method. Only the edges that rise
+above the line of sight are charged: flat or gently rolling ground costs
+nothing beyond the propagation model.
+
+Obstacle searches run on batches of paths as (paths x samples) arrays. The
+sub-path between the antenna and a dominant obstacle is a radial prefix
+shared by every cell behind that obstacle: its result is computed once per
+(radial, obstacle) and cached.
+"""
+import numpy as np
+
+SPEED_OF_LIGHT = 299792458.0  # m/s
+
+DIFFRACTION_NONE = 'NONE'
+DIFFRACTION_DEYGOUT = 'DEYGOUT'
+DIFFRACTION_EPSTEIN_PETERSON = 'EPSTEIN_PETERSON'
+
+DIFFRACTION_METHODS = (DIFFRACTION_NONE, DIFFRACTION_DEYGOUT, DIFFRACTION_EPSTEIN_PETERSON)
+
+# Fresnel parameter below which an edge causes no loss (ITU-R P.526)
+MIN_FRESNEL_PARAMETER = -0.78
+
+# Fresnel parameter above which an edge is charged: only edges above the
+# line of sight (v > 0). Ground inside the first Fresnel zone is left to the
+# propagation models, whose laws already include smooth-ground losses
+OBSTRUCTION_FRESNEL_PARAMETER = 0.0
+
+# Profile samples searched at once (paths x samples)
+SEARCH_BATCH = 1 << 20
+
+
+def knife_edge_loss(v):
+    """
+    ITU-R P.526 approximation of the single knife-edge diffraction loss.
+
+    Parameters:
+    - v: Array of Fresnel-Kirchhoff parameters (-inf/NaN for no edge)
+
+    Returns:
+    - Loss J(v) in dB, 0 for v <= -0.78
+    """
+    v = np.asarray(v, dtype=float)
+    loss = np.zeros(v.shape)
+    edge = v > MIN_FRESNEL_PARAMETER
+    w = v[edge] - 0.1
+    loss[edge] = 6.9 + 20 * np.log10(np.sqrt(w * w + 1) + w)
+    return loss
+
+
+def line_of_sight_only(loss, line_of_sight):
+    """
+    Diffraction loss kept on the line-of-sight cells only, for the models
+    whose NLOS law already accounts for the obstruction (3GPP TR 38.901).
+
+    Parameters:
+    - loss: Per-cell diffraction loss in dB
+    - line_of_sight: Per-cell line of sight of the same shape (0: NLOS)
+
+    Returns:
+    - Loss in dB, 0 on the NLOS cells
+    """
+    return np.where(line_of_sight == 0, 0.0, loss)
+
+
+class ProfileDiffraction:
+    """
+    Knife-edge diffraction losses of the cells of a grid, from its
+    RadialProfiles.
+
+    Profile samples are numbered from the antenna: sample 0 is the antenna
+    (at the site height), sample s + 1 the radial sample s of the profiles.
+    """
+
+    def __init__(self, profiles, frequency, mobile_height=1.5):
+        """
+        Parameters:
+        - profiles: RadialProfiles of the grid
+        - frequency: Carrier frequency in MHz
+        - mobile_height: Mobile antenna height above the ground in m
+        """
+        self.profiles = profiles
+        self.wavelength = SPEED_OF_LIGHT / (frequency * 1e6)
+        self.mobile_height = float(mobile_height)
+        self.distances = np.concatenate([[0.0], profiles.distances]).astype(np.float32)
+        self.heights = np.empty((len(profiles.angles), len(self.distances)), dtype=np.float32)
+        self.heights[:, 0] = profiles.site_height
+        self.heights[:, 1:] = profiles.terrain
+        # Antenna-side sub-paths by (radial, dominant obstacle): edge and v,
+        # -2 for the sub-paths not computed yet
+        self._prefix_edges = np.full(self.heights.shape, -2, dtype=np.int32)
+        self._prefix_fresnel = np.full(self.heights.shape, -np.inf, dtype=np.float32)
+
+    def dominant_edges(self, rays, starts, start_heights, stops, stop_heights):
+        """
+        Obstacle with the largest Fresnel parameter between two points of
+        the same radials, for a batch of sub-paths.
+
+        Parameters:
+        - rays: (n,) radial of every sub-path
+        - starts, stops: (n,) end samples of the sub-paths (starts < stops)
+        - start_heights, stop_heights: (n,) heights of the end points in m
+
+        Returns:
+        - (edges, v): sample of the dominant obstacle (-1 if the sub-path
+          has no sample in between, or none with known terrain) and its
+          Fresnel parameter (-inf without obstacle)
+        """
+        count = len(rays)
+        edges = np.full(count, -1, dtype=np.int64)
+        fresnel = np.full(count, -np.inf)
+        lengths = stops - starts - 1
+
+        # Longest sub-paths first, so that a batch is hardly wider than its paths
+        order = np.argsort(-lengths, kind='stable')
+        order = order[lengths[order] > 0]
+        position = 0
+        while position < len(order):
+            width = int(lengths[order[position]])
+            batch = order[position:position + max(1, SEARCH_BATCH // width)]
+            position += len(batch)
+
+            offsets = np.arange(1, width + 1)
+            samples = np.minimum(starts[batch, None] + offsets, stops[batch, None] - 1)
+            d0 = self.distances[starts[batch]]
+            span = self.distances[stops[batch]] - d0
+            d1 = self.distances[samples] - d0[:, None]
+            h0 = start_heights[batch].astype(np.float32)
+            slope = ((stop_heights[batch] - h0) / span).astype(np.float32)
+
+            # v = height above the line * sqrt(2 span / (wavelength d1 d2)):
+            # the factor only depending on the sub-path is applied to the maximum
+            terrain = self.heights.ravel()[rays[batch, None] * self.heights.shape[1] + samples]
+            v = (terrain - h0[:, None] - slope[:, None] * d1) / np.sqrt(d1 * (span[:, None] - d1))
+            v[(offsets > lengths[batch, None]) | np.isnan(v)] = -np.inf
+            best = np.argmax(v, axis=1)
+            best_v = v[np.arange(len(batch)), best] * np.sqrt(2 * span / self.wavelength)
+            found = np.isfinite(best_v)
+            edges[batch[found]] = samples[found, best[found]]
+            fresnel[batch[found]] = best_v[found]
+        return edges, fresnel
+
+    def antenna_side(self, rays, edges):
+        """
+        Dominant obstacle between the antenna and obstacles of the radials,
+        cached by (radial, obstacle).
+
+        Returns:
+        - (edges, v) as dominant_edges()
+        """
+        missing = self._prefix_edges[rays, edges] == -2
+        if missing.any():
+            keys = np.unique(rays[missing] * self.heights.shape[1] + edges[missing])
+            missing_rays, missing_edges = np.divmod(keys, self.heights.shape[1])
+            found, v = self.dominant_edges(
+                missing_rays, np.zeros_like(missing_edges), self.heights[missing_rays, 0],
+                missing_edges, self.heights[missing_rays, missing_edges]
+            )
+            self._prefix_edges[missing_rays, missing_edges] = found
+            self._prefix_fresnel[missing_rays, missing_edges] = v
+        return self._prefix_edges[rays, edges].astype(np.int64), self._prefix_fresnel[rays, edges].astype(float)
+
+    def fresnel_parameter(self, rays, edges, starts, start_heights, stops, stop_heights):
+        """Fresnel parameter of given obstacles between two points of their radials."""
+        d0 = self.distances[starts]
+        span = self.distances[stops] - d0
+        d1 = self.distances[edges] - d0
+        line = start_heights + (stop_heights - start_heights) * d1 / span
+        return (self.heights[rays, edges] - line) * np.sqrt(2 * span / (self.wavelength * d1 * (span - d1)))
+
+    def path_loss(self, rays, samples, method=DIFFRACTION_DEYGOUT):
+        """
+        Diffraction loss of the paths from the antenna to profile samples.
+
+        Parameters:
+        - rays, samples: (n,) radial and sample (>= 1) of the receivers
+        - method: DIFFRACTION_DEYGOUT or DIFFRACTION_EPSTEIN_PETERSON
+
+        Returns:
+        - (n,) loss in dB, 0 without obstacle or where the terrain under the
+          receiver is unknown
+        """
+        if method not in (DIFFRACTION_DEYGOUT, DIFFRACTION_EPSTEIN_PETERSON):
+            raise ValueError(f"Invalid diffraction method: {method}")
+
+        site = self.heights[rays, 0].astype(float)
+        receiver = self.heights[rays, samples] + self.mobile_height
+        loss = np.zeros(len(rays))
+
+        # Dominant obstacle of every path, charged only if it obstructs the
+        # line of sight (secondary obstacles only behind such an edge)
+        main, vp = self.dominant_edges(rays, np.zeros_like(samples), site, samples, receiver)
+        obstructed = np.flatnonzero((vp > OBSTRUCTION_FRESNEL_PARAMETER) & np.isfinite(receiver))
+        if not obstructed.size:
+            return loss
+
+        rays, samples, main = rays[obstructed], samples[obstructed], main[obstructed]
+        site, receiver, vp = site[obstructed], receiver[obstructed], vp[obstructed]
+        main_height = self.heights[rays, main].astype(float)
+
+        # Antenna side: radial prefix shared by every cell behind the edge
+        transmitter_edge, vt = self.antenna_side(rays, main)
+        # Receiver side
+        receiver_edge, vr = self.dominant_edges(rays, main, main_height, samples, receiver)
+        vt = np.where(vt > OBSTRUCTION_FRESNEL_PARAMETER, vt, -np.inf)
+        vr = np.where(vr > OBSTRUCTION_FRESNEL_PARAMETER, vr, -np.inf)
+
+        if method == DIFFRACTION_DEYGOUT:
+            # ITU-R P.526: L = J(vp) + T [J(vt) + J(vr) + C], with the empirical
+            # correction C only when a secondary edge obstructs a sub-path
+            main_loss = knife_edge_loss(vp)
+            taper = 1 - np.exp(-main_loss / 6)
+            secondary = knife_edge_loss(vt) + knife_edge_loss(vr)
+            path_km = self.distances[samples] / 1000
+            correction = np.where(np.isfinite(vt) | np.isfinite(vr), 8.0 + 0.04 * path_km, 0.0)
+            loss[obstructed] = main_loss + taper * (secondary + correction)
+        else:
+            # Epstein-Peterson: every edge seen from its neighbouring edges
+            has_t, has_r = np.isfinite(vt), np.isfinite(vr)
+            starts = np.where(has_t, transmitter_edge, 0)
+            stops = np.where(has_r, receiver_edge, samples)
+            start_heights = np.where(has_t, self.heights[rays, np.maximum(transmitter_edge, 0)], site)
+            stop_heights = np.where(has_r, self.heights[rays, np.maximum(receiver_edge, 0)], receiver)
+            vm = self.fresnel_parameter(rays, main, starts, start_heights, stops, stop_heights)
+            loss[obstructed] = knife_edge_loss(vt) + knife_edge_loss(vm) + knife_edge_loss(vr)
+        return loss
+
+    def cell_loss(self, method=DIFFRACTION_DEYGOUT, rows=slice(None)):
+        """
+        Diffraction loss in dB of the grid cells (of the given rows), from
+        the nearest radial sample of every cell; 0 for the antenna cell.
+        """
+        ray, sample, distance = self.profiles.cell_samples(rows)
+        grid = self.profiles.grid
+        cells = (distance > 0) & (distance <= grid.radius * 1000)
+
+        # Cells sharing their nearest radial sample are computed once
+        keys = ray[cells] * self.heights.shape[1] + sample[cells] + 1
+        unique, inverse = np.unique(keys, return_inverse=True)
+        unique_rays, unique_samples = np.divmod(unique, self.heights.shape[1])
+
+        loss = np.zeros(distance.shape, dtype=np.float32)
+        loss[cells] = self.path_loss(unique_rays, unique_samples, method)[inverse]
+        return loss
@@ -0,0 +1,504 @@
+"""
+Grid evaluation helpers for the propagation models.
+
+The propagation models declare their validity domain (``VALIDITY_DOMAIN``);
+the engine turns it into a boolean mask over the whole grid up front and
+applies the configured fallback to the cells outside of it, instead of
+letting every out-of-range cell raise and catch a ValueError.
+"""
+import numpy as np
+
+from .propagation.kernels import evaluate_kernels
+from .propagation_models_5g import PropagationModel5G
+
+# Fallback policies for cells outside the model validity domain
+FALLBACK_SKIP = 'SKIP'
+FALLBACK_CLAMP = 'CLAMP'
+FALLBACK_FREE_SPACE = 'FREE_SPACE'
+
+FALLBACK_POLICIES = (FALLBACK_SKIP, FALLBACK_CLAMP, FALLBACK_FREE_SPACE)
+
+# Evaluation modes of a grid
+EVALUATION_GRID = 'GRID'
+EVALUATION_RADIAL = 'RADIAL'
+EVALUATION_ADAPTIVE = 'ADAPTIVE'
+
+# Adaptive refinement: initial quad size in cells and maximum corner spread
+# in dB of a quad filled by interpolation
+ADAPTIVE_COARSE_STEP = 16
+ADAPTIVE_MAX_DELTA = 3.0
+
+
+def validity_mask(distances, distance_range):
+    """
+    Boolean mask of the cells whose distance lies inside the model domain.
+
+    Parameters:
+    - distances: Array of distances (same unit as distance_range)
+    - distance_range: (min, max) valid distance of the model
+
+    Returns:
+    - Boolean array with the shape of distances
+    """
+    min_distance, max_distance = distance_range
+    return (distances >= min_distance) & (distances <= max_distance)
+
+
+def evaluate_path_loss(path_loss_func, distances, distance_range, frequency, fallback=FALLBACK_SKIP):
+    """
+    Evaluate a vectorised path-loss function over an array of distances.
+
+    Parameters:
+    - path_loss_func: Callable taking an array of distances in km and
+      returning an array of path losses in dB
+    - distances: Array of distances in km
+    - distance_range: (min, max) valid distance of the model in km
+    - frequency: Carrier frequency in MHz (used by the free-space fallback)
+    - fallback: FALLBACK_SKIP, FALLBACK_CLAMP or FALLBACK_FREE_SPACE
+
+    Returns:
+    - (path_loss, fallback_cells): array of path losses in dB, NaN for the
+      skipped cells, and the number of cells handled by the fallback
+    """
+    if fallback not in FALLBACK_POLICIES:
+        raise ValueError(f"Invalid fallback policy: {fallback}")
+
+    distances = np.asarray(distances, dtype=float)
+    valid = validity_mask(distances, distance_range)
+    fallback_cells = int(distances.size - np.count_nonzero(valid))
+
+    if fallback == FALLBACK_CLAMP:
+        return path_loss_func(np.clip(distances, *distance_range)), fallback_cells
+
+    path_loss = np.full(distances.shape, np.nan)
+    path_loss[valid] = path_loss_func(distances[valid])
+
+    if fallback == FALLBACK_FREE_SPACE and fallback_cells:
+        invalid = ~valid
+        # Free space is only defined away from the antenna itself
+        outside = np.maximum(distances[invalid], 1e-3) * 1000  # m
+        path_loss[invalid] = PropagationModel5G.free_space_path_loss_array(frequency * 1e6, outside)
+
+    return path_loss, fallback_cells
+
+
+def evaluate_path_loss_batch(kernels, distances, frequencies, fallback=FALLBACK_SKIP):
+    """
+    Evaluate several path-loss kernels over the same distances (see
+    evaluate_path_loss), e.g. the combinations of a parameter sweep.
+
+    Parameters:
+    - kernels: PathLossKernels
+    - distances: Array of distances in km
+    - frequencies: Carrier frequency in MHz of every kernel (free-space fallback)
+    - fallback: FALLBACK_SKIP, FALLBACK_CLAMP or FALLBACK_FREE_SPACE
+
+    Returns:
+    - Array of path losses in dB of shape (len(kernels), len(distances)),
+      NaN for the skipped cells
+    """
+    if fallback not in FALLBACK_POLICIES:
+        raise ValueError(f"Invalid fallback policy: {fallback}")
+
+    distances = np.asarray(distances, dtype=float)
+    path_loss = np.full((len(kernels), distances.size), np.nan)
+
+    # Kernels of the same model share their validity domain
+    by_range = {}
+    for k, kernel in enumerate(kernels):
+        by_range.setdefault(kernel.distance_range, []).append(k)
+
+    for distance_range, indices in by_range.items():
+        group = [kernels[k] for k in indices]
+        if fallback == FALLBACK_CLAMP:
+            path_loss[indices] = evaluate_kernels(group, np.clip(distances, *distance_range))
+            continue
+
+        valid = validity_mask(distances, distance_range)
+        path_loss[np.ix_(indices, valid)] = evaluate_kernels(group, distances[valid])
+        if fallback == FALLBACK_FREE_SPACE and not valid.all():
+            outside = np.maximum(distances[~valid], 1e-3) * 1000  # m
+            for k in indices:
+                path_loss[k, ~valid] = PropagationModel5G.free_space_path_loss_array(frequencies[k] * 1e6, outside)
+
+    return path_loss
+
+
+def evaluate_path_loss_radial(path_loss_func, distances, distance_range, frequency, fallback=FALLBACK_SKIP, step=0.01,
+                              max_radius=None):
+    """
+    Evaluate an isotropic path-loss function through a 1-D radial profile.
+
+    For a single isotropic site on flat terrain the loss only depends on the
+    distance to the antenna: the model is evaluated once on a fine radial
+    profile and every cell is filled by interpolation of that profile, i.e.
+    O(N) model evaluations instead of O(N^2) for an N x N grid. The profile is
+    sampled and interpolated in log10(distance), in which the models are
+    (piecewise) linear.
+
+    Parameters:
+    - path_loss_func, distances, distance_range, frequency, fallback:
+      see evaluate_path_loss
+    - step: Radial sampling step in km (sets the number of profile samples)
+    - max_radius: Outer radius of the profile in km (distances.max() by
+      default); fixing it makes the profile independent of how a grid is
+      split into chunks
+
+    Returns:
+    - (path_loss, fallback_cells, interpolation_error, evaluations): as
+      evaluate_path_loss, plus the maximum interpolation error in dB,
+      estimated by evaluating the model half-way between profile samples,
+      and the number of distances at which the model was evaluated
+    """
+    if fallback not in FALLBACK_POLICIES:
+        raise ValueError(f"Invalid fallback policy: {fallback}")
+
+    distances = np.asarray(distances, dtype=float)
+    valid = validity_mask(distances, distance_range)
+    fallback_cells = int(distances.size - np.count_nonzero(valid))
+
+    if distances.size == 0:
+        return np.full(distances.shape, np.nan), fallback_cells, 0.0, 0
+
+    # Log-spaced radial profile starting 1 m away from the antenna
+    min_radius = 1e-3  # km
+    if max_radius is None:
+        max_radius = distances.max()
+    max_radius = max(max_radius, 2 * min_radius)
+    samples = max(2, int(np.ceil(max_radius / step)) + 1)
+    log_radii = np.linspace(np.log10(min_radius), np.log10(max_radius), samples)
+
+    # Domain edges and model breakpoints are added as exact samples so the
+    # kinks (and jumps) of the profile are not smoothed by the interpolation
+    knots = [*distance_range, *getattr(path_loss_func, 'breakpoints', ())]
+    knots = np.array([k for k in knots if min_radius < k < max_radius], dtype=float)
+    if knots.size:
+        log_knots = np.log10(knots)
+        log_radii = np.unique(np.concatenate([log_radii, log_knots, log_knots - 1e-9]))
+    log_midpoints = (log_radii[1:] + log_radii[:-1]) / 2
+    log_distances = np.log10(np.maximum(distances, min_radius))
+
+    def profile(func):
+        values = func(10 ** log_radii)
+        error = np.max(np.abs(func(10 ** log_midpoints) - (values[1:] + values[:-1]) / 2))
+        return values, float(error)
+
+    # The model is evaluated on the radii clamped to its domain so the samples
+    # on both sides of a domain edge stay finite
+    model_profile, interpolation_error = profile(lambda d: path_loss_func(np.clip(d, *distance_range)))
+    path_loss = np.interp(log_distances, log_radii, model_profile)
+
+    if fallback == FALLBACK_SKIP:
+        path_loss[~valid] = np.nan
+    elif fallback == FALLBACK_FREE_SPACE and fallback_cells:
+        free_space_profile, free_space_error = profile(
+            lambda d: PropagationModel5G.free_space_path_loss_array(frequency * 1e6, d * 1000)
+        )
+        path_loss[~valid] = np.interp(log_distances[~valid], log_radii, free_space_profile)
+        interpolation_error = max(interpolation_error, free_space_error)
+
+    return path_loss, fallback_cells, interpolation_error, len(log_radii) + len(log_midpoints)
+
+
+def mask_edges(mask):
+    """
+    Cells of a boolean raster that differ from at least one of their four
+    neighbours, i.e. the cells on both sides of the mask boundary.
+    """
+    edges = np.zeros(mask.shape, dtype=bool)
+    for axis in range(mask.ndim):
+        change = np.diff(mask, axis=axis) != 0
+        before = [slice(None)] * mask.ndim
+        after = [slice(None)] * mask.ndim
+        before[axis], after[axis] = slice(None, -1), slice(1, None)
+        edges[tuple(before)] |= change
+        edges[tuple(after)] |= change
+    return edges
+
+
+def _summed_area(cells, lead, padded):
+    """Summed-area table of a raster placed at offset lead in the padded lattice."""
+    table = np.zeros((padded[0] + 1, padded[1] + 1), dtype=np.int64)
+    table[lead[0] + 1:lead[0] + 1 + cells.shape[0], lead[1] + 1:lead[1] + 1 + cells.shape[1]] = cells
+    return table.cumsum(axis=0).cumsum(axis=1)
+
+
+def _quad_counts(table, quads_i, quads_j, step):
+    """Number of set cells in the quads [i, i + step] x [j, j + step]."""
+    end_i, end_j = quads_i + step + 1, quads_j + step + 1
+    return table[end_i, end_j] - table[quads_i, end_j] - table[end_i, quads_j] + table[quads_i, quads_j]
+
+
+def evaluate_signal_adaptive(signal_func, shape, origin=(0, 0), mask=None, breaks=None, offset=None,
+                             threshold=-100.0, coarse_step=ADAPTIVE_COARSE_STEP, max_delta=ADAPTIVE_MAX_DELTA):
+    """
+    Evaluate a signal raster by adaptive quadtree refinement.
+
+    The signal is first evaluated on a coarse lattice (every coarse_step
+    cells). Each quad of the lattice is then either filled by bilinear
+    interpolation of its four corners, or split in four when its corners
+    straddle the coverage threshold, differ by more than max_delta dB, are
+    only partly defined, or when it contains a break cell. Refinement stops at
+    the target (grid) resolution, so cells along the coverage boundary are
+    always evaluated exactly while the model is only called on the corners
+    elsewhere.
+
+    The lattice is aligned on origin (the antenna cell): a signal decreasing
+    with the distance to the antenna then reaches its extremes over a quad at
+    its corners, and no coverage island can hide inside an unrefined quad.
+
+    Parameters:
+    - signal_func: Callable (i, j) -> signal in dBm for arrays of cell
+      indices along axis 0 and axis 1 (indices may fall up to coarse_step
+      cells outside of shape; NaN where the signal is undefined)
+    - shape: Shape of the target raster
+    - origin: Cell index of the antenna, a node of every lattice level
+    - mask: Boolean raster of the cells to compute (all cells by default);
+      the other cells are NaN and quads without any of them are dropped
+    - breaks: Boolean raster of the cells next to a discontinuity of the
+      signal (e.g. mask_edges() of the model validity mask)
+    - offset: Raster in dB added exactly to every cell (e.g. minus the
+      terrain diffraction loss), or None; only signal_func is interpolated,
+      but a quad is split when its signal plus the range of the offset over
+      the quad may straddle the threshold
+    - threshold: Coverage threshold in dBm
+    - coarse_step: Initial quad size in cells (power of two)
+    - max_delta: Maximum corner spread in dB of a quad filled by interpolation
+
+    Returns:
+    - (signal_grid, evaluations): raster of the given shape and number of
+      cells on which signal_func was actually evaluated
+    """
+    if coarse_step < 1 or coarse_step & (coarse_step - 1):
+        raise ValueError("coarse_step must be a power of two")
+
+    # Lattice padded so that the coarse quads tile the whole raster; raster
+    # cell (i, j) is lattice node (i + lead[0], j + lead[1])
+    step = coarse_step
+    lead = tuple(-o % step for o in origin)
+    padded = tuple(step * int(np.ceil(max(l + n - 1, 1) / step)) + 1 for l, n in zip(lead, shape))
+    values = np.full(padded, np.nan)
+    exact = np.zeros(padded, dtype=bool)
+    evaluations = 0
+
+    if mask is None:
+        mask = np.ones(shape, dtype=bool)
+    mask_table = _summed_area(mask, lead, padded)
+    breaks_table = _summed_area(breaks, lead, padded) if breaks is not None else None
+    offset_lattice = None
+    if offset is not None:
+        # NaN around the raster: ignored by the bounds of the quads
+        offset_lattice = np.full(padded, np.nan)
+        offset_lattice[lead[0]:lead[0] + shape[0], lead[1]:lead[1] + shape[1]] = offset
+
+    quads_i, quads_j = np.meshgrid(np.arange(0, padded[0] - 1, step), np.arange(0, padded[1] - 1, step), indexing='ij')
+    quads_i, quads_j = quads_i.ravel(), quads_j.ravel()
+
+    while True:
+        # Quads without any cell to compute are dropped
+        inside = _quad_counts(mask_table, quads_i, quads_j, step) > 0
+        quads_i, quads_j = quads_i[inside], quads_j[inside]
+        if not quads_i.size:
+            break
+
+        corners_i = np.stack([quads_i, quads_i + step, quads_i, quads_i + step])
+        corners_j = np.stack([quads_j, quads_j, quads_j + step, quads_j + step])
+
+        # Evaluate every corner not evaluated yet, once, in a single call
+        missing = np.unique(np.ravel_multi_index((corners_i, corners_j), padded)[~exact[corners_i, corners_j]])
+        if missing.size:
+            missing_i, missing_j = np.unravel_index(missing, padded)
+            values[missing_i, missing_j] = signal_func(missing_i - lead[0], missing_j - lead[1])
+            exact[missing_i, missing_j] = True
+            evaluations += int(missing.size)
+
+        if step == 1:
+            break
+
+        corners = values[corners_i, corners_j]
+        undefined = np.isnan(corners)
+        low = np.where(undefined, np.inf, corners).min(axis=0)
+        high = np.where(undefined, -np.inf, corners).max(axis=0)
+        spread = high - low
+        if offset_lattice is not None:
+            # Bilinear values stay between the corners: bounds of the signal
+            # plus offset over every cell of the quad
+            window = np.arange(step + 1)
+            cells = offset_lattice[quads_i[:, None, None] + window[:, None], quads_j[:, None, None] + window[None, :]]
+            low = low + np.nanmin(cells, axis=(1, 2))
+            high = high + np.nanmax(cells, axis=(1, 2))
+        split = (
+            (undefined.any(axis=0) & ~undefined.all(axis=0))
+            | ((low < threshold) & (high >= threshold))
+            | (spread > max_delta)
+        )
+        if breaks_table is not None:
+            split |= _quad_counts(breaks_table, quads_i, quads_j, step) > 0
+
+        # Bilinear fill of the quads that are not refined (NaN if undefined)
+        fill = ~split
+        if fill.any():
+            weights = np.arange(step + 1) / step
+            u, w = weights[:, None], weights[None, :]
+            c00, c10, c01, c11 = (corners[k, fill][:, None, None] for k in range(4))
+            interpolated = c00 * (1 - u) * (1 - w) + c10 * u * (1 - w) + c01 * (1 - u) * w + c11 * u * w
+            fill_i = quads_i[fill][:, None, None] + np.arange(step + 1)[:, None]
+            fill_j = quads_j[fill][:, None, None] + np.arange(step + 1)[None, :]
+            fill_i, fill_j = np.broadcast_arrays(fill_i, fill_j)
+            approximate = ~exact[fill_i, fill_j]
+            values[fill_i[approximate], fill_j[approximate]] = interpolated[approximate]
+
+        # Split the other quads in four
+        half = step // 2
+        quads_i = np.concatenate([quads_i[split] + di for di in (0, half) for _ in (0, half)])
+        quads_j = np.concatenate([quads_j[split] + dj for _ in (0, half) for dj in (0, half)])
+        step = half
+
+    signal_grid = values[lead[0]:lead[0] + shape[0], lead[1]:lead[1] + shape[1]]
+    if offset is not None:
+        signal_grid += offset
+    signal_grid[~mask] = np.nan
+    return signal_grid, evaluations
+
+
+def class_partitions(kernel, class_kernels, classes, cells):
+    """
+    Split cells by kernel class.
+
+    Parameters:
+    - kernel: Kernel of every cell if classes is None
+    - class_kernels: Sequence of kernels, one per class index
+    - classes: Integer array of class indices, or None for a single kernel
+    - cells: Boolean mask of the cells to evaluate
+
+    Returns:
+    - List of (kernel, boolean mask) pairs, one per class with cells
+    """
+    if classes is None:
+        return [(kernel, cells)]
+    partitions = []
+    for index, class_kernel in enumerate(class_kernels):
+        part = cells & (classes == index)
+        if part.any():
+            partitions.append((class_kernel, part))
+    return partitions
+
+
+def evaluate_grid_rows(kernel, grid, rows, antenna_power, frequency, mode=EVALUATION_GRID, fallback=FALLBACK_SKIP,
+                       classes=None, class_kernels=None, diffraction=None):
+    """
+    Evaluate the signal strength on a block of rows of a LocalGrid.
+
+    Only plain values are taken (no model instance) so that a partial of
+    this function can be sent to worker processes.
+
+    Parameters:
+    - kernel: PathLossKernel, or None if the model parameters are invalid
+    - grid: LocalGrid
+    - rows: Slice of rows (axis 0) to evaluate
+    - antenna_power: Transmit power in dBm
+    - frequency: Carrier frequency in MHz
+    - mode: EVALUATION_GRID, EVALUATION_RADIAL or EVALUATION_ADAPTIVE
+    - fallback: Validity fallback policy
+    - classes: Per-cell kernel class of the whole grid (integer array, or
+      a store LayerReader indexed by row blocks), or None to evaluate every
+      cell with kernel; the cells of class k are
+      evaluated with class_kernels[k] (line of sight, land cover...), one
+      vectorised call per class
+    - class_kernels: PathLossKernels of the classes (sharing the distance
+      range of kernel)
+    - diffraction: Per-cell terrain diffraction loss in dB of the whole grid
+      (array or LayerReader), added to the model loss, or None
+
+    Returns:
+    - (signal, stats): signal in dBm (NaN outside the radius and where the
+      model cannot be evaluated) and the keyword arguments of
+      CoverageAggregator.add for this block
+    """
+    distances = grid.distances(rows)
+    in_radius = distances <= grid.radius
+    signal = np.full(distances.shape, np.nan)
+    stats = {'grid_cells': int(np.count_nonzero(in_radius))}
+
+    if kernel is None:
+        # Parameters outside the model's validity range: no cell can be evaluated
+        stats['model_evaluations'] = 0
+        return signal, stats
+
+    start, stop, _ = rows.indices(grid.shape[0])
+    class_rows = None if classes is None else np.asarray(classes[start:stop])
+
+    # Cells outside the model validity domain are handled by the configured fallback
+    if mode == EVALUATION_ADAPTIVE:
+        # Quadtree refinement: the model is evaluated exactly on the cells
+        # around the -100 dBm boundary and the domain edges, and interpolated
+        # on a coarse lattice elsewhere. Skipped cells are masked out, the
+        # model itself is evaluated clamped so every lattice node is defined.
+        # One extra row on each side so domain edges across blocks are seen.
+        extended = slice(max(start - 1, 0), min(stop + 1, grid.shape[0]))
+        valid = validity_mask(grid.distances(extended), kernel.distance_range)
+        edges = mask_edges(valid)
+        if classes is not None:
+            # Class changes are refined like the domain edges
+            edges |= mask_edges(np.asarray(classes[extended]))
+        breaks = edges[start - extended.start:stop - extended.start]
+        valid = valid[start - extended.start:stop - extended.start]
+        skip = fallback == FALLBACK_SKIP
+
+        def signal_at(i, j):
+            node_distances = grid.distances_at(i + start, j)
+            # Lattice nodes may lie outside of the grid: nearest cell class
+            node_classes = None if classes is None else np.asarray(
+                classes[np.clip(i + start, 0, grid.shape[0] - 1), np.clip(j, 0, grid.shape[1] - 1)]
+            )
+            path_loss = np.full(node_distances.shape, np.nan)
+            cells = np.ones(node_distances.shape, dtype=bool)
+            for part_kernel, part in class_partitions(kernel, class_kernels, node_classes, cells):
+                path_loss[part], _ = evaluate_path_loss(
+                    part_kernel, node_distances[part], part_kernel.distance_range, frequency,
+                    fallback=FALLBACK_CLAMP if skip else fallback
+                )
+            return antenna_power - path_loss
+
+        signal, stats['model_evaluations'] = evaluate_signal_adaptive(
+            signal_at,
+            distances.shape,
+            origin=(grid.origin[0] - start, grid.origin[1]),
+            mask=in_radius & valid if skip else in_radius,
+            breaks=breaks,
+            # Diffraction: exact per-cell term, seen by the refinement around
+            # the coverage threshold but never interpolated
+            offset=None if diffraction is None else -np.asarray(diffraction[start:stop], dtype=float)
+        )
+        stats['fallback_cells'] = int(np.count_nonzero(in_radius & ~valid))
+    elif mode == EVALUATION_RADIAL:
+        # Isotropic site on flat terrain: evaluate a 1-D radial profile and
+        # interpolate it onto the grid (one profile per kernel class)
+        stats['fallback_cells'] = 0
+        stats['interpolation_error'] = 0.0
+        stats['model_evaluations'] = 0
+        for part_kernel, cells in class_partitions(kernel, class_kernels, class_rows, in_radius):
+            path_loss, fallback_cells, interpolation_error, evaluations = evaluate_path_loss_radial(
+                part_kernel, distances[cells], part_kernel.distance_range, frequency,
+                fallback=fallback, step=grid.cell_size / 10, max_radius=grid.radius
+            )
+            signal[cells] = antenna_power - path_loss
+            stats['fallback_cells'] += fallback_cells
+            stats['interpolation_error'] = max(stats['interpolation_error'], interpolation_error)
+            # Profile samples (the profile is evaluated again by every block)
+            stats['model_evaluations'] += evaluations
+    else:
+        stats['fallback_cells'] = 0
+        for part_kernel, cells in class_partitions(kernel, class_kernels, class_rows, in_radius):
+            path_loss, fallback_cells = evaluate_path_loss(
+                part_kernel, distances[cells], part_kernel.distance_range, frequency, fallback=fallback
+            )
+            signal[cells] = antenna_power - path_loss
+            stats['fallback_cells'] += fallback_cells
+        stats['model_evaluations'] = stats['grid_cells']
+
+    if diffraction is not None and mode != EVALUATION_ADAPTIVE:
+        # Exact per-cell term (already added by the ADAPTIVE refinement)
+        signal -= diffraction[start:stop]
+
+    return signal, stats
@@ -0,0 +1,246 @@
+"""
+North-up rasters read by cached tiles (population, land cover...).
+
+A raster is a north-up grid in any CRS known to PROJ, in one of two formats:
+- GeoTIFF (or any single-band raster readable by GDAL), read by windows
+  through GDALRaster;
+- our own binary grid: a ``.npy`` array, memory-mapped, next to a ``.json``
+  sidecar file with the CRS, the GDAL-style geotransform and the nodata
+  value.
+
+Pixels are read by fixed-size tiles, decoded once and kept in a process-wide
+TileCache (one per kind of raster), so the tiles of a region are read from
+disk once for all the simulations run by a worker.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+from pyproj import CRS, Transformer
+
+# Tile size of the caches, in pixels
+TILE_SIZE = 512
+
+# Mean Earth radius in km (pixel sizes of geographic rasters)
+EARTH_RADIUS = 6371.0088
+
+# Pixels between two projected points of the pixel-centre lattice
+LATTICE_STEP = 16
+
+RASTER_EXTENSIONS = ('.npy', '.tif', '.tiff')
+
+
+class TiledRaster:
+    """
+    North-up raster read by cached tiles.
+
+    Format subclasses implement _read(); kind subclasses implement
+    tile_cache() and may decode the pixels of a tile in _decode().
+    """
+
+    def __init__(self, path, crs, geotransform, shape, nodata=None):
+        x0, dx, rx, y0, ry, dy = (float(v) for v in geotransform)
+        if rx or ry:
+            raise ValueError("Rotated rasters are not supported")
+
+        self.path = path
+        self.key = (path, os.stat(path).st_mtime_ns)
+        self.crs = CRS.from_user_input(crs)
+        self.x0, self.dx, self.y0, self.dy = x0, dx, y0, dy
+        self.shape = tuple(int(n) for n in shape)  # (rows, cols)
+        self.nodata = nodata
+
+    def _read(self, row0, row1, col0, col1):
+        """Pixels [row0:row1, col0:col1] read from the file."""
+        raise NotImplementedError
+
+    def _decode(self, values):
+        """Tile as kept in the cache, from the pixels read from the file."""
+        return np.array(values)
+
+    def tile_cache(self):
+        """TileCache of the rasters of this kind."""
+        raise NotImplementedError
+
+    def _load_tile(self, ty, tx):
+        row0, col0 = ty * TILE_SIZE, tx * TILE_SIZE
+        row1, col1 = min(row0 + TILE_SIZE, self.shape[0]), min(col0 + TILE_SIZE, self.shape[1])
+        return self._decode(self._read(row0, row1, col0, col1))
+
+    def tile(self, ty, tx):
+        """Tile (ty, tx) of TILE_SIZE pixels, from the tile cache."""
+        return self.tile_cache().get((self.key, ty, tx), lambda: self._load_tile(ty, tx))
+
+    def window(self, row0, row1, col0, col1):
+        """
+        Pixels [row0:row1, col0:col1] (inside the raster), assembled from
+        the cached tiles.
+        """
+        values = None
+        for ty in range(row0 // TILE_SIZE, (row1 - 1) // TILE_SIZE + 1):
+            for tx in range(col0 // TILE_SIZE, (col1 - 1) // TILE_SIZE + 1):
+                tile = self.tile(ty, tx)
+                if values is None:
+                    values = np.empty((row1 - row0, col1 - col0), dtype=tile.dtype)
+                r0, c0 = max(row0, ty * TILE_SIZE), max(col0, tx * TILE_SIZE)
+                r1, c1 = min(row1, ty * TILE_SIZE + tile.shape[0]), min(col1, tx * TILE_SIZE + tile.shape[1])
+                values[r0 - row0:r1 - row0, c0 - col0:c1 - col0] = \
+                    tile[r0 - ty * TILE_SIZE:r1 - ty * TILE_SIZE, c0 - tx * TILE_SIZE:c1 - tx * TILE_SIZE]
+        return values
+
+    def pixel_size(self):
+        """Approximate size of a pixel side in m."""
+        if self.crs.is_geographic:
+            return EARTH_RADIUS * 1000 * np.radians(min(abs(self.dx), abs(self.dy)))
+        return min(abs(self.dx), abs(self.dy)) * self.crs.axis_info[0].unit_conversion_factor
+
+    def pixel_indices(self, x, y):
+        """
+        Pixel (row, col) of points of the raster CRS.
+
+        Returns:
+        - (row, col, inside): integer indices and boolean mask of the points
+          that fall inside the raster
+        """
+        row = np.floor((np.asarray(y) - self.y0) / self.dy).astype(np.int64)
+        col = np.floor((np.asarray(x) - self.x0) / self.dx).astype(np.int64)
+        inside = (row >= 0) & (row < self.shape[0]) & (col >= 0) & (col < self.shape[1])
+        return row, col, inside
+
+    def grid_centres(self, grid, rows=slice(None)):
+        """Cell centres of a LocalGrid (of the given rows) in the raster CRS."""
+        cell_x, cell_y = np.meshgrid(grid.x[rows], grid.y, indexing='ij')
+        to_raster = Transformer.from_crs(grid.crs, self.crs, always_xy=True)
+        return to_raster.transform(cell_x, cell_y)
+
+    def _local_centres(self, grid, row0, col0, shape, rows, cols):
+        """
+        Local coordinates (grid frame) of the centres of the pixels
+        (row0 + rows, col0 + cols) of a window of the given shape.
+
+        Only a lattice of one pixel every LATTICE_STEP is projected; the
+        pixels in between are interpolated bilinearly (sub-metre error).
+        """
+        lattice_rows = np.arange(0, shape[0] + LATTICE_STEP, LATTICE_STEP)
+        lattice_cols = np.arange(0, shape[1] + LATTICE_STEP, LATTICE_STEP)
+        lattice_x, lattice_y = np.meshgrid(self.x0 + (col0 + lattice_cols + 0.5) * self.dx,
+                                           self.y0 + (row0 + lattice_rows + 0.5) * self.dy)
+        to_local = Transformer.from_crs(self.crs, grid.crs, always_xy=True)
+        lattice_x, lattice_y = (np.asarray(v) for v in to_local.transform(lattice_x, lattice_y))
+
+        r, fr = np.divmod(rows, LATTICE_STEP)
+        c, fc = np.divmod(cols, LATTICE_STEP)
+        fr, fc = fr / LATTICE_STEP, fc / LATTICE_STEP
+
+        def interpolate(lattice):
+            return ((lattice[r, c] * (1 - fc) + lattice[r, c + 1] * fc) * (1 - fr)
+                    + (lattice[r + 1, c] * (1 - fc) + lattice[r + 1, c + 1] * fc) * fr)
+
+        return interpolate(lattice_x), interpolate(lattice_y)
+
+    def _window_under(self, grid, x):
+        """
+        Pixel window (row0, row1, col0, col1) covering the cells of the grid
+        columns x, or None if it does not intersect the raster.
+        """
+        half = grid.cell_size * 500  # m
+        # Outline of the cells, densified (the raster CRS may bend it)
+        edge_x = np.linspace(x[0] - half, x[-1] + half, 65)
+        edge_y = np.linspace(grid.y[0] - half, grid.y[-1] + half, 65)
+        outline_x = np.concatenate([edge_x, np.full(65, edge_x[-1]), edge_x, np.full(65, edge_x[0])])
+        outline_y = np.concatenate([np.full(65, edge_y[0]), edge_y, np.full(65, edge_y[-1]), edge_y])
+        to_raster = Transformer.from_crs(grid.crs, self.crs, always_xy=True)
+        raster_x, raster_y = to_raster.transform(outline_x, outline_y)
+
+        rows = np.floor((np.asarray(raster_y) - self.y0) / self.dy)
+        cols = np.floor((np.asarray(raster_x) - self.x0) / self.dx)
+        row0, row1 = max(int(rows.min()) - 1, 0), min(int(rows.max()) + 2, self.shape[0])
+        col0, col1 = max(int(cols.min()) - 1, 0), min(int(cols.max()) + 2, self.shape[1])
+        if row0 >= row1 or col0 >= col1:
+            return None
+        return row0, row1, col0, col1
+
+    def pixel_cells(self, grid, rows, window, pixel_rows, pixel_cols):
+        """
+        Cells of a LocalGrid containing the centres of pixels of a window.
+
+        Parameters:
+        - grid, rows: LocalGrid and slice of rows (axis 0)
+        - window: (row0, row1, col0, col1) pixel window
+        - pixel_rows, pixel_cols: Pixel indices relative to the window
+
+        Returns:
+        - (i, j, inside): row (relative to the first of rows) and column of
+          the cell of every pixel, and mask of the pixels inside the rows
+        """
+        step = grid.cell_size * 1000  # m
+        first, stop, _ = rows.indices(grid.shape[0])
+        row0, row1, col0, col1 = window
+        local_x, local_y = self._local_centres(grid, row0, col0, (row1 - row0, col1 - col0), pixel_rows, pixel_cols)
+        i = np.floor(np.asarray(local_x) / step + 0.5).astype(np.int64) + grid.origin[0] - first
+        j = np.floor(np.asarray(local_y) / step + 0.5).astype(np.int64) + grid.origin[1]
+        inside = (i >= 0) & (i < stop - first) & (j >= 0) & (j < grid.shape[1])
+        return i, j, inside
+
+
+class NpyRaster(TiledRaster):
+    """
+    Binary grid: memory-mapped .npy array and .json sidecar
+    ({"crs": ..., "geotransform": [x0, dx, 0, y0, 0, dy], "nodata": ...}).
+    """
+
+    def __init__(self, path):
+        with open(os.path.splitext(path)[0] + '.json') as f:
+            meta = json.load(f)
+        self._values = np.load(path, mmap_mode='r')
+        if self._values.ndim != 2:
+            raise ValueError("Raster grids must be 2-D arrays")
+        super().__init__(path, meta['crs'], meta['geotransform'], self._values.shape, meta.get('nodata'))
+
+    def _read(self, row0, row1, col0, col1):
+        return self._values[row0:row1, col0:col1]
+
+
+class GDALTiledRaster(TiledRaster):
+    """
+    Raster read by GDAL (first band of a GeoTIFF...).
+    """
+
+    def __init__(self, path):
+        from django.contrib.gis.gdal import GDALRaster
+
+        self._raster = GDALRaster(path)
+        self._band = self._raster.bands[0]
+        # GDAL datasets must not be read from several threads at once
+        self._lock = threading.Lock()
+        super().__init__(path, self._raster.srs.wkt, self._raster.geotransform,
+                         (self._raster.height, self._raster.width), self._band.nodata_value)
+
+    def _read(self, row0, row1, col0, col1):
+        with self._lock:
+            return self._band.data(offset=(col0, row0), size=(col1 - col0, row1 - row0))
+
+
+def raster_path(root, name, kind):
+    """
+    Path of a registered raster (file name in the root directory).
+
+    Parameters:
+    - root: Directory of the rasters of this kind
+    - name: File name of the raster
+    - kind: Kind of raster for the error messages ("de population"...)
+    """
+    if os.path.basename(name) != name or not name.lower().endswith(RASTER_EXTENSIONS):
+        raise ValueError(f"Nom de raster {kind} invalide: {name}")
+    path = os.path.join(root, name)
+    if not os.path.isfile(path):
+        raise ValueError(f"Raster {kind} introuvable: {name}")
+    return path
+
+
+def list_rasters(root):
+    """File names of the rasters registered in a directory."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if name.lower().endswith(RASTER_EXTENSIONS))
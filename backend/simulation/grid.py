@@ -0,0 +1,117 @@
+"""
+Local metric grids for the coverage rasters.
+
+The grid is built in an azimuthal-equidistant projection centred on the
+antenna: cells have a fixed size in metres at every latitude and the
+distance to the antenna is the (geodesic) norm of the projected
+coordinates, computed with one array operation. Coordinates are converted
+back to WGS84 only for the cells that are written to the output.
+"""
+import numpy as np
+from pyproj import CRS, Transformer
+
+
+def local_crs(center_lon, center_lat):
+    """Azimuthal-equidistant CRS (metres) centred on (center_lon, center_lat)."""
+    return CRS.from_proj4(
+        f"+proj=aeqd +lat_0={center_lat} +lon_0={center_lon} +datum=WGS84 +units=m +no_defs"
+    )
+
+
+def local_to_wgs84(center_lon, center_lat):
+    """Transformer from the local frame of local_crs() to WGS84 (lon, lat)."""
+    return Transformer.from_crs(local_crs(center_lon, center_lat), "EPSG:4326", always_xy=True)
+
+
+def half_side(radius, cell_size):
+    """Cells between the antenna cell and the edge of the grid of a radius."""
+    if not cell_size > 0:
+        raise ValueError("Grid cell size must be positive")
+    return int(np.floor(float(radius) / float(cell_size) + 1e-9))
+
+
+def grid_cell_count(radius, cell_size):
+    """
+    Number of cells of the LocalGrid of a radius and a cell size (km),
+    without building it (budget checks before any allocation).
+    """
+    return (2 * half_side(radius, cell_size) + 1) ** 2
+
+
+class LocalGrid:
+    """
+    Square grid of cell_size km cells covering a disc of radius km around
+    (center_lon, center_lat). Axis 0 runs west to east, axis 1 south to north.
+    """
+
+    def __init__(self, center_lon, center_lat, radius, cell_size):
+        self.center_lon = float(center_lon)
+        self.center_lat = float(center_lat)
+        self.radius = float(radius)  # km
+        self.cell_size = float(cell_size)  # km
+
+        # Cell centres every cell_size km, one of them on the antenna
+        half = half_side(self.radius, self.cell_size)
+        self.origin = (half, half)  # index of the antenna cell
+        self.x = np.arange(-half, half + 1) * self.cell_size * 1000  # m, easting
+        self.y = np.arange(-half, half + 1) * self.cell_size * 1000  # m, northing
+
+        self.crs = local_crs(self.center_lon, self.center_lat)
+        self._to_wgs84 = Transformer.from_crs(self.crs, "EPSG:4326", always_xy=True)
+
+    @property
+    def shape(self):
+        return (len(self.x), len(self.y))
+
+    @property
+    def cell_count(self):
+        return len(self.x) * len(self.y)
+
+    @property
+    def cell_area(self):
+        """Area of one cell in km²."""
+        return self.cell_size ** 2
+
+    def distances(self, rows=slice(None)):
+        """Distance of every cell centre (of the given rows) to the antenna in km."""
+        return np.hypot(self.x[rows, None], self.y[None, :]) / 1000
+
+    def distances_at(self, i, j):
+        """
+        Distance to the antenna in km of the cells (i, j), which may lie
+        outside of the grid (same values as distances() inside of it).
+        """
+        x = (np.asarray(i) - self.origin[0]) * self.cell_size * 1000
+        y = (np.asarray(j) - self.origin[1]) * self.cell_size * 1000
+        return np.hypot(x, y) / 1000
+
+    def lonlat(self, i, j):
+        """
+        WGS84 coordinates of the cell centres (i, j).
+
+        Parameters:
+        - i, j: Index arrays along axis 0 and axis 1
+
+        Returns:
+        - (lon, lat) arrays
+        """
+        return self.to_wgs84(self.x[i], self.y[j])
+
+    def to_wgs84(self, x, y):
+        """WGS84 (lon, lat) of local coordinates in m."""
+        return self._to_wgs84.transform(x, y)
+
+    def cell_corners(self, i, j):
+        """
+        WGS84 coordinates of the four corners of the cells (i, j).
+
+        Returns:
+        - (lon, lat) arrays of shape (len(i), 4), counter-clockwise from
+          the south-west corner
+        """
+        half = self.cell_size * 500  # m
+        dx = np.array([-half, half, half, -half])
+        dy = np.array([-half, -half, half, half])
+        x = np.asarray(self.x[i])[:, None] + dx
+        y = np.asarray(self.y[j])[:, None] + dy
+        return self.to_wgs84(x, y)
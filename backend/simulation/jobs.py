@@ -0,0 +1,569 @@
+"""
+Asynchronous simulation jobs.
+
+The run endpoints only record a SimulationJob and hand its id to a broker;
+the propagation, polygon build and database writes then run in a worker,
+which records the state and progress of the job as it goes. Clients poll
+/jobs/<id>/ and read the result once the job has succeeded.
+
+Brokers (settings.SIMULATION_JOB_BROKER):
+- local://: in-process queue run by background threads of the web process
+  (development server, single host);
+- sqlite:///relative/jobs.sqlite3 or sqlite:////absolute/jobs.sqlite3:
+  queue in a SQLite file shared by the web processes and the workers of
+  one host;
+- redis://host:port/db: Redis lists shared by any number of hosts.
+
+With the sqlite and redis brokers the jobs are run by worker processes
+(python manage.py simulation_worker). Jobs are delivered at least once: a
+job stays in the queue until the worker that took it acknowledges it, and
+is delivered again when its worker has not renewed its lease for
+settings.SIMULATION_JOB_LEASE seconds (stopped worker). Running jobs renew
+their lease as they report their progress.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from functools import lru_cache, partial
+from urllib.parse import urlparse
+
+from .singleflight import acquire_lock, lock_holder, release_lock
+
+logger = logging.getLogger(__name__)
+
+# Minimum interval in seconds between two progress writes of a job
+PROGRESS_INTERVAL = 0.5
+
+# Polling interval in seconds of the SQLite and Redis brokers
+POLL_INTERVAL = 0.5
+
+# Seconds a worker waits for a job before checking for a stop request
+DEQUEUE_TIMEOUT = 5.0
+
+# Minimum interval in seconds between two lease renewals of a running job
+RENEW_INTERVAL = 60.0
+
+
+class Broker:
+    """
+    Queue of job ids.
+    """
+
+    # True if the broker runs the jobs itself (no worker process needed)
+    runs_jobs = False
+
+    def enqueue(self, job_id):
+        raise NotImplementedError
+
+    def dequeue(self, timeout):
+        """Next job id, or None if none arrives within timeout seconds."""
+        raise NotImplementedError
+
+    def ack(self, job_id):
+        """Remove a job taken by dequeue() once it has been run."""
+        raise NotImplementedError
+
+    def renew(self, job_id):
+        """Extend the lease of a job being run (brokers delivering again the jobs of stopped workers)."""
+
+
+class InProcessBroker(Broker):
+    """
+    Queue held in memory, run by daemon threads of the current process
+    (queued jobs are lost when the process exits).
+    """
+
+    runs_jobs = True
+
+    def __init__(self, threads=1):
+        self.threads = max(1, int(threads))
+        self._queue = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def enqueue(self, job_id):
+        self._queue.put(str(job_id))
+        self._start_workers()
+
+    def dequeue(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def ack(self, job_id):
+        self._queue.task_done()
+
+    def _start_workers(self):
+        # Threads are started on the first job (not at import, so that
+        # management commands and forked processes do not start them)
+        with self._lock:
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            while len(self._workers) < self.threads:
+                worker = threading.Thread(target=work, args=(self,), name='simulation-jobs', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+
+class SQLiteBroker(Broker):
+    """
+    Queue in a SQLite file. A job taken by a worker that neither
+    acknowledged it nor renewed its lease within lease seconds (stopped
+    worker) is delivered again.
+    """
+
+    def __init__(self, path, lease=3600):
+        self.path = path
+        self.lease = lease
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs "
+                "(job_id TEXT PRIMARY KEY, enqueued_at REAL NOT NULL, claimed_at REAL)"
+            )
+
+    def _connect(self):
+        # Autocommit: transactions are opened explicitly
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def enqueue(self, job_id):
+        with closing(self._connect()) as db:
+            db.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, NULL)", (str(job_id), time.time()))
+
+    def dequeue(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            job_id = self._claim()
+            if job_id is not None or time.monotonic() >= deadline:
+                return job_id
+            time.sleep(POLL_INTERVAL)
+
+    def _claim(self):
+        now = time.time()
+        with closing(self._connect()) as db:
+            # Write lock taken up front: a job is claimed by one worker only
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT job_id FROM jobs WHERE claimed_at IS NULL OR claimed_at < ? "
+                    "ORDER BY enqueued_at LIMIT 1",
+                    (now - self.lease,)
+                ).fetchone()
+                if row is not None:
+                    db.execute("UPDATE jobs SET claimed_at = ? WHERE job_id = ?", (now, row[0]))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return row[0] if row is not None else None
+
+    def ack(self, job_id):
+        with closing(self._connect()) as db:
+            db.execute("DELETE FROM jobs WHERE job_id = ?", (str(job_id),))
+
+    def renew(self, job_id):
+        with closing(self._connect()) as db:
+            db.execute("UPDATE jobs SET claimed_at = ? WHERE job_id = ?", (time.time(), str(job_id)))
+
+
+class RedisBroker(Broker):
+    """
+    Queue in a Redis list. A taken job is moved atomically to a processing
+    list, with a lease in a sorted set (deadline in Redis server time), and
+    removed from both when acknowledged. Every claim first moves the jobs
+    whose lease has expired (stopped worker) back to the head of the queue.
+    """
+
+    # KEYS: queue, processing, leases; ARGV: lease
+    CLAIM_SCRIPT = """
+    local now = tonumber(redis.call('TIME')[1])
+    for _, job_id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now)) do
+        redis.call('LREM', KEYS[2], 1, job_id)
+        redis.call('ZREM', KEYS[3], job_id)
+        redis.call('RPUSH', KEYS[1], job_id)
+    end
+    local job_id = redis.call('RPOPLPUSH', KEYS[1], KEYS[2])
+    if job_id then
+        redis.call('ZADD', KEYS[3], now + tonumber(ARGV[1]), job_id)
+    end
+    return job_id
+    """
+
+    # KEYS: leases; ARGV: lease, job id
+    RENEW_SCRIPT = """
+    local now = tonumber(redis.call('TIME')[1])
+    return redis.call('ZADD', KEYS[1], 'XX', now + tonumber(ARGV[1]), ARGV[2])
+    """
+
+    def __init__(self, url, key='simulation:jobs', lease=3600):
+        try:
+            import redis
+        except ImportError:
+            from django.core.exceptions import ImproperlyConfigured
+            raise ImproperlyConfigured("Le broker redis:// nécessite le paquet redis (pip install redis)")
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.queue = key
+        self.processing = f"{key}:processing"
+        self.leases = f"{key}:leases"
+        self.lease = lease
+        self._claim = self.client.register_script(self.CLAIM_SCRIPT)
+        self._renew = self.client.register_script(self.RENEW_SCRIPT)
+
+    def enqueue(self, job_id):
+        self.client.lpush(self.queue, str(job_id))
+
+    def dequeue(self, timeout):
+        # Claims are polled: a blocking pop cannot take the lease atomically
+        deadline = time.monotonic() + timeout
+        while True:
+            job_id = self._claim(keys=[self.queue, self.processing, self.leases], args=[self.lease])
+            if job_id is not None or time.monotonic() >= deadline:
+                return job_id
+            time.sleep(POLL_INTERVAL)
+
+    def ack(self, job_id):
+        with self.client.pipeline() as pipe:
+            pipe.lrem(self.processing, 1, str(job_id))
+            pipe.zrem(self.leases, str(job_id))
+            pipe.execute()
+
+    def renew(self, job_id):
+        self._renew(keys=[self.leases], args=[self.lease, str(job_id)])
+
+
+@lru_cache(maxsize=None)
+def _broker(url, threads, lease):
+    parsed = urlparse(url)
+    if parsed.scheme == 'local':
+        return InProcessBroker(threads)
+    if parsed.scheme == 'sqlite':
+        # sqlite:///relative/path, sqlite:////absolute/path
+        return SQLiteBroker(parsed.path[1:], lease=lease)
+    if parsed.scheme in ('redis', 'rediss'):
+        return RedisBroker(url, lease=lease)
+    raise ValueError(f"Broker de tâches inconnu: {url}")
+
+
+def get_broker():
+    """Broker configured by settings.SIMULATION_JOB_BROKER (one per process)."""
+    from django.conf import settings
+
+    return _broker(settings.SIMULATION_JOB_BROKER, settings.SIMULATION_JOB_THREADS, settings.SIMULATION_JOB_LEASE)
+
+
+def enqueue_simulation(params):
+    """
+    Record a job running the propagation model of a SimulationParameter and
+    queue it (once the current transaction, if any, is committed). Runs
+    whose inputs are in the result cache are not queued: their job reuses
+    the cached result and is recorded as succeeded. Runs whose inputs are
+    being computed by an in-flight job are not queued either: their job
+    follows that job and receives its outcome.
+
+    Returns:
+    - SimulationJob in the QUEUED state, or SUCCEEDED on a cache hit
+    """
+    from django.db import transaction
+    from django.utils import timezone
+    from .models import SimulationJob
+    from .resultcache import lookup, parameters_key
+
+    key = parameters_key(params)
+    entry = lookup(key)
+    if entry is not None:
+        now = timezone.now()
+        return SimulationJob.objects.create(
+            simulation=params.simulation,
+            parameters=params,
+            state='SUCCEEDED',
+            progress=1.0,
+            stage='cached',
+            result=entry.result,
+            summary=entry.summary,
+            cache_key=key,
+            started_at=now,
+            finished_at=now
+        )
+
+    job = SimulationJob.objects.create(simulation=params.simulation, parameters=params, cache_key=key)
+    if join_in_flight(job) is None:
+        broker = get_broker()
+        transaction.on_commit(lambda: broker.enqueue(job.id))
+    return job
+
+
+def enqueue_sweep(params, axes):
+    """
+    Record a job computing a parameter sweep around a SimulationParameter
+    and queue it (once the current transaction, if any, is committed).
+    Sweeps bypass the result cache: their table is kept in the job summary.
+
+    Parameters:
+    - params: Base SimulationParameter
+    - axes: {parameter: [values]} (see simulation.sweep)
+
+    Returns:
+    - SimulationJob in the QUEUED state
+    """
+    from django.db import transaction
+    from .models import SimulationJob
+
+    job = SimulationJob.objects.create(simulation=params.simulation, parameters=params, sweep=axes)
+    broker = get_broker()
+    transaction.on_commit(lambda: broker.enqueue(job.id))
+    return job
+
+
+def run_lock_key(cache_key):
+    """Cache lock held by the in-flight job of a cache key."""
+    return f"simulation:run:{cache_key}"
+
+
+def join_in_flight(job):
+    """
+    Make a new job follow the in-flight job with the same inputs, or take
+    the run lock of its inputs (in the Django cache, shared by the
+    processes) so that it leads the later identical jobs.
+
+    Returns:
+    - Leader SimulationJob, or None if the job has to be run
+    """
+    from django.conf import settings
+    from .models import SimulationJob
+
+    lock = run_lock_key(job.cache_key)
+    for _ in range(3):
+        if acquire_lock(lock, str(job.id), settings.SIMULATION_JOB_LEASE):
+            return None
+        leader_id = lock_holder(lock)
+        if leader_id is None:
+            # Released in the meantime
+            continue
+        leader = SimulationJob.objects.filter(pk=leader_id).first()
+        if leader is None or leader.state not in ('QUEUED', 'RUNNING'):
+            # Lock left by a job that has ended (worker stopped before releasing it)
+            release_lock(lock, leader_id)
+            continue
+
+        SimulationJob.objects.filter(pk=job.pk).update(leader=leader)
+        job.leader = leader
+        # The leader may have ended before it could see this follower
+        leader.refresh_from_db()
+        if leader.state not in ('QUEUED', 'RUNNING'):
+            finish_followers(leader)
+            job.refresh_from_db()
+        return leader
+    return None
+
+
+def detach_followers(leaders):
+    """
+    Queue again the jobs of other simulations following in-flight jobs that
+    are about to be deleted (the first one leads the others).
+    """
+    from django.db import transaction
+    from .models import SimulationJob
+
+    for leader in leaders:
+        if leader.cache_key:
+            release_lock(run_lock_key(leader.cache_key), str(leader.id))
+    followers = SimulationJob.objects.filter(leader__in=leaders, state='QUEUED').exclude(
+        simulation_id__in={leader.simulation_id for leader in leaders}
+    )
+    broker = get_broker()
+    for follower in followers:
+        SimulationJob.objects.filter(pk=follower.pk).update(leader=None)
+        if join_in_flight(follower) is None:
+            transaction.on_commit(lambda job_id=follower.id: broker.enqueue(job_id))
+
+
+def finish_followers(leader):
+    """Copy the outcome of an ended job to the jobs following it."""
+    from .models import SimulationJob
+
+    SimulationJob.objects.filter(leader=leader, state__in=('QUEUED', 'RUNNING')).update(
+        state=leader.state,
+        progress=leader.progress,
+        stage=leader.stage,
+        result_id=leader.result_id,
+        summary=leader.summary,
+        error=leader.error,
+        started_at=leader.started_at,
+        finished_at=leader.finished_at
+    )
+
+
+def end_job(job):
+    """
+    Release the run lock of an ended job, hand its outcome to its followers
+    and drop its live events.
+    """
+    from .models import JobEvent
+
+    job.refresh_from_db()
+    if job.cache_key:
+        release_lock(run_lock_key(job.cache_key), str(job.id))
+    finish_followers(job)
+    JobEvent.objects.filter(job=job).delete()
+
+
+class JobProgress:
+    """
+    Progress callback of a job, (fraction, stage) -> None; writes are
+    throttled to one every PROGRESS_INTERVAL seconds within a stage. Also
+    records the live events of the job (see live): progress, stage
+    timings, and the statistics and preview of every block of rows
+    (chunk()), and renews the lease of the job in the broker at most every
+    RENEW_INTERVAL seconds.
+    """
+
+    def __init__(self, job_id, renew=None):
+        self.job_id = job_id
+        self.renew = renew
+        self.timings = {}
+        self.rows_done = 0
+        self._stage = None
+        self._stage_started = None
+        self._written = 0.0
+        self._renewed = time.monotonic()
+
+    def __call__(self, fraction, stage):
+        from .live import publish
+        from .models import SimulationJob
+
+        now = time.monotonic()
+        if self.renew is not None and now - self._renewed >= RENEW_INTERVAL:
+            self._renewed = now
+            self.renew()
+        if stage != self._stage:
+            self._end_stage(now)
+            self._stage_started = now
+            publish(self.job_id, 'stage', {'stage': stage, 'timings': dict(self.timings)})
+        elif now - self._written < PROGRESS_INTERVAL:
+            return
+        self._stage, self._written = stage, now
+        fraction = round(float(fraction), 4)
+        SimulationJob.objects.filter(pk=self.job_id).update(progress=fraction, stage=stage)
+        publish(self.job_id, 'progress', {'progress': fraction, 'stage': stage})
+
+    def _end_stage(self, now):
+        if self._stage is not None:
+            self.timings[self._stage] = round(self.timings.get(self._stage, 0.0) + now - self._stage_started, 3)
+
+    def chunk(self, grid, rows, signal, aggregator):
+        """Record the statistics and preview after a block of rows."""
+        from .live import grid_event, preview_event, publish, stats_event
+
+        if not self.rows_done:
+            publish(self.job_id, 'grid', grid_event(grid))
+        self.rows_done += rows.stop - rows.start
+        publish(self.job_id, 'stats', stats_event(grid, self.rows_done, aggregator))
+        preview = preview_event(grid, rows, signal)
+        if preview is not None:
+            publish(self.job_id, 'preview', preview)
+
+    def finish(self):
+        """Durations in s of the stages of the run."""
+        self._end_stage(time.monotonic())
+        self._stage = None
+        return self.timings
+
+
+def run_job(job_id, renew=None):
+    """
+    Run a queued job and record its outcome (jobs that already ran, e.g.
+    delivered twice, are skipped).
+
+    Parameters:
+    - job_id: Job id
+    - renew: Callable extending the lease of the job in the broker, called
+      as the job progresses, or None
+    """
+    from django.utils import timezone
+    from .models import SimulationJob
+    from .resultcache import lookup, store
+    from .views import run_propagation_model, run_sweep_model, RESULT_SUMMARY_FIELDS
+
+    job = SimulationJob.objects.select_related('parameters__simulation').filter(pk=job_id).first()
+    if job is None:
+        logger.warning("Simulation job %s not found", job_id)
+        return
+    if job.state in ('SUCCEEDED', 'FAILED'):
+        # Delivered again after a stop: the lock and followers may be left over
+        end_job(job)
+        return
+
+    jobs = SimulationJob.objects.filter(pk=job.pk)
+    # Same inputs computed by another job since this one was queued
+    entry = lookup(job.cache_key, record_miss=False)
+    if entry is not None:
+        now = timezone.now()
+        jobs.update(state='SUCCEEDED', progress=1.0, stage='cached', result=entry.result, summary=entry.summary,
+                    started_at=now, finished_at=now)
+        end_job(job)
+        return
+
+    jobs.update(state='RUNNING', progress=0.0, stage='', started_at=timezone.now())
+    monitor = JobProgress(job.pk, renew=renew)
+    try:
+        if job.sweep is not None:
+            # Parameter sweep: scalar table only, kept in the summary
+            result_id = None
+            summary = run_sweep_model(job.parameters, job.sweep, progress=monitor)
+        else:
+            data = run_propagation_model(job.parameters, progress=monitor, on_chunk=monitor.chunk)
+            result_id = data['result_id']
+            summary = {field: data[field] for field in RESULT_SUMMARY_FIELDS}
+    except Exception as e:
+        logger.exception("Simulation job %s failed", job_id)
+        jobs.update(state='FAILED', error=str(e), finished_at=timezone.now())
+    else:
+        summary['stage_timings'] = monitor.finish()
+        jobs.update(
+            state='SUCCEEDED',
+            progress=1.0,
+            stage='done',
+            result_id=result_id,
+            summary=summary,
+            finished_at=timezone.now()
+        )
+        if result_id is not None:
+            try:
+                store(job.cache_key, result_id, summary)
+            except Exception:
+                logger.exception("Result of simulation job %s could not be cached", job_id)
+    end_job(job)
+
+
+def work(broker, burst=False, stop=None):
+    """
+    Run the jobs of a broker until stop is set.
+
+    Parameters:
+    - broker: Broker
+    - burst: Return as soon as the queue is empty
+    - stop: threading.Event requesting the loop to end after the current job
+    """
+    from django.db import close_old_connections
+
+    while stop is None or not stop.is_set():
+        job_id = broker.dequeue(DEQUEUE_TIMEOUT)
+        if job_id is None:
+            if burst:
+                return
+            continue
+        close_old_connections()
+        try:
+            run_job(job_id, renew=partial(broker.renew, job_id))
+        except Exception:
+            # Database errors while recording the job: the worker keeps going
+            logger.exception("Simulation job %s could not be run", job_id)
+        finally:
+            broker.ack(job_id)
+            close_old_connections()
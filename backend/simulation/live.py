@@ -0,0 +1,241 @@
+"""
+Live progress of the simulation jobs, streamed as Server-Sent Events.
+
+The worker running a job records JobEvent rows as it goes:
+- progress: fraction done and current stage (throttled);
+- stage: stage entered, with the durations of the stages already done;
+- grid: geometry of the grid and of its preview, before the first rows;
+- stats: running coverage statistics after every block of rows;
+- preview: coarse rows of the signal raster (one cell every `factor`
+  cells), as the blocks of rows are computed.
+The events of a job are deleted once it has ended.
+
+Listeners are served by the ASGI application (async view, no thread held
+while waiting): in every process, the events of a job are polled by one
+asyncio task for all its listeners, whatever their number. Under WSGI a
+response cannot be streamed without holding a worker for the whole job, so
+each request only returns the events recorded so far (event_batch) and the
+EventSource reconnects after RECONNECT_INTERVAL, resuming from the last
+event.
+"""
+import asyncio
+import json
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Cells per side of the preview raster (at most)
+PREVIEW_SIZE = 128
+
+# Seconds between two polls of the events of a job
+POLL_INTERVAL = 0.5
+
+# Seconds between two keep-alive comments on an idle stream
+KEEPALIVE_INTERVAL = 15.0
+
+# Milliseconds before an EventSource reconnects to a batch response (WSGI)
+RECONNECT_INTERVAL = 2000
+
+ENDED_STATES = ('SUCCEEDED', 'FAILED')
+
+
+def publish(job_id, kind, data):
+    """Record an event of a job."""
+    from .models import JobEvent
+
+    JobEvent.objects.create(job_id=job_id, kind=kind, data=data)
+
+
+def preview_factor(grid):
+    """Grid cells per preview cell side."""
+    return max(1, -(-max(grid.shape) // PREVIEW_SIZE))
+
+
+def grid_event(grid):
+    """Geometry of a LocalGrid and of its preview raster."""
+    factor = preview_factor(grid)
+    return {
+        'center': [grid.center_lon, grid.center_lat],
+        'x0': float(grid.x[0]),
+        'y0': float(grid.y[0]),
+        'cell_size': grid.cell_size,
+        'shape': list(grid.shape),
+        'preview_factor': factor,
+        'preview_shape': [-(-grid.shape[0] // factor), -(-grid.shape[1] // factor)],
+    }
+
+
+def preview_event(grid, rows, signal):
+    """
+    Coarse rows of a block of the signal raster: the cells (i, j) with
+    i % factor == j % factor == factor // 2, rounded to the dBm.
+
+    Returns:
+    - {'row': first preview row, 'values': rows of dBm (None without
+      signal)}, or None if the block holds no preview row
+    """
+    factor = preview_factor(grid)
+    offset = factor // 2
+    first = rows.start + (offset - rows.start) % factor
+    sample = signal[first - rows.start::factor, offset::factor]
+    if not sample.size:
+        return None
+    return {
+        'row': first // factor,
+        'values': np.where(np.isnan(sample), None, np.rint(sample)).tolist(),
+    }
+
+
+def stats_event(grid, rows_done, aggregator):
+    """Running coverage statistics after rows_done rows of the grid."""
+    total_area = np.pi * grid.radius ** 2
+    covered_area = float(aggregator.covered_area)
+    return {
+        'rows': rows_done,
+        'total_rows': grid.shape[0],
+        'grid_cells': int(aggregator.grid_cells),
+        'covered_area': covered_area,
+        'coverage_percentage': covered_area / total_area * 100 if total_area else 0.0,
+        'population_covered': aggregator.population_covered,
+        'model_evaluations': aggregator.model_evaluations,
+    }
+
+
+async def job_events(job_id, after=0):
+    """
+    Events of a job (of the job it follows, if any) recorded after an event.
+
+    Returns:
+    - (ended, events): whether the job has ended (or does not exist), and
+      the list of {'id', 'kind', 'data'} events
+    """
+    from .models import JobEvent, SimulationJob
+
+    job = await SimulationJob.objects.filter(pk=job_id).values('state', 'leader_id').afirst()
+    if job is None:
+        return True, []
+    run_id = job['leader_id'] or job_id
+    events = [
+        event async for event in
+        JobEvent.objects.filter(job_id=run_id, id__gt=after).order_by('id').values('id', 'kind', 'data')
+    ]
+    return job['state'] in ENDED_STATES, events
+
+
+class JobFeed:
+    """Events of a job, polled once for all its listeners in the process."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.listeners = set()
+        self.last_id = 0
+        self.task = None
+
+    def broadcast(self, event):
+        for listener in self.listeners:
+            listener.put_nowait(event)
+
+
+class JobEventHub:
+    """
+    Feeds of the watched jobs of the process. A feed stops polling when its
+    last listener leaves or when its job ends (None is then sent to the
+    listeners).
+    """
+
+    def __init__(self):
+        self._feeds = {}
+
+    def subscribe(self, job_id):
+        """Queue receiving the events of a job."""
+        feed = self._feeds.get(job_id)
+        if feed is None:
+            feed = self._feeds[job_id] = JobFeed(job_id)
+        listener = asyncio.Queue()
+        feed.listeners.add(listener)
+        if feed.task is None:
+            feed.task = asyncio.get_running_loop().create_task(self._poll(feed))
+        return listener
+
+    def unsubscribe(self, job_id, listener):
+        feed = self._feeds.get(job_id)
+        if feed is not None:
+            feed.listeners.discard(listener)
+
+    async def _poll(self, feed):
+        try:
+            while feed.listeners:
+                ended, events = await job_events(feed.job_id, feed.last_id)
+                for event in events:
+                    feed.last_id = event['id']
+                    feed.broadcast(event)
+                if ended:
+                    break
+                await asyncio.sleep(POLL_INTERVAL)
+        except Exception:
+            logger.exception("Events of simulation job %s could not be polled", feed.job_id)
+        finally:
+            if self._feeds.get(feed.job_id) is feed:
+                del self._feeds[feed.job_id]
+            feed.broadcast(None)
+
+
+_hub = JobEventHub()
+
+
+def format_event(kind, data, event_id=None):
+    """Server-Sent Event message."""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {kind}", f"data: {json.dumps(data, default=str)}"]
+    return '\n'.join(lines) + '\n\n'
+
+
+async def event_stream(job_id, after, end_event):
+    """
+    Server-Sent Events of a job until it ends.
+
+    Parameters:
+    - job_id: Job id
+    - after: Id of the last event already received (Last-Event-ID), 0 for all
+    - end_event: Coroutine function returning the data of the final 'end'
+      event (state and links of the job)
+    """
+    listener = _hub.subscribe(job_id)
+    try:
+        # Events recorded before the subscription, then the live ones
+        ended, events = await job_events(job_id, after)
+        for event in events:
+            after = event['id']
+            yield format_event(event['kind'], event['data'], event['id'])
+
+        while not ended:
+            try:
+                event = await asyncio.wait_for(listener.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event is None:
+                break
+            if event['id'] > after:
+                after = event['id']
+                yield format_event(event['kind'], event['data'], event['id'])
+
+        yield format_event('end', await end_event())
+    finally:
+        _hub.unsubscribe(job_id, listener)
+
+
+async def event_batch(job_id, after, end_event):
+    """
+    Server-Sent Events of a job recorded after an event, as one message
+    (WSGI): the client reconnects after RECONNECT_INTERVAL ms to get the
+    next ones, and receives the final 'end' event once the job has ended.
+    """
+    ended, events = await job_events(job_id, after)
+    messages = [f"retry: {RECONNECT_INTERVAL}\n\n"]
+    messages += [format_event(event['kind'], event['data'], event['id']) for event in events]
+    if ended:
+        messages.append(format_event('end', await end_event()))
+    return ''.join(messages)
@@ -0,0 +1,30 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from simulation.jobs import get_broker, work
+
+
+class Command(BaseCommand):
+    help = "Run the queued simulation jobs (sqlite:// and redis:// brokers)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', action='store_true', help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        broker = get_broker()
+        if broker.runs_jobs:
+            raise CommandError(
+                "Le broker local:// exécute les tâches dans le processus web : "
+                "configurez SIMULATION_JOB_BROKER (sqlite:// ou redis://) pour utiliser des workers"
+            )
+
+        # SIGTERM/SIGINT: finish the current job, then exit
+        stop = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+
+        self.stdout.write(f"Simulation worker on {settings.SIMULATION_JOB_BROKER}")
+        work(broker, burst=options['burst'], stop=stop)
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0008_simulationparameter_h_simulationparameter_h_bs_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationparameter",
+            name="validity_fallback",
+            field=models.CharField(
+                choices=[
+                    ("SKIP", "Skip the cell"),
+                    ("CLAMP", "Clamp to the nearest valid distance"),
+                    ("FREE_SPACE", "Free-space path loss"),
+                ],
+                default="SKIP",
+                help_text="Handling of cells outside the model validity domain",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="simulationresult",
+            name="fallback_cells",
+            field=models.IntegerField(
+                default=0, help_text="Number of cells outside the model validity domain"
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0009_simulationparameter_validity_fallback_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationparameter",
+            name="evaluation_mode",
+            field=models.CharField(
+                choices=[
+                    ("GRID", "Every grid cell"),
+                    ("RADIAL", "Radial profile (isotropic site, flat terrain)"),
+                ],
+                default="GRID",
+                help_text="How the propagation model is evaluated on the grid",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="simulationresult",
+            name="interpolation_error",
+            field=models.FloatField(
+                blank=True,
+                help_text="Estimated radial-profile interpolation error in dB",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0010_simulationparameter_evaluation_mode_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationparameter",
+            name="grid_size",
+            field=models.FloatField(default=0.1, help_text="Grid cell size in kilometers"),
+        ),
+        migrations.AddField(
+            model_name="simulationresult",
+            name="signal_pyramid",
+            field=models.JSONField(
+                blank=True,
+                help_text="Coarser levels of the signal raster for the maps",
+                null=True,
+            ),
+        ),
+    ]
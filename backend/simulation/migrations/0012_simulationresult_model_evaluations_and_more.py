@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0011_simulationparameter_grid_size_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationresult",
+            name="model_evaluations",
+            field=models.IntegerField(
+                blank=True,
+                help_text="Number of cells on which the propagation model was evaluated",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="simulationparameter",
+            name="evaluation_mode",
+            field=models.CharField(
+                choices=[
+                    ("GRID", "Every grid cell"),
+                    ("RADIAL", "Radial profile (isotropic site, flat terrain)"),
+                    ("ADAPTIVE", "Adaptive refinement around the coverage boundary"),
+                ],
+                default="GRID",
+                help_text="How the propagation model is evaluated on the grid",
+                max_length=10,
+            ),
+        ),
+    ]
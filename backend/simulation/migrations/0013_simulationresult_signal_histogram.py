@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0012_simulationresult_model_evaluations_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationresult",
+            name="signal_histogram",
+            field=models.JSONField(
+                blank=True,
+                help_text="Histogram of the signal strengths (5 dB bins)",
+                null=True,
+            ),
+        ),
+    ]
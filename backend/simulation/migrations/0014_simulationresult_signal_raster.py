@@ -0,0 +1,143 @@
+# Generated by Django 5.2 on 2026-10-18 15:10
+
+import struct
+import zlib
+
+import numpy as np
+from django.db import migrations, models
+from pyproj import Transformer
+
+# Frozen copy of the raster codec of simulation.raster (format RSR1): the
+# migration must keep producing the same bytes whatever becomes of the module.
+MAGIC = b"RSR1"
+SCALE = 100
+NODATA = np.iinfo(np.int16).min
+DTYPE = np.dtype("<i2")
+HEADER = struct.Struct("<4s5d2I")
+AEQD = "+proj=aeqd +lat_0={lat} +lon_0={lon} +datum=WGS84 +units=m +no_defs"
+
+# Halvings of the cell size tried to give every legacy point its own cell
+MAX_REFINEMENTS = 4
+
+
+def to_local(center_lon, center_lat):
+    return Transformer.from_crs(AEQD.format(lon=center_lon, lat=center_lat), "EPSG:4326", always_xy=True)
+
+
+def quantize(values):
+    codes = np.full(values.shape, NODATA, dtype=DTYPE)
+    valid = ~np.isnan(values)
+    codes[valid] = np.clip(np.round(values[valid] * SCALE), NODATA + 1, np.iinfo(np.int16).max)
+    return codes
+
+
+def legacy_points(signal_strength):
+    coords = np.array([tuple(map(float, key.split(","))) for key in signal_strength], dtype=float).reshape(-1, 2)
+    values = np.fromiter(signal_strength.values(), dtype=float, count=len(signal_strength))
+    return coords[:, 0], coords[:, 1], values
+
+
+def encode_points(center_lon, center_lat, cell_size, lons, lats, values):
+    """
+    Encode legacy points on the local grid, refining the cell size until
+    every point has its own cell (the legacy grid was regular in degrees, so
+    its points are closer than grid_size along the parallels).
+
+    Returns:
+    - Encoded raster, or None if some points still share a cell
+    """
+    x, y = to_local(center_lon, center_lat).transform(lons, lats, direction="INVERSE")
+    x, y = np.asarray(x), np.asarray(y)
+    for _ in range(MAX_REFINEMENTS + 1):
+        step = cell_size * 1000  # m
+        i = np.rint(x / step).astype(int)
+        j = np.rint(y / step).astype(int)
+        shape = (i.max() - i.min() + 1, j.max() - j.min() + 1)
+        if len(np.unique(np.ravel_multi_index((i - i.min(), j - j.min()), shape))) == len(values):
+            codes = np.full(shape, NODATA, dtype=DTYPE)
+            codes[i - i.min(), j - j.min()] = quantize(values)
+            header = HEADER.pack(MAGIC, center_lon, center_lat, i.min() * step, j.min() * step, cell_size, *shape)
+            return header + zlib.compress(codes.tobytes(), 6)
+        cell_size /= 2
+    return None
+
+
+def decode(data):
+    """(lons, lats, values) of the cells with a value of an encoded raster."""
+    data = bytes(data)
+    magic, center_lon, center_lat, x0, y0, cell_size, nx, ny = HEADER.unpack_from(data)
+    codes = np.frombuffer(zlib.decompress(data[HEADER.size:]), dtype=DTYPE).reshape(nx, ny)
+    cells_i, cells_j = np.nonzero(codes != NODATA)
+    step = cell_size * 1000  # m
+    lons, lats = to_local(center_lon, center_lat).transform(x0 + cells_i * step, y0 + cells_j * step)
+    return np.asarray(lons), np.asarray(lats), codes[cells_i, cells_j] / SCALE
+
+
+def round_trips(data, values):
+    """Whether every legacy value is found back in the raster."""
+    _, _, decoded = decode(data)
+    return len(decoded) == len(values) and np.allclose(
+        np.sort(decoded), np.sort(np.round(values * SCALE) / SCALE), atol=0.5 / SCALE
+    )
+
+
+def encode_signal_rasters(apps, schema_editor):
+    """
+    Add a compact raster to the results that only have the legacy
+    "lon,lat" -> dBm dictionary. The dictionary is kept: the raster cells
+    are snapped to a metric grid, so it stays the exact record of the run.
+    """
+    SimulationResult = apps.get_model("simulation", "SimulationResult")
+    SimulationParameter = apps.get_model("simulation", "SimulationParameter")
+
+    for result in SimulationResult.objects.filter(signal_raster__isnull=True).iterator():
+        params = SimulationParameter.objects.filter(simulation_id=result.simulation_id).order_by("id").first()
+        if params is None or not result.signal_strength_data:
+            continue
+        lons, lats, values = legacy_points(result.signal_strength_data)
+        data = encode_points(params.location.x, params.location.y, params.grid_size, lons, lats, values)
+        if data is None or not round_trips(data, values):
+            continue
+        result.signal_raster = data
+        result.save(update_fields=["signal_raster"])
+
+
+def decode_signal_rasters(apps, schema_editor):
+    """Rebuild the dictionary of the results that only have a raster."""
+    SimulationResult = apps.get_model("simulation", "SimulationResult")
+
+    for result in SimulationResult.objects.filter(signal_raster__isnull=False, signal_strength_data__isnull=True).iterator():
+        lons, lats, values = decode(result.signal_raster)
+        result.signal_strength_data = {
+            f"{lon:.6f},{lat:.6f}": value for lon, lat, value in zip(lons, lats, values.tolist())
+        }
+        result.save(update_fields=["signal_strength_data"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0013_simulationresult_signal_histogram"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="simulationresult",
+            name="signal_strength_data",
+            field=models.JSONField(
+                blank=True,
+                help_text="Legacy signal strength data, replaced by signal_raster",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="simulationresult",
+            name="signal_raster",
+            field=models.BinaryField(
+                blank=True,
+                help_text="Signal strength raster (int16 centi-dBm, zlib-compressed)",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(encode_signal_rasters, decode_signal_rasters),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 16:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0014_simulationresult_signal_raster"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationresult",
+            name="raster_key",
+            field=models.CharField(
+                blank=True,
+                help_text="Key of the result rasters in the file-backed result store",
+                max_length=32,
+                null=True,
+            ),
+        ),
+    ]
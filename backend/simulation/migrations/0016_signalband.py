@@ -0,0 +1,76 @@
+# Generated by Django 5.2 on 2026-10-18 17:02
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0015_simulationresult_raster_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SignalBand",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "rank",
+                    models.PositiveSmallIntegerField(
+                        help_text="Band rank, 1 for the best signal"
+                    ),
+                ),
+                ("name", models.CharField(max_length=20)),
+                ("label", models.CharField(max_length=50)),
+                ("color", models.CharField(blank=True, max_length=20)),
+                (
+                    "min_signal",
+                    models.FloatField(help_text="Lower bound of the band in dBm"),
+                ),
+                (
+                    "max_signal",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Upper bound of the band in dBm (none for the best band)",
+                        null=True,
+                    ),
+                ),
+                ("area", models.FloatField(help_text="Area of the band in km²")),
+                (
+                    "population_covered",
+                    models.IntegerField(
+                        blank=True,
+                        help_text="Estimated population in the band",
+                        null=True,
+                    ),
+                ),
+                (
+                    "geometry",
+                    django.contrib.gis.db.models.fields.MultiPolygonField(
+                        help_text="Simplified polygons of the band", srid=4326
+                    ),
+                ),
+                (
+                    "result",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="signal_bands",
+                        to="simulation.simulationresult",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["result", "rank"],
+            },
+        ),
+    ]
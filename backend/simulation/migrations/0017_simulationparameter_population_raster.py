@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0016_signalband"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationparameter",
+            name="population_raster",
+            field=models.CharField(
+                blank=True,
+                help_text="Population raster (file name in SIMULATION_POPULATION_ROOT), used instead of population_density",
+                max_length=255,
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0017_simulationparameter_population_raster"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationparameter",
+            name="use_terrain",
+            field=models.BooleanField(
+                default=False,
+                help_text="Use the digital elevation model (per-cell line of sight)",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0018_simulationparameter_use_terrain"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationparameter",
+            name="diffraction_method",
+            field=models.CharField(
+                choices=[
+                    ("NONE", "No diffraction loss"),
+                    ("DEYGOUT", "Deygout (ITU-R P.526, three edges)"),
+                    ("EPSTEIN_PETERSON", "Epstein-Peterson"),
+                ],
+                default="DEYGOUT",
+                help_text="Knife-edge diffraction loss along the terrain profiles (with use_terrain)",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0019_simulationparameter_diffraction_method"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationparameter",
+            name="clutter_raster",
+            field=models.CharField(
+                blank=True,
+                help_text="Land-cover raster (file name in SIMULATION_CLUTTER_ROOT), per-cell area type instead of terrain_type",
+                max_length=255,
+                null=True,
+            ),
+        ),
+    ]
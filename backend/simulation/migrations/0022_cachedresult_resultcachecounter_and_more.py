@@ -0,0 +1,83 @@
+# Generated by Django 5.2 on 2026-10-18 21:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0021_simulationjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ResultCacheCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=20, unique=True)),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="simulationjob",
+            name="cache_key",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                help_text="Canonical hash of the run inputs (result cache)",
+                max_length=64,
+            ),
+        ),
+        migrations.CreateModel(
+            name="CachedResult",
+            fields=[
+                (
+                    "key",
+                    models.CharField(
+                        help_text="Canonical hash of the run inputs",
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "summary",
+                    models.JSONField(
+                        help_text="Scalar results of the run (coverage, population...)"
+                    ),
+                ),
+                (
+                    "size",
+                    models.BigIntegerField(
+                        help_text="Stored size of the result in bytes"
+                    ),
+                ),
+                ("hits", models.IntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_used_at",
+                    models.DateTimeField(auto_now_add=True, db_index=True),
+                ),
+                (
+                    "result",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cache_entries",
+                        to="simulation.simulationresult",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["last_used_at"],
+            },
+        ),
+    ]
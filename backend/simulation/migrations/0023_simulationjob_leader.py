@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 22:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0022_cachedresult_resultcachecounter_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationjob",
+            name="leader",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="In-flight job with the same inputs whose outcome this job receives",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="followers",
+                to="simulation.simulationjob",
+            ),
+        ),
+    ]
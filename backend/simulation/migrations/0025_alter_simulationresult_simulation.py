@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 23:40
+
+import simulation.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0024_jobevent"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="simulationresult",
+            name="simulation",
+            field=models.ForeignKey(
+                on_delete=simulation.models.hand_over_shared_results,
+                related_name="results",
+                to="simulation.simulation",
+            ),
+        ),
+    ]
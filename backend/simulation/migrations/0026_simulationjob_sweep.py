@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0025_alter_simulationresult_simulation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationjob",
+            name="sweep",
+            field=models.JSONField(
+                blank=True,
+                help_text="Axes {parameter: [values]} of a parameter sweep (none for a single run)",
+                null=True,
+            ),
+        ),
+    ]
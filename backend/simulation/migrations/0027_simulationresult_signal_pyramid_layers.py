@@ -0,0 +1,94 @@
+# Generated by Django 5.2 on 2026-10-18 23:55
+
+import json
+import os
+
+import numpy as np
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copy of the result store layout of simulation.store: one .npy file
+# per layer and a meta.json file listing the layers, per result directory.
+META_FILE = "meta.json"
+
+
+def level_layer(level):
+    return "signal" if level == 0 else f"signal_{level}"
+
+
+def result_dir(key):
+    return os.path.join(settings.SIMULATION_RESULTS_ROOT, key)
+
+
+def write_meta(key, meta):
+    path = os.path.join(result_dir(key), META_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(path + ".tmp", path)
+
+
+def move_levels_to_store(apps, schema_editor):
+    """
+    Write the pyramid levels stored inline in signal_pyramid to the result
+    store and keep only their geometry in the row. Results without a store
+    directory keep their inline levels (still read by coverage_level).
+    """
+    SimulationResult = apps.get_model("simulation", "SimulationResult")
+
+    for result in SimulationResult.objects.filter(raster_key__isnull=False, signal_pyramid__isnull=False).iterator():
+        meta_path = os.path.join(result_dir(result.raster_key), META_FILE)
+        levels = result.signal_pyramid.get("levels", [])
+        if not os.path.exists(meta_path) or not any("values" in level for level in levels):
+            continue
+        with open(meta_path) as f:
+            meta = json.load(f)
+        for level in levels:
+            level["layer"] = level_layer(level["level"])
+            if "values" not in level:
+                continue
+            values = np.array(
+                [[np.nan if v is None else v for v in row] for row in level.pop("values")], dtype=np.float32
+            ).reshape(level["shape"])
+            np.save(os.path.join(result_dir(result.raster_key), f"{level['layer']}.npy"), values)
+            meta["layers"][level["layer"]] = values.dtype.str
+        write_meta(result.raster_key, meta)
+        result.save(update_fields=["signal_pyramid"])
+
+
+def move_levels_to_rows(apps, schema_editor):
+    """Put the values of the stored levels back inline (rounded to 0.01 dB, None for NaN)."""
+    SimulationResult = apps.get_model("simulation", "SimulationResult")
+
+    for result in SimulationResult.objects.filter(raster_key__isnull=False, signal_pyramid__isnull=False).iterator():
+        levels = result.signal_pyramid.get("levels", [])
+        if not any(level.get("layer", "signal") != "signal" for level in levels):
+            continue
+        for level in levels:
+            layer = level.get("layer", "signal")
+            path = os.path.join(result_dir(result.raster_key), f"{layer}.npy")
+            if layer == "signal" or not os.path.exists(path):
+                continue
+            values = np.round(np.load(path).astype(float), 2)
+            level["values"] = [[None if np.isnan(v) else v for v in row] for row in values.tolist()]
+            del level["layer"]
+        result.save(update_fields=["signal_pyramid"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0026_simulationjob_sweep"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="simulationresult",
+            name="signal_pyramid",
+            field=models.JSONField(
+                blank=True,
+                help_text="Geometry of the coarser levels of the signal raster for the maps (values in the result store)",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(move_levels_to_store, move_levels_to_rows),
+    ]
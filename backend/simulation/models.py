@@ -1,6 +1,13 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.gis.db import models as gis_models
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from .raster import CompactRaster
+from .store import get_result_store
 
 class Simulation(models.Model):
     name = models.CharField(max_length=100)
@@ -12,6 +19,12 @@ class Simulation(models.Model):
     def __str__(self):
         return self.name
 
+    def all_results(self):
+        """Results of the simulation, including the cached results reused by its jobs."""
+        return SimulationResult.objects.filter(
+            models.Q(simulation=self) | models.Q(jobs__simulation=self)
+        ).distinct().order_by('pk')
+
 class SimulationParameter(models.Model):
     TECHNOLOGY_CHOICES = [
         ('2G', '2G - GSM'),
@@ -48,6 +61,27 @@ class SimulationParameter(models.Model):
         ('OPEN', 'Open'),
     ]
     
+    # Traitement des cellules hors du domaine de validité du modèle
+    VALIDITY_FALLBACK_CHOICES = [
+        ('SKIP', 'Skip the cell'),
+        ('CLAMP', 'Clamp to the nearest valid distance'),
+        ('FREE_SPACE', 'Free-space path loss'),
+    ]
+    
+    # Mode d'évaluation du modèle sur la grille
+    EVALUATION_MODE_CHOICES = [
+        ('GRID', 'Every grid cell'),
+        ('RADIAL', 'Radial profile (isotropic site, flat terrain)'),
+        ('ADAPTIVE', 'Adaptive refinement around the coverage boundary'),
+    ]
+    
+    # Pertes de diffraction sur le relief (avec use_terrain)
+    DIFFRACTION_METHOD_CHOICES = [
+        ('NONE', 'No diffraction loss'),
+        ('DEYGOUT', 'Deygout (ITU-R P.526, three edges)'),
+        ('EPSTEIN_PETERSON', 'Epstein-Peterson'),
+    ]
+    
     simulation = models.ForeignKey(Simulation, on_delete=models.CASCADE, related_name='parameters')
     technology = models.CharField(max_length=10, choices=TECHNOLOGY_CHOICES)
     propagation_model = models.CharField(max_length=20, choices=PROPAGATION_MODEL_CHOICES)
@@ -69,19 +103,195 @@ class SimulationParameter(models.Model):
     location = gis_models.PointField(help_text="Antenna location (longitude, latitude)")
     radius = models.FloatField(help_text="Simulation radius in kilometers")
     population_density = models.FloatField(help_text="Population density per square kilometer", blank=True, null=True)
+    population_raster = models.CharField(max_length=255, blank=True, null=True,
+                                         help_text="Population raster (file name in SIMULATION_POPULATION_ROOT), "
+                                                   "used instead of population_density")
+    clutter_raster = models.CharField(max_length=255, blank=True, null=True,
+                                      help_text="Land-cover raster (file name in SIMULATION_CLUTTER_ROOT), "
+                                                "per-cell area type instead of terrain_type")
+    validity_fallback = models.CharField(max_length=10, choices=VALIDITY_FALLBACK_CHOICES, default='SKIP',
+                                         help_text="Handling of cells outside the model validity domain")
+    evaluation_mode = models.CharField(max_length=10, choices=EVALUATION_MODE_CHOICES, default='GRID',
+                                       help_text="How the propagation model is evaluated on the grid")
+    grid_size = models.FloatField(default=0.1, help_text="Grid cell size in kilometers")
+    use_terrain = models.BooleanField(default=False,
+                                      help_text="Use the digital elevation model (per-cell line of sight)")
+    diffraction_method = models.CharField(max_length=20, choices=DIFFRACTION_METHOD_CHOICES, default='DEYGOUT',
+                                          help_text="Knife-edge diffraction loss along the terrain profiles "
+                                                    "(with use_terrain)")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Parameters for {self.simulation.name}"
 
+def hand_over_shared_results(collector, field, sub_objs, using):
+    """
+    on_delete of SimulationResult.simulation: results reused through the
+    result cache by jobs of other simulations are handed over to one of
+    them instead of being deleted; the others are deleted (CASCADE). Runs
+    for every deletion (instance, queryset and cascades).
+    """
+    deleted = {simulation.pk for simulation in collector.data.get(Simulation, ())}
+    owned = []
+    for result in sub_objs:
+        job = result.jobs.exclude(simulation_id__in=deleted).first()
+        if job is None:
+            owned.append(result)
+        else:
+            SimulationResult.objects.filter(pk=result.pk).update(simulation_id=job.simulation_id)
+    if owned:
+        models.CASCADE(collector, field, owned, using)
+
 class SimulationResult(models.Model):
-    simulation = models.ForeignKey(Simulation, on_delete=models.CASCADE, related_name='results')
+    simulation = models.ForeignKey(Simulation, on_delete=hand_over_shared_results, related_name='results')
     coverage_area = gis_models.MultiPolygonField(help_text="Coverage area polygons")
     coverage_percentage = models.FloatField(help_text="Percentage of area covered")
     population_covered = models.IntegerField(help_text="Estimated population covered", blank=True, null=True)
-    signal_strength_data = models.JSONField(help_text="Signal strength data for visualization")
+    signal_strength_data = models.JSONField(blank=True, null=True,
+                                            help_text="Legacy signal strength data, replaced by signal_raster")
+    signal_raster = models.BinaryField(blank=True, null=True,
+                                       help_text="Signal strength raster (int16 centi-dBm, zlib-compressed)")
+    fallback_cells = models.IntegerField(default=0, help_text="Number of cells outside the model validity domain")
+    interpolation_error = models.FloatField(blank=True, null=True,
+                                            help_text="Estimated radial-profile interpolation error in dB")
+    model_evaluations = models.IntegerField(blank=True, null=True,
+                                            help_text="Number of cells on which the propagation model was evaluated")
+    raster_key = models.CharField(max_length=32, blank=True, null=True,
+                                  help_text="Key of the result rasters in the file-backed result store")
+    signal_histogram = models.JSONField(blank=True, null=True,
+                                        help_text="Histogram of the signal strengths (5 dB bins)")
+    signal_pyramid = models.JSONField(blank=True, null=True,
+                                      help_text="Geometry of the coarser levels of the signal raster for the maps "
+                                                "(values in the result store)")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Results for {self.simulation.name}"
+
+    def get_signal_raster(self):
+        """Decoded signal raster (CompactRaster), or None."""
+        if not self.signal_raster:
+            return None
+        return CompactRaster.from_bytes(self.signal_raster)
+
+    def signal_strength(self):
+        """
+        {"lon,lat": dBm} dictionary of the result: the stored legacy one
+        (exact points of the runs made before the rasters), or the one of
+        the raster.
+        """
+        if self.signal_strength_data:
+            return self.signal_strength_data
+        raster = self.get_signal_raster()
+        return raster.to_signal_strength() if raster is not None else {}
+
+    def open_raster_layer(self, layer='signal'):
+        """Memory-mapped layer of the result store (read-only), or None."""
+        if not self.raster_key:
+            return None
+        return get_result_store().layer(self.raster_key, layer)
+
+class SignalBand(models.Model):
+    """Signal class of a result (polygons, area and population of its cells)."""
+    result = models.ForeignKey(SimulationResult, on_delete=models.CASCADE, related_name='signal_bands')
+    rank = models.PositiveSmallIntegerField(help_text="Band rank, 1 for the best signal")
+    name = models.CharField(max_length=20)
+    label = models.CharField(max_length=50)
+    color = models.CharField(max_length=20, blank=True)
+    min_signal = models.FloatField(help_text="Lower bound of the band in dBm")
+    max_signal = models.FloatField(blank=True, null=True, help_text="Upper bound of the band in dBm (none for the best band)")
+    area = models.FloatField(help_text="Area of the band in km²")
+    population_covered = models.IntegerField(help_text="Estimated population in the band", blank=True, null=True)
+    geometry = gis_models.MultiPolygonField(help_text="Simplified polygons of the band")
+
+    class Meta:
+        ordering = ['result', 'rank']
+
+    def __str__(self):
+        return f"{self.label} ({self.result})"
+
+class SimulationJob(models.Model):
+    """Queued run of the propagation model for a SimulationParameter."""
+    STATE_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    simulation = models.ForeignKey(Simulation, on_delete=models.CASCADE, related_name='jobs')
+    parameters = models.ForeignKey(SimulationParameter, on_delete=models.CASCADE, related_name='jobs')
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default='QUEUED')
+    progress = models.FloatField(default=0.0, help_text="Fraction of the run done (0 to 1)")
+    stage = models.CharField(max_length=20, blank=True, help_text="Current stage of the run")
+    result = models.ForeignKey(SimulationResult, on_delete=models.SET_NULL, related_name='jobs', blank=True, null=True)
+    summary = models.JSONField(blank=True, null=True, help_text="Scalar results of the run (coverage, population...)")
+    error = models.TextField(blank=True)
+    cache_key = models.CharField(max_length=64, blank=True, db_index=True,
+                                 help_text="Canonical hash of the run inputs (result cache)")
+    leader = models.ForeignKey('self', on_delete=models.SET_NULL, related_name='followers', blank=True, null=True,
+                               help_text="In-flight job with the same inputs whose outcome this job receives")
+    sweep = models.JSONField(blank=True, null=True,
+                             help_text="Axes {parameter: [values]} of a parameter sweep (none for a single run)")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Job {self.id} ({self.state})"
+
+class JobEvent(models.Model):
+    """Progress event of a running job (streamed to its listeners, deleted when the job ends)."""
+    job = models.ForeignKey(SimulationJob, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=20)
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.kind} of job {self.job_id}"
+
+class CachedResult(models.Model):
+    """Result reusable by every run with the same canonical inputs."""
+    key = models.CharField(max_length=64, primary_key=True, help_text="Canonical hash of the run inputs")
+    result = models.ForeignKey(SimulationResult, on_delete=models.CASCADE, related_name='cache_entries')
+    summary = models.JSONField(help_text="Scalar results of the run (coverage, population...)")
+    size = models.BigIntegerField(help_text="Stored size of the result in bytes")
+    hits = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['last_used_at']
+
+    def __str__(self):
+        return f"Cached {self.result} ({self.key[:12]})"
+
+class ResultCacheCounter(models.Model):
+    """Counter of the result cache (hits, misses, evictions)."""
+    name = models.CharField(max_length=20, unique=True)
+    value = models.BigIntegerField(default=0)
 
     def __str__(self):
-        return f"Results for {self.simulation.name}"
\ No newline at end of file
+        return f"{self.name}: {self.value}"
+
+@receiver(post_delete, sender=SimulationResult)
+def delete_result_rasters(sender, instance, **kwargs):
+    """Remove the files of a deleted result from the result store."""
+    if instance.raster_key:
+        get_result_store().delete(instance.raster_key)
+
+@receiver(pre_delete, sender=SimulationJob)
+def detach_job_followers(sender, instance, **kwargs):
+    """Queue again the jobs of other simulations following a deleted in-flight job."""
+    from .jobs import detach_followers
+
+    if instance.state in ('QUEUED', 'RUNNING'):
+        detach_followers([instance])
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""
+Population rasters.
+
+A population raster gives the number of inhabitants of every pixel of a
+north-up grid (GeoTIFF, or .npy + .json sidecar, see georaster).
+
+Rasters are registered by dropping them in settings.SIMULATION_POPULATION_ROOT
+and are read by fixed-size tiles kept in a process-wide TileCache, so the
+tiles of a region are read from disk once for all the simulations run by a
+worker. The population of the simulation cells is resampled one block of
+rows at a time, with a windowed read of the pixels under the block only.
+"""
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from .georaster import EARTH_RADIUS, GDALTiledRaster, NpyRaster, TiledRaster, list_rasters, raster_path
+from .tilecache import TileCache
+
+
+class PopulationRaster(TiledRaster):
+    """
+    North-up raster of inhabitants per pixel.
+    """
+
+    def _decode(self, values):
+        values = np.array(values, dtype=np.float32)
+        # No population for nodata pixels
+        invalid = ~np.isfinite(values) | (values < 0)
+        if self.nodata is not None:
+            invalid |= values == self.nodata
+        values[invalid] = 0
+        return values
+
+    def tile_cache(self):
+        return get_population_tile_cache()
+
+    def pixel_area(self, rows):
+        """Area in km² of the pixels of the given rows."""
+        if self.crs.is_geographic:
+            lat = np.radians(self.y0 + (np.asarray(rows) + 0.5) * self.dy)
+            return EARTH_RADIUS ** 2 * abs(np.radians(self.dx) * np.radians(self.dy)) * np.cos(lat)
+        unit = self.crs.axis_info[0].unit_conversion_factor  # m
+        return np.full(np.shape(rows), abs(self.dx * self.dy) * unit ** 2 / 1e6)
+
+    def density(self, x, y):
+        """
+        Population density in inhabitants/km² at points of the raster CRS
+        (0 outside of the raster).
+        """
+        row, col, inside = self.pixel_indices(x, y)
+        density = np.zeros(row.shape)
+        if not inside.any():
+            return density
+
+        # Windowed read: only the pixels under the points
+        row, col = row[inside], col[inside]
+        row0, col0 = row.min(), col.min()
+        values = self.window(row0, row.max() + 1, col0, col.max() + 1)
+        density[inside] = values[row - row0, col - col0] / self.pixel_area(row)
+        return density
+
+    def cell_population(self, grid, rows=slice(None)):
+        """
+        Inhabitants of the cells of a LocalGrid (of the given rows).
+
+        When the pixels are smaller than the cells, every populated pixel of
+        the window under the rows is assigned to the cell containing its
+        centre (zonal sum, the population is conserved). Otherwise the
+        density is sampled at the cell centres and multiplied by the cell
+        area.
+
+        Returns:
+        - Array of shape (rows, grid.shape[1])
+        """
+        step = grid.cell_size * 1000  # m
+        x, y = grid.x[rows], grid.y
+
+        if self.pixel_size() >= step:
+            return self.density(*self.grid_centres(grid, rows)) * grid.cell_area
+
+        population = np.zeros((len(x), len(y)))
+        window = self._window_under(grid, x)
+        if window is None:
+            return population
+        values = self.window(*window)
+
+        # Zonal sum of the populated pixels: one bincount over the cells of the rows
+        pixel_rows, pixel_cols = np.nonzero(values)
+        i, j, inside = self.pixel_cells(grid, rows, window, pixel_rows, pixel_cols)
+        cells = i[inside] * len(y) + j[inside]
+        weights = values[pixel_rows[inside], pixel_cols[inside]]
+        population += np.bincount(cells, weights=weights, minlength=population.size).reshape(population.shape)
+        return population
+
+
+class NpyPopulationRaster(NpyRaster, PopulationRaster):
+    """Binary population grid (memory-mapped .npy array and .json sidecar)."""
+
+
+class GDALPopulationRaster(GDALTiledRaster, PopulationRaster):
+    """Population raster read by GDAL (first band of a GeoTIFF...)."""
+
+
+@lru_cache(maxsize=16)
+def _open_raster(path, mtime_ns):
+    if path.endswith('.npy'):
+        return NpyPopulationRaster(path)
+    return GDALPopulationRaster(path)
+
+
+def population_raster_path(name):
+    """Path of a registered population raster (file name in SIMULATION_POPULATION_ROOT)."""
+    from django.conf import settings
+
+    return raster_path(settings.SIMULATION_POPULATION_ROOT, name, 'de population')
+
+
+def open_population_raster(name):
+    """
+    Registered population raster; opened rasters are reused until their
+    file changes.
+    """
+    path = population_raster_path(name)
+    return _open_raster(path, os.stat(path).st_mtime_ns)
+
+
+def list_population_rasters():
+    """File names of the registered population rasters."""
+    from django.conf import settings
+
+    return list_rasters(settings.SIMULATION_POPULATION_ROOT)
+
+
+_tile_cache = None
+
+
+def get_population_tile_cache():
+    """Process-wide tile cache of the population rasters."""
+    global _tile_cache
+    if _tile_cache is None:
+        from django.conf import settings
+        _tile_cache = TileCache(settings.SIMULATION_POPULATION_CACHE_MB * 1024 * 1024)
+    return _tile_cache
@@ -0,0 +1,27 @@
+"""
+Validity domains of the propagation models.
+
+Every model declares VALIDITY_DOMAIN, the (min, max) validity range of each
+of its inputs, and VALIDITY_MESSAGES, the error raised when an input lies
+outside of it. check_domain() is the only place where inputs are checked
+against these tables: the model functions and the compiled kernels both go
+through it, and the kernels take their distance range from the 'distance'
+entry.
+"""
+import numpy as np
+
+
+def check_domain(domain, messages, **values):
+    """
+    Raise ValueError if an input lies outside its validity range.
+
+    Parameters:
+    - domain: VALIDITY_DOMAIN of the model
+    - messages: VALIDITY_MESSAGES of the model
+    - values: Inputs by name (scalars or arrays)
+    """
+    for name, value in values.items():
+        low, high = domain[name]
+        value = np.asarray(value, dtype=float)
+        if np.any(value < low) or np.any(value > high) or np.any(np.isnan(value)):
+            raise ValueError(messages[name])
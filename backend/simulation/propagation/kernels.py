@@ -0,0 +1,266 @@
+"""
+Compiled path-loss kernels.
+
+Every supported model reduces, once its parameters are fixed, to one or more
+log-distance laws L(d) = A + B*log10(d) (piecewise around a breakpoint, and
+combined with a maximum for NLOS). compile_model() folds all the terms that
+only depend on the parameters (frequency, heights, area corrections,
+breakpoint distance...) into the constants A and B once, so the engine, the
+radius solver and the optimizers share a kernel instead of re-deriving them
+for every evaluation.
+"""
+import math
+import numpy as np
+
+from . import okumura_hata, cost_231
+from .domain import check_domain
+from ..propagation_models_5g import PropagationModel5G, ThreeGPP_TR_38901, MillimeterWavePropagation
+
+
+class LogDistanceBranch:
+    """
+    Piecewise log-distance law L(d) = A_i + B_i*log10(d') + C*d'.
+
+    Segment i applies to breakpoints[i-1] <= d < breakpoints[i] (2D distance).
+    d' is the 3D distance sqrt(d^2 + height_offset^2) when height_offset is
+    non-zero, the 2D distance otherwise.
+    """
+
+    def __init__(self, intercepts, slopes, breakpoints=(), height_offset=0.0, linear=0.0):
+        self.intercepts = np.asarray(intercepts, dtype=float)
+        self.slopes = np.asarray(slopes, dtype=float)
+        self.breakpoints = np.asarray(breakpoints, dtype=float)
+        self.height_offset = float(height_offset)
+        self.linear = float(linear)
+
+        if len(self.intercepts) != len(self.slopes) or len(self.slopes) != len(self.breakpoints) + 1:
+            raise ValueError("A piecewise branch needs one (A, B) pair per segment")
+
+    @property
+    def is_log_linear(self):
+        """True if the branch is a single A + B*log10(d) law on the 2D distance."""
+        return len(self.breakpoints) == 0 and self.height_offset == 0 and self.linear == 0
+
+    def __call__(self, distance):
+        distance = np.asarray(distance, dtype=float)
+        if self.height_offset:
+            effective = np.sqrt(distance**2 + self.height_offset**2)
+        else:
+            effective = distance
+
+        loss = np.log10(effective)
+        if len(self.breakpoints):
+            segment = np.searchsorted(self.breakpoints, distance, side='right')
+            loss = self.intercepts[segment] + self.slopes[segment] * loss
+        else:
+            loss = self.intercepts[0] + self.slopes[0] * loss
+
+        if self.linear:
+            loss = loss + self.linear * effective
+        return loss
+
+
+class PathLossKernel:
+    """
+    Path-loss kernel evaluated on distances in kilometers.
+
+    The loss is the maximum of its branches (a single branch for LOS and the
+    Hata family, LOS and NLOS branches for NLOS scenarios). scale converts
+    kilometers to the distance unit the model constants were folded for.
+    """
+
+    def __init__(self, branches, distance_range, scale=1.0):
+        self.branches = list(branches)
+        self.distance_range = tuple(distance_range)  # km
+        self.scale = float(scale)
+
+    def __call__(self, distance):
+        """
+        Path loss in dB for an array of distances in km (no range check).
+        """
+        distance = np.asarray(distance, dtype=float) * self.scale
+        loss = self.branches[0](distance)
+        for branch in self.branches[1:]:
+            loss = np.maximum(loss, branch(distance))
+        return loss
+
+    @property
+    def is_log_linear(self):
+        return len(self.branches) == 1 and self.branches[0].is_log_linear
+
+    @property
+    def breakpoints(self):
+        """Sorted breakpoint distances of all branches, in km."""
+        return sorted(float(bp) / self.scale for branch in self.branches for bp in branch.breakpoints)
+
+    def coverage_radius(self, max_path_loss, tolerance=0.01):
+        """
+        Maximum distance in km at which the loss stays below max_path_loss.
+
+        Parameters:
+        - max_path_loss: Maximum allowed path loss in dB (scalar or array)
+        - tolerance: Precision in km of the bisection fallback
+
+        Returns:
+        - Radius in km as a NumPy array, clipped to the kernel distance range
+        """
+        max_path_loss = np.asarray(max_path_loss, dtype=float)
+        min_distance, max_distance = self.distance_range
+
+        if self.is_log_linear:
+            branch = self.branches[0]
+            radius = 10 ** ((max_path_loss - branch.intercepts[0]) / branch.slopes[0]) / self.scale
+            return np.clip(radius, min_distance, max_distance)
+
+        return PropagationModel5G.bisect_coverage_radius(
+            self, max_path_loss, min_distance, max_distance, tolerance=tolerance
+        )
+
+
+def evaluate_kernels(kernels, distance):
+    """
+    Path losses of several kernels on the same distances in km.
+
+    Single-law kernels (Hata family...) are evaluated together in one
+    broadcast A + B*log10(d) over a shared log10(d); the others one by one.
+
+    Returns:
+    - Array of shape (len(kernels), len(distance))
+    """
+    distance = np.asarray(distance, dtype=float)
+    loss = np.empty((len(kernels), distance.size))
+    single = [k for k, kernel in enumerate(kernels) if kernel.is_log_linear]
+    if single:
+        # log10(scale * d) = log10(scale) + log10(d): the scale is folded into A
+        slopes = np.array([kernels[k].branches[0].slopes[0] for k in single])
+        intercepts = np.array([kernels[k].branches[0].intercepts[0] for k in single]) \
+            + slopes * np.log10([kernels[k].scale for k in single])
+        with np.errstate(divide='ignore'):
+            log_distance = np.log10(distance)
+        loss[single] = intercepts[:, None] + slopes[:, None] * log_distance
+    for k, kernel in enumerate(kernels):
+        if not kernel.is_log_linear:
+            loss[k] = kernel(distance)
+    return loss
+
+
+def compile_hata(frequency, antenna_height, mobile_height, area_type, model=okumura_hata):
+    """
+    Compile an Okumura-Hata or COST-231 kernel (distances in km).
+
+    Parameters:
+    - frequency: Frequency in MHz
+    - antenna_height: Base station antenna height in meters
+    - mobile_height: Mobile antenna height in meters
+    - area_type: 'URBAN', 'SUBURBAN', 'RURAL', or 'OPEN'
+    - model: okumura_hata or cost_231 module
+
+    Returns:
+    - PathLossKernel
+    """
+    check_domain(
+        model.VALIDITY_DOMAIN, model.VALIDITY_MESSAGES, frequency=frequency,
+        antenna_height=antenna_height, mobile_height=mobile_height,
+    )
+    # The loss at 1 km is the intercept, the slope only depends on hb
+    intercept = model.calculate_path_loss(frequency, antenna_height, mobile_height, 1.0, area_type)
+    slope = 44.9 - 6.55 * math.log10(antenna_height)
+    return PathLossKernel([LogDistanceBranch([intercept], [slope])], model.VALIDITY_DOMAIN['distance'])
+
+
+def compile_tr38901(frequency, scenario, los_condition, h_bs=10.0, h_ut=1.5, h=5.0, w=20.0):
+    """
+    Compile a 3GPP TR 38.901 kernel (distances in km, constants folded in m).
+
+    Parameters:
+    - frequency: Frequency in Hz (0.5-100 GHz)
+    - scenario: 'UMa', 'UMi', 'RMa', 'InH-Office' or 'InH-ShoppingMall'
+    - los_condition: 'LOS' or 'NLOS'
+    - h_bs, h_ut, h, w: see ThreeGPP_TR_38901.path_loss
+
+    Returns:
+    - PathLossKernel
+    """
+    model = ThreeGPP_TR_38901
+    check_domain(model.VALIDITY_DOMAIN, model.VALIDITY_MESSAGES, frequency=frequency)
+    if scenario not in model.SCENARIOS:
+        raise ValueError(f"Scénario {scenario} non pris en charge. Choisissez parmi: UMa, UMi, RMa, InH-Office, InH-ShoppingMall")
+
+    log_f = math.log10(frequency / 1e9)
+    dh = h_bs - h_ut
+
+    if scenario == "UMa":
+        dbp = 4 * h_bs * h_ut * (frequency / 3e8)
+        los = LogDistanceBranch(
+            [28.0 + 20 * log_f, 28.0 + 20 * log_f - 9 * math.log10(dbp**2 + dh**2)],
+            [22, 40], [dbp], height_offset=dh
+        )
+        nlos = LogDistanceBranch([13.54 + 20 * log_f - 0.6 * (h_ut - 1.5)], [39.08], height_offset=dh)
+    elif scenario == "UMi":
+        los = LogDistanceBranch([32.4 + 20 * log_f], [21], height_offset=dh)
+        nlos = LogDistanceBranch([22.4 + 21.3 * log_f - 0.3 * (h_ut - 1.5)], [35.3], height_offset=dh)
+    elif scenario == "RMa":
+        dbp = 2 * math.pi * h_bs * h_ut * (frequency / 3e8)
+        # FSPL(d) + 21*log10(d/10) below dbp, 40 dB/decade beyond (2D distance)
+        fspl_1m = 20 * math.log10(4 * math.pi * frequency / 3e8)
+        far = PropagationModel5G.free_space_path_loss(frequency, dbp) + 21 * math.log10(dbp / 10) - 40 * math.log10(dbp)
+        los = LogDistanceBranch([fspl_1m - 21, far], [41, 40], [dbp])
+        slope = 43.42 - 3.1 * math.log10(h_bs)
+        intercept = (161.04 - 7.1 * math.log10(w) + 7.5 * math.log10(h)
+                     - (24.37 - 3.7 * (h / h_bs)**2) * math.log10(h_bs) - 3 * slope + 20 * log_f
+                     - (3.2 * (math.log10(11.75 * h_ut))**2 - 4.97))
+        nlos = LogDistanceBranch([intercept], [slope], height_offset=dh)
+    elif scenario == "InH-Office":
+        los = LogDistanceBranch([32.4 + 20 * log_f], [17.3], height_offset=dh)
+        nlos = LogDistanceBranch([17.3 + 24.9 * log_f], [38.3], height_offset=dh)
+    else:  # InH-ShoppingMall
+        los = LogDistanceBranch([32.4 + 20 * log_f], [17.3], height_offset=dh)
+        nlos = LogDistanceBranch([11.3 + 20 * log_f], [42.7], height_offset=dh)
+
+    branches = [los] if los_condition == "LOS" else [los, nlos]
+    distance_range = tuple(d / 1000 for d in model.VALIDITY_DOMAIN['distance'])
+    return PathLossKernel(branches, distance_range, scale=1000)
+
+
+def compile_mmwave(frequency, los_condition, material_attenuation=0.0):
+    """
+    Compile a millimeter-wave kernel (distances in km, constants folded in m).
+    """
+    model = MillimeterWavePropagation
+    check_domain(model.VALIDITY_DOMAIN, model.VALIDITY_MESSAGES, frequency=frequency)
+
+    intercept = 20 * math.log10(4 * math.pi * frequency / 3e8) + (0 if los_condition == "LOS" else 20)
+    branch = LogDistanceBranch([intercept], [20], linear=material_attenuation)
+    distance_range = tuple(d / 1000 for d in model.VALIDITY_DOMAIN['distance'])
+    return PathLossKernel([branch], distance_range, scale=1000)
+
+
+def compile_model(params, mobile_height=1.5, los_condition=None, terrain_type=None):
+    """
+    Compile the kernel of the propagation model selected by a SimulationParameter.
+
+    Parameters:
+    - params: SimulationParameter (or any object with the same attributes)
+    - mobile_height: Mobile antenna height in meters for the Hata family
+    - los_condition: 'LOS' or 'NLOS' to override params.los_condition
+      (TR 38.901 only, e.g. for per-cell line of sight)
+    - terrain_type: Area type to override params.terrain_type (Hata family
+      only, e.g. for per-cell land cover)
+
+    Returns:
+    - PathLossKernel evaluated on distances in km
+    """
+    if params.propagation_model == '3GPP_TR_38901':
+        return compile_tr38901(
+            params.frequency * 1e6,  # Convertir en Hz
+            getattr(params, 'scenario', None) or 'UMa',
+            los_condition or getattr(params, 'los_condition', None) or 'LOS',
+            h_bs=float(getattr(params, 'h_bs', None) or 10.0),
+            h_ut=float(getattr(params, 'h_ut', None) or 1.5),
+            h=float(getattr(params, 'h', None) or 20.0),
+            w=float(getattr(params, 'w', None) or 20.0),
+        )
+
+    model = okumura_hata if params.propagation_model == 'OKUMURA_HATA' else cost_231
+    return compile_hata(params.frequency, params.antenna_height, mobile_height, terrain_type or params.terrain_type,
+                        model=model)
@@ -1,56 +1,133 @@
-import math
+import numpy as np
 
-def calculate_path_loss(frequency, antenna_height, mobile_height, distance, area_type):
+from .domain import check_domain
+
+# Validity range of the model inputs
+FREQUENCY_RANGE = (150, 1500)  # MHz
+ANTENNA_HEIGHT_RANGE = (30, 200)  # m
+MOBILE_HEIGHT_RANGE = (1, 10)  # m
+DISTANCE_RANGE = (1, 20)  # km
+
+# Validity domain declared to the simulation engine (per-cell inputs are
+# checked against it up front instead of raising ValueError cell by cell)
+VALIDITY_DOMAIN = {
+    'frequency': FREQUENCY_RANGE,
+    'antenna_height': ANTENNA_HEIGHT_RANGE,
+    'mobile_height': MOBILE_HEIGHT_RANGE,
+    'distance': DISTANCE_RANGE,
+}
+VALIDITY_MESSAGES = {
+    'frequency': "Frequency must be between 150 and 1500 MHz",
+    'antenna_height': "Antenna height must be between 30 and 200 meters",
+    'mobile_height': "Mobile height must be between 1 and 10 meters",
+    'distance': "Distance must be between 1 and 20 kilometers",
+}
+
+AREA_TYPES = ('URBAN', 'SUBURBAN', 'RURAL', 'OPEN')
+
+def calculate_path_loss_array(frequency, antenna_height, mobile_height, distance, area_type):
     """
-    Calculate path loss using the Okumura-Hata model.
-    
+    Calculate path loss using the Okumura-Hata model over NumPy arrays.
+
+    Every numeric argument may be a scalar or an array; arrays are broadcast
+    against each other so a whole grid of distances is evaluated in one call.
+
     Parameters:
     - frequency: Frequency in MHz (150-1500 MHz)
     - antenna_height: Base station antenna height in meters (30-200m)
     - mobile_height: Mobile antenna height in meters (1-10m)
     - distance: Distance in kilometers (1-20km)
     - area_type: 'URBAN', 'SUBURBAN', 'RURAL', or 'OPEN'
-    
+
     Returns:
-    - Path loss in dB
+    - Path loss in dB as a NumPy array with the broadcast shape of the inputs
     """
+    frequency = np.asarray(frequency, dtype=float)
+    antenna_height = np.asarray(antenna_height, dtype=float)
+    mobile_height = np.asarray(mobile_height, dtype=float)
+    distance = np.asarray(distance, dtype=float)
+
     # Validate input parameters
-    if not (150 <= frequency <= 1500):
-        raise ValueError("Frequency must be between 150 and 1500 MHz")
-    if not (30 <= antenna_height <= 200):
-        raise ValueError("Antenna height must be between 30 and 200 meters")
-    if not (1 <= mobile_height <= 10):
-        raise ValueError("Mobile height must be between 1 and 10 meters")
-    if not (1 <= distance <= 20):
-        raise ValueError("Distance must be between 1 and 20 kilometers")
-    
+    check_domain(
+        VALIDITY_DOMAIN, VALIDITY_MESSAGES, frequency=frequency, antenna_height=antenna_height,
+        mobile_height=mobile_height, distance=distance,
+    )
+    if area_type not in AREA_TYPES:
+        raise ValueError("Invalid area type. Must be 'URBAN', 'SUBURBAN', 'RURAL', or 'OPEN'")
+
+    log_f = np.log10(frequency)
+    log_hb = np.log10(antenna_height)
+
     # Calculate mobile antenna height correction factor
-    if frequency < 300:
-        # For small/medium-sized city
-        mobile_correction = 8.29 * (math.log10(1.54 * mobile_height))**2 - 1.1
-    else:
-        # For large city
-        mobile_correction = 3.2 * (math.log10(11.75 * mobile_height))**2 - 4.97
-    
+    # (small/medium-sized city below 300 MHz, large city above)
+    mobile_correction = np.where(
+        frequency < 300,
+        8.29 * np.log10(1.54 * mobile_height)**2 - 1.1,
+        3.2 * np.log10(11.75 * mobile_height)**2 - 4.97
+    )
+
     # Calculate basic path loss for urban areas
-    L_urban = 69.55 + 26.16 * math.log10(frequency) - 13.82 * math.log10(antenna_height) - mobile_correction + (44.9 - 6.55 * math.log10(antenna_height)) * math.log10(distance)
-    
+    L_urban = 69.55 + 26.16 * log_f - 13.82 * log_hb - mobile_correction + (44.9 - 6.55 * log_hb) * np.log10(distance)
+
     # Adjust for different area types
     if area_type == 'URBAN':
         return L_urban
     elif area_type == 'SUBURBAN':
-        return L_urban - 2 * (math.log10(frequency/28))**2 - 5.4
+        return L_urban - 2 * (np.log10(frequency/28))**2 - 5.4
     elif area_type == 'RURAL':
-        return L_urban - 4.78 * (math.log10(frequency))**2 + 18.33 * math.log10(frequency) - 40.94
-    elif area_type == 'OPEN':
-        return L_urban - 4.78 * (math.log10(frequency))**2 + 18.33 * math.log10(frequency) - 40.94 - 10
-    else:
-        raise ValueError("Invalid area type. Must be 'URBAN', 'SUBURBAN', 'RURAL', or 'OPEN'")
+        return L_urban - 4.78 * log_f**2 + 18.33 * log_f - 40.94
+    else:  # OPEN
+        return L_urban - 4.78 * log_f**2 + 18.33 * log_f - 40.94 - 10
+
+def calculate_path_loss(frequency, antenna_height, mobile_height, distance, area_type):
+    """
+    Calculate path loss using the Okumura-Hata model.
+
+    Parameters:
+    - frequency: Frequency in MHz (150-1500 MHz)
+    - antenna_height: Base station antenna height in meters (30-200m)
+    - mobile_height: Mobile antenna height in meters (1-10m)
+    - distance: Distance in kilometers (1-20km)
+    - area_type: 'URBAN', 'SUBURBAN', 'RURAL', or 'OPEN'
+
+    Returns:
+    - Path loss in dB
+    """
+    return float(calculate_path_loss_array(frequency, antenna_height, mobile_height, distance, area_type))
+
+def calculate_coverage_radius_array(frequency, antenna_height, antenna_power, receiver_sensitivity, area_type, mobile_height=1.5):
+    """
+    Calculate the maximum coverage radius for a batch of antenna configurations.
+
+    The Okumura-Hata loss is linear in log10(d): L(d) = A + B*log10(d), with A the
+    loss at 1 km and B = 44.9 - 6.55*log10(hb). The radius is therefore solved
+    in closed form, d = 10**((L_max - A) / B), for every configuration at once.
+
+    Parameters:
+    - frequency: Frequency in MHz (scalar or array)
+    - antenna_height: Base station antenna height in meters (scalar or array)
+    - antenna_power: Transmitter power in dBm (scalar or array)
+    - receiver_sensitivity: Minimum receiver sensitivity in dBm (scalar or array)
+    - area_type: 'URBAN', 'SUBURBAN', 'RURAL', or 'OPEN'
+    - mobile_height: Mobile antenna height in meters (default 1.5m)
+
+    Returns:
+    - Maximum coverage radius in kilometers as a NumPy array, clipped to the
+      model distance range (1-20 km)
+    """
+    # Maximum allowed path loss
+    max_path_loss = np.asarray(antenna_power, dtype=float) - np.asarray(receiver_sensitivity, dtype=float)
+
+    intercept = calculate_path_loss_array(frequency, antenna_height, mobile_height, 1.0, area_type)
+    slope = 44.9 - 6.55 * np.log10(np.asarray(antenna_height, dtype=float))
+
+    radius = 10 ** ((max_path_loss - intercept) / slope)
+    return np.clip(radius, *DISTANCE_RANGE)
 
 def calculate_coverage_radius(frequency, antenna_height, antenna_power, receiver_sensitivity, area_type, mobile_height=1.5):
     """
-    Calculate the maximum coverage radius for a given antenna configuration.
-    
+    Calculate the maximum coverage radius for a given antenna configuration using Okumura-Hata model.
+
     Parameters:
     - frequency: Frequency in MHz
     - antenna_height: Base station antenna height in meters
@@ -58,24 +135,8 @@ def calculate_coverage_radius(frequency, antenna_height, antenna_power, receiver
     - receiver_sensitivity: Minimum receiver sensitivity in dBm (negative value)
     - area_type: 'URBAN', 'SUBURBAN', 'RURAL', or 'OPEN'
     - mobile_height: Mobile antenna height in meters (default 1.5m)
-    
+
     Returns:
     - Maximum coverage radius in kilometers
     """
-    # Maximum allowed path loss
-    max_path_loss = antenna_power - receiver_sensitivity
-    
-    # Binary search to find the maximum distance
-    min_distance = 1  # km
-    max_distance = 20  # km
-    
-    while max_distance - min_distance > 0.01:
-        mid_distance = (min_distance + max_distance) / 2
-        path_loss = calculate_path_loss(frequency, antenna_height, mobile_height, mid_distance, area_type)
-        
-        if path_loss <= max_path_loss:
-            min_distance = mid_distance
-        else:
-            max_distance = mid_distance
-    
-    return min_distance
\ No newline at end of file
+    return float(calculate_coverage_radius_array(frequency, antenna_height, antenna_power, receiver_sensitivity, area_type, mobile_height))
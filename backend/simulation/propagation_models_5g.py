@@ -8,6 +8,8 @@ import math
 import numpy as np
 from typing import Literal
 
+from .propagation.domain import check_domain
+
 class PropagationModel5G:
     """Classe de base pour les modèles de propagation 5G"""
     
@@ -36,6 +38,61 @@ class PropagationModel5G:
         fspl = 20 * math.log10((4 * math.pi * distance) / wavelength)
         return fspl
 
+    @staticmethod
+    def free_space_path_loss_array(frequency, distance) -> np.ndarray:
+        """
+        Version vectorisée de free_space_path_loss
+        
+        Args:
+            frequency: Fréquence en Hz (scalaire ou tableau)
+            distance: Distance en mètres (scalaire ou tableau)
+            
+        Returns:
+            Tableau des pertes en espace libre en dB
+        """
+        frequency = np.asarray(frequency, dtype=float)
+        distance = np.asarray(distance, dtype=float)
+        if np.any(frequency <= 0) or np.any(distance <= 0):
+            raise ValueError("La fréquence et la distance doivent être positives")
+        
+        # 20*log10(4*pi*d/lambda) avec lambda = c/f
+        return 20 * np.log10(4 * np.pi * distance * frequency / 3e8)
+    
+    @staticmethod
+    def bisect_coverage_radius(path_loss, max_path_loss, min_distance: float, max_distance: float,
+                               tolerance: float = 1.0) -> np.ndarray:
+        """
+        Recherche dichotomique vectorisée de la portée maximale
+        
+        Toutes les configurations avancent en parallèle: chaque itération
+        évalue le modèle une seule fois sur le tableau des distances médianes.
+        
+        Args:
+            path_loss: Fonction distance (tableau, en mètres) -> perte en dB,
+                diffusée avec max_path_loss
+            max_path_loss: Perte maximale admissible en dB (scalaire ou tableau)
+            min_distance: Borne inférieure de la recherche en mètres
+            max_distance: Borne supérieure de la recherche en mètres
+            tolerance: Précision recherchée en mètres
+            
+        Returns:
+            Tableau des portées maximales en mètres (min_distance si même la
+            borne inférieure n'est pas couverte)
+        """
+        max_path_loss = np.asarray(max_path_loss, dtype=float)
+        low = np.full(max_path_loss.shape, float(min_distance))
+        high = np.full(max_path_loss.shape, float(max_distance))
+        
+        # Nombre d'itérations connu d'avance pour la précision demandée
+        iterations = max(0, math.ceil(math.log2((max_distance - min_distance) / tolerance)))
+        for _ in range(iterations):
+            mid = (low + high) / 2
+            covered = path_loss(mid) <= max_path_loss
+            low = np.where(covered, mid, low)
+            high = np.where(covered, high, mid)
+        
+        return low
+
 
 class ThreeGPP_TR_38901(PropagationModel5G):
     """
@@ -44,6 +101,20 @@ class ThreeGPP_TR_38901(PropagationModel5G):
     Référence: 3GPP TR 38.901 V16.1.0 (2019-12)
     """
     
+    # Domaine de validité du modèle
+    FREQUENCY_RANGE = (0.5e9, 100e9)  # Hz
+    DISTANCE_RANGE = (10, 10000)  # m
+    VALIDITY_DOMAIN = {
+        'frequency': FREQUENCY_RANGE,
+        'distance': DISTANCE_RANGE,
+    }
+    VALIDITY_MESSAGES = {
+        'frequency': "La fréquence doit être comprise entre 0.5 et 100 GHz",
+        'distance': "La distance doit être comprise entre 10 et 10000 mètres",
+    }
+    
+    SCENARIOS = ("UMa", "UMi", "RMa", "InH-Office", "InH-ShoppingMall")
+    
     @classmethod
     def path_loss(
         cls,
@@ -76,87 +147,148 @@ class ThreeGPP_TR_38901(PropagationModel5G):
         Returns:
             Perte de propagation en dB
         """
-        # Vérification des paramètres d'entrée
-        if not (0.5e9 <= frequency <= 100e9):
-            raise ValueError("La fréquence doit être comprise entre 0.5 et 100 GHz")
+        return float(cls.path_loss_array(
+            frequency, distance, scenario, los_condition,
+            h_bs=h_bs, h_ut=h_ut, h=h, w=w, h_roof=h_roof, street_width=street_width
+        ))
+    
+    @classmethod
+    def path_loss_array(
+        cls,
+        frequency: float,
+        distance,
+        scenario: Literal["UMa", "UMi", "RMa", "InH-Office", "InH-ShoppingMall"],
+        los_condition: Literal["LOS", "NLOS"],
+        h_bs: float = 10.0,
+        h_ut: float = 1.5,
+        h: float = 5.0,
+        w: float = 20.0,
+        h_roof: float = 20.0,
+        street_width: float = 20.0,
+    ) -> np.ndarray:
+        """
+        Calcule la perte de propagation TR 38.901 sur un tableau de distances
+        
+        Les régions de part et d'autre de la distance de rupture sont traitées
+        par masques, et les pertes LOS et NLOS ne sont calculées qu'une fois
+        chacune avant de prendre leur maximum.
+        
+        Les paramètres numériques peuvent aussi être des tableaux, diffusés
+        (broadcast) avec les distances.
+        
+        Args:
+            frequency: Fréquence en Hz (0.5-100 GHz)
+            distance: Tableau des distances 2D en mètres (10-10000 m)
+            scenario, los_condition, h_bs, h_ut, h, w, h_roof, street_width:
+                voir path_loss
             
-        if not (10 <= distance <= 10000):
-            raise ValueError("La distance doit être comprise entre 10 et 10000 mètres")
+        Returns:
+            Tableau des pertes de propagation en dB, de même forme que distance
+        """
+        distance = np.asarray(distance, dtype=float)
+        frequency = np.asarray(frequency, dtype=float)
+        h_bs = np.asarray(h_bs, dtype=float)
+        h_ut = np.asarray(h_ut, dtype=float)
+        
+        # Vérification des paramètres d'entrée
+        check_domain(cls.VALIDITY_DOMAIN, cls.VALIDITY_MESSAGES, frequency=frequency, distance=distance)
             
-        # Conversion en GHz pour les formules
-        f_ghz = frequency / 1e9
+        if scenario not in cls.SCENARIOS:
+            raise ValueError(f"Scénario {scenario} non pris en charge. Choisissez parmi: UMa, UMi, RMa, InH-Office, InH-ShoppingMall")
+        
+        # Termes indépendants de la distance
+        log_f = np.log10(frequency / 1e9)
         
         # Calcul de la distance 3D
-        d_3d = math.sqrt(distance**2 + (h_bs - h_ut)**2)
+        log_d3d = np.log10(np.sqrt(distance**2 + (h_bs - h_ut)**2))
+        
+        pl_los = cls._los_path_loss_array(frequency, distance, log_d3d, log_f, scenario, h_bs, h_ut)
+        if los_condition == "LOS":
+            return pl_los
         
-        # Sélection du modèle en fonction du scénario
+        # Perte NLOS, puis maximum entre LOS et NLOS
         if scenario == "UMa":  # Urban Macro
-            if los_condition == "LOS":
-                # Calcul de la distance de rupture
-                dbp = 4 * h_bs * h_ut * (frequency / 3e8)
-                
-                if distance < dbp:
-                    # Formule pour la région proche (d2D < dbp)
-                    pl = 28.0 + 22 * math.log10(d_3d) + 20 * math.log10(f_ghz)
-                else:
-                    # Formule pour la région éloignée (d2D >= dbp)
-                    pl = 28.0 + 40 * math.log10(d_3d) + 20 * math.log10(f_ghz) - 9 * math.log10(dbp**2 + (h_bs - h_ut)**2)
-            else:  # NLOS
-                # Calcul de la perte en LOS d'abord
-                pl_los = cls.path_loss(frequency, distance, "UMa", "LOS", h_bs, h_ut)
-                
-                # Calcul de la perte en NLOS
-                pl_nlos = 13.54 + 39.08 * math.log10(d_3d) + 20 * math.log10(f_ghz) - 0.6 * (h_ut - 1.5)
-                
-                # Prendre le maximum entre LOS et NLOS
-                pl = max(pl_los, pl_nlos)
-                
+            pl_nlos = 13.54 + 39.08 * log_d3d + 20 * log_f - 0.6 * (h_ut - 1.5)
         elif scenario == "UMi":  # Urban Micro
-            if los_condition == "LOS":
-                pl = 32.4 + 21 * math.log10(d_3d) + 20 * math.log10(f_ghz)
-            else:  # NLOS
-                pl_los = 32.4 + 21 * math.log10(d_3d) + 20 * math.log10(f_ghz)
-                pl_nlos = 35.3 * math.log10(d_3d) + 22.4 + 21.3 * math.log10(f_ghz) - 0.3 * (h_ut - 1.5)
-                pl = max(pl_los, pl_nlos)
-                
+            pl_nlos = 35.3 * log_d3d + 22.4 + 21.3 * log_f - 0.3 * (h_ut - 1.5)
         elif scenario == "RMa":  # Rural Macro
-            if los_condition == "LOS":
-                # Calcul de la distance de rupture
-                dbp = 2 * math.pi * h_bs * h_ut * (frequency / 3e8)
-                
-                if distance < 10:
-                    pl = cls.free_space_path_loss(frequency, 10) + 10 * 2.1 * math.log10(distance/10)
-                elif 10 <= distance <= dbp:
-                    pl = cls.free_space_path_loss(frequency, distance) + 10 * 2.1 * math.log10(distance/10)
-                else:  # distance > dbp
-                    pl = cls.free_space_path_loss(frequency, dbp) + 10 * 2.1 * math.log10(dbp/10) + 40 * math.log10(distance/dbp)
-            else:  # NLOS
-                pl_los = cls.path_loss(frequency, distance, "RMa", "LOS", h_bs, h_ut)
-                pl_nlos = 161.04 - 7.1 * math.log10(w) + 7.5 * math.log10(h) - (24.37 - 3.7 * (h/h_bs)**2) * math.log10(h_bs) + \
-                         (43.42 - 3.1 * math.log10(h_bs)) * (math.log10(d_3d) - 3) + 20 * math.log10(f_ghz) - \
-                         (3.2 * (math.log10(11.75 * h_ut))**2 - 4.97)
-                pl = max(pl_los, pl_nlos)
-                
+            pl_nlos = 161.04 - 7.1 * np.log10(w) + 7.5 * np.log10(h) - (24.37 - 3.7 * (h/h_bs)**2) * np.log10(h_bs) + \
+                     (43.42 - 3.1 * np.log10(h_bs)) * (log_d3d - 3) + 20 * log_f - \
+                     (3.2 * (np.log10(11.75 * h_ut))**2 - 4.97)
         elif scenario == "InH-Office":  # Indoor Hotspot - Office
-            if los_condition == "LOS":
-                pl = 32.4 + 17.3 * math.log10(d_3d) + 20 * math.log10(f_ghz)
-            else:  # NLOS
-                pl_los = 32.4 + 17.3 * math.log10(d_3d) + 20 * math.log10(f_ghz)
-                pl_nlos = 38.3 * math.log10(d_3d) + 17.3 + 24.9 * math.log10(f_ghz)
-                pl = max(pl_los, pl_nlos)
-                
-        elif scenario == "InH-ShoppingMall":  # Indoor Hotspot - Shopping Mall
-            if los_condition == "LOS":
-                pl = 32.4 + 17.3 * math.log10(d_3d) + 20 * math.log10(f_ghz)
-            else:  # NLOS
-                pl_los = 32.4 + 17.3 * math.log10(d_3d) + 20 * math.log10(f_ghz)
-                pl_nlos = 42.7 * math.log10(d_3d) + 11.3 + 20 * math.log10(f_ghz)
-                pl = max(pl_los, pl_nlos)
-                
-        else:
-            raise ValueError(f"Scénario {scenario} non pris en charge. Choisissez parmi: UMa, UMi, RMa, InH-Office, InH-ShoppingMall")
+            pl_nlos = 38.3 * log_d3d + 17.3 + 24.9 * log_f
+        else:  # InH-ShoppingMall
+            pl_nlos = 42.7 * log_d3d + 11.3 + 20 * log_f
+        
+        return np.maximum(pl_los, pl_nlos)
+    
+    @classmethod
+    def coverage_radius_array(
+        cls,
+        frequency,
+        antenna_power,
+        receiver_sensitivity,
+        scenario: Literal["UMa", "UMi", "RMa", "InH-Office", "InH-ShoppingMall"],
+        los_condition: Literal["LOS", "NLOS"],
+        h_bs=10.0,
+        h_ut=1.5,
+        h: float = 5.0,
+        w: float = 20.0,
+        tolerance: float = 1.0,
+    ) -> np.ndarray:
+        """
+        Calcule la portée maximale pour un lot de configurations d'antenne
+        
+        Args:
+            frequency: Fréquence en Hz (scalaire ou tableau)
+            antenna_power: Puissance d'émission en dBm (scalaire ou tableau)
+            receiver_sensitivity: Sensibilité du récepteur en dBm (scalaire ou tableau)
+            scenario: Scénario de déploiement
+            los_condition: Condition de visibilité (LOS ou NLOS)
+            h_bs: Hauteur de la station de base en mètres (scalaire ou tableau)
+            h_ut: Hauteur de l'utilisateur en mètres (scalaire ou tableau)
+            h: Hauteur moyenne des bâtiments en mètres
+            w: Largeur moyenne des routes en mètres
+            tolerance: Précision en mètres
+            
+        Returns:
+            Tableau des portées en mètres, de la forme diffusée des paramètres
+        """
+        max_path_loss = np.asarray(antenna_power, dtype=float) - np.asarray(receiver_sensitivity, dtype=float)
+        max_path_loss = np.broadcast_to(
+            max_path_loss, np.broadcast_shapes(max_path_loss.shape, np.shape(frequency), np.shape(h_bs), np.shape(h_ut))
+        )
+        
+        def path_loss(distance):
+            return cls.path_loss_array(frequency, distance, scenario, los_condition, h_bs=h_bs, h_ut=h_ut, h=h, w=w)
+        
+        return cls.bisect_coverage_radius(path_loss, max_path_loss, *cls.DISTANCE_RANGE, tolerance=tolerance)
+    
+    @classmethod
+    def _los_path_loss_array(cls, frequency, distance, log_d3d, log_f, scenario, h_bs, h_ut):
+        """
+        Perte LOS vectorisée; les branches de distance de rupture sont des masques
+        """
+        if scenario == "UMa":
+            # Calcul de la distance de rupture
+            dbp = 4 * h_bs * h_ut * (frequency / 3e8)
+            near = 28.0 + 22 * log_d3d + 20 * log_f
+            far = 28.0 + 40 * log_d3d + 20 * log_f - 9 * np.log10(dbp**2 + (h_bs - h_ut)**2)
+            return np.where(distance < dbp, near, far)
         
-        return pl
+        if scenario == "UMi":
+            return 32.4 + 21 * log_d3d + 20 * log_f
+        
+        if scenario == "RMa":
+            # Calcul de la distance de rupture
+            dbp = 2 * np.pi * h_bs * h_ut * (frequency / 3e8)
+            log_d = np.log10(distance)
+            near = cls.free_space_path_loss_array(frequency, distance) + 21 * (log_d - 1)
+            far = cls.free_space_path_loss_array(frequency, dbp) + 21 * np.log10(dbp / 10) + 40 * (log_d - np.log10(dbp))
+            return np.where(distance <= dbp, near, far)
+        
+        # InH-Office et InH-ShoppingMall
+        return 32.4 + 17.3 * log_d3d + 20 * log_f
 
 
 class MillimeterWavePropagation(PropagationModel5G):
@@ -166,6 +298,18 @@ class MillimeterWavePropagation(PropagationModel5G):
     Ce modèle est adapté pour les fréquences au-dessus de 24 GHz (FR2)
     """
     
+    # Domaine de validité du modèle
+    FREQUENCY_RANGE = (24e9, 100e9)  # Hz
+    DISTANCE_RANGE = (1, 10000)  # m (l'espace libre n'est défini que pour d > 0)
+    VALIDITY_DOMAIN = {
+        'frequency': FREQUENCY_RANGE,
+        'distance': DISTANCE_RANGE,
+    }
+    VALIDITY_MESSAGES = {
+        'frequency': "La fréquence doit être comprise entre 24 et 100 GHz pour les ondes mmWave",
+        'distance': "La distance doit être comprise entre 1 et 10000 mètres",
+    }
+    
     @classmethod
     def path_loss(
         cls,
@@ -186,8 +330,7 @@ class MillimeterWavePropagation(PropagationModel5G):
         Returns:
             Perte de propagation en dB
         """
-        if not (24e9 <= frequency <= 100e9):
-            raise ValueError("La fréquence doit être comprise entre 24 et 100 GHz pour les ondes mmWave")
+        check_domain(cls.VALIDITY_DOMAIN, cls.VALIDITY_MESSAGES, frequency=frequency)
             
         # Perte en espace libre
         fspl = cls.free_space_path_loss(frequency, distance)
@@ -202,6 +345,44 @@ class MillimeterWavePropagation(PropagationModel5G):
         total_loss = fspl + nlos_penalty + material_loss
         
         return total_loss
+    
+    @classmethod
+    def path_loss_array(
+        cls,
+        frequency: float,
+        distance,
+        los_condition: Literal["LOS", "NLOS"],
+        material_attenuation: float = 0.0,
+    ) -> np.ndarray:
+        """
+        Version vectorisée de path_loss sur un tableau de distances en mètres
+        """
+        check_domain(cls.VALIDITY_DOMAIN, cls.VALIDITY_MESSAGES, frequency=frequency)
+        
+        distance = np.asarray(distance, dtype=float)
+        nlos_penalty = 0 if los_condition == "LOS" else 20
+        
+        return cls.free_space_path_loss_array(frequency, distance) + nlos_penalty + material_attenuation * distance
+    
+    @classmethod
+    def coverage_radius_array(
+        cls,
+        frequency: float,
+        antenna_power,
+        receiver_sensitivity,
+        los_condition: Literal["LOS", "NLOS"],
+        material_attenuation: float = 0.0,
+        tolerance: float = 1.0,
+    ) -> np.ndarray:
+        """
+        Calcule la portée maximale en mètres pour un lot de (puissance, sensibilité)
+        """
+        max_path_loss = np.asarray(antenna_power, dtype=float) - np.asarray(receiver_sensitivity, dtype=float)
+        
+        def path_loss(distance):
+            return cls.path_loss_array(frequency, distance, los_condition, material_attenuation)
+        
+        return cls.bisect_coverage_radius(path_loss, max_path_loss, *cls.DISTANCE_RANGE, tolerance=tolerance)
 
 
 # Exemple d'utilisation
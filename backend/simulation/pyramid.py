@@ -0,0 +1,144 @@
+"""
+Multi-resolution pyramid of the coverage rasters.
+
+Level 0 is the simulation raster itself; every following level halves the
+resolution by aggregating 2x2 blocks of the previous one. Maps fetch the
+level matching their zoom instead of the full-resolution payload.
+
+The levels are stored as layers of the result store (see level_layer), next
+to the signal raster, and only their geometry is kept with the result.
+"""
+import math
+import numpy as np
+
+# Levels are built until the raster is at most this many cells across
+MIN_LEVEL_SIZE = 32
+
+# Target on-screen size of a cell when choosing a level for a map zoom
+PIXELS_PER_CELL = 4
+
+# Output rows aggregated at a time by downsample()
+CHUNK_ROWS = 256
+
+
+def downsample(values, factor=2):
+    """
+    Block-aggregate a 2-D raster of signal strengths in dBm.
+
+    The received power is averaged in mW over the non-NaN cells of each
+    factor x factor block; blocks without any value stay NaN. Rasters whose
+    shape is not a multiple of factor are padded with NaN.
+
+    Parameters:
+    - values: 2-D array in dBm (NaN for cells without value)
+    - factor: Block size
+
+    Returns:
+    - 2-D array in dBm of shape ceil(shape / factor)
+    """
+    nx, ny = values.shape
+    aggregated = np.full((-(-nx // factor), -(-ny // factor)), np.nan)
+
+    # Processed by blocks of rows so that a memory-mapped raster is never
+    # loaded (and converted to mW) as a whole
+    for start in range(0, aggregated.shape[0], CHUNK_ROWS):
+        chunk = np.asarray(values[start * factor:(start + CHUNK_ROWS) * factor], dtype=float)
+        padded = np.pad(chunk, ((0, -len(chunk) % factor), (0, -ny % factor)), constant_values=np.nan)
+        blocks = padded.reshape(padded.shape[0] // factor, factor, padded.shape[1] // factor, factor)
+
+        count = np.count_nonzero(~np.isnan(blocks), axis=(1, 3))
+        power = np.nansum(10 ** (blocks / 10), axis=(1, 3))
+
+        level = aggregated[start:start + len(count)]
+        filled = count > 0
+        level[filled] = 10 * np.log10(power[filled] / count[filled])
+    return aggregated
+
+
+def build_pyramid(values, x0, y0, cell_size, factor=2, min_size=MIN_LEVEL_SIZE):
+    """
+    Build the pyramid of a raster laid out on a LocalGrid.
+
+    Parameters:
+    - values: 2-D array in dBm, axis 0 west to east, axis 1 south to north
+    - x0, y0: Local coordinates in m of the centre of cell (0, 0)
+    - cell_size: Cell size in km
+    - factor: Aggregation factor between two levels
+    - min_size: Stop once a level is at most min_size cells across
+
+    Returns:
+    - List of levels, finest first; each level is a dict with the keys
+      'level', 'cell_size' (km), 'x0', 'y0' (m) and 'values'
+    """
+    levels = [{'level': 0, 'cell_size': cell_size, 'x0': x0, 'y0': y0, 'values': values}]
+
+    while max(values.shape) > min_size:
+        # The centre of a block is (factor - 1) / 2 cells away from its first cell
+        shift = (factor - 1) / 2 * cell_size * 1000
+        values = downsample(values, factor)
+        x0, y0, cell_size = x0 + shift, y0 + shift, cell_size * factor
+        levels.append({'level': len(levels), 'cell_size': cell_size, 'x0': x0, 'y0': y0, 'values': values})
+
+    return levels
+
+
+def select_level(cell_sizes, zoom, latitude, pixels_per_cell=PIXELS_PER_CELL):
+    """
+    Choose the coarsest level whose cells stay below pixels_per_cell pixels
+    on a web-mercator map at the given zoom.
+
+    Parameters:
+    - cell_sizes: Cell size in km of every level, finest first
+    - zoom: Web map zoom level
+    - latitude: Latitude of the map centre in degrees
+
+    Returns:
+    - Index of the level
+    """
+    meters_per_pixel = 156543.03392 * math.cos(math.radians(latitude)) / 2 ** zoom
+    level = 0
+    for index, cell_size in enumerate(cell_sizes):
+        if cell_size * 1000 <= pixels_per_cell * meters_per_pixel:
+            level = index
+    return level
+
+
+def level_layer(level):
+    """
+    Name of the result-store layer of a pyramid level (level 0 is the signal
+    raster itself).
+    """
+    return 'signal' if level == 0 else f'signal_{level}'
+
+
+def level_to_json(level):
+    """
+    Geometry of a level for a JSONField, with the name of the result-store
+    layer holding its values.
+    """
+    return {
+        'level': level['level'],
+        'cell_size': level['cell_size'],
+        'x0': level['x0'],
+        'y0': level['y0'],
+        'shape': list(level['values'].shape),
+        'layer': level_layer(level['level']),
+    }
+
+
+def level_from_json(data):
+    """
+    Level stored inline in a JSONField (values rounded to 0.01 dB, None for
+    NaN), as written for the results computed before the levels moved to the
+    result store.
+    """
+    values = np.array(
+        [[np.nan if v is None else v for v in row] for row in data['values']], dtype=float
+    ).reshape(data['shape'])
+    return {
+        'level': data['level'],
+        'cell_size': data['cell_size'],
+        'x0': data['x0'],
+        'y0': data['y0'],
+        'values': values,
+    }
@@ -0,0 +1,183 @@
+"""
+Compact binary storage of the signal rasters.
+
+A raster is stored as a fixed header (antenna position, local coordinates of
+cell (0, 0), cell size and shape) followed by the zlib-compressed array of
+signal strengths quantized to int16 centi-dBm, with NODATA for the cells
+without value. The local frame is the azimuthal-equidistant frame of
+simulation.grid centred on the antenna, so cell (i, j) lies at
+(x0 + i * cell_size, y0 + j * cell_size).
+"""
+import base64
+import struct
+import zlib
+
+import numpy as np
+
+from .grid import local_crs, local_to_wgs84
+
+MAGIC = b'RSR1'
+
+# Quantization: value = round(signal * SCALE), NODATA for cells without value
+SCALE = 100
+NODATA = np.iinfo(np.int16).min
+DTYPE = np.dtype('<i2')
+
+# magic, center lon, center lat, x0 (m), y0 (m), cell size (km), nx, ny
+_HEADER = struct.Struct('<4s5d2I')
+
+# Query parameter of the API asking for the legacy {"lon,lat": dBm}
+# dictionary along with the encoded raster (old clients)
+LEGACY_POINTS_PARAM = 'legacy'
+
+
+def quantize(signal):
+    """
+    Quantize an array of signal strengths in dBm (NaN for no value) to int16
+    centi-dBm.
+    """
+    signal = np.asarray(signal, dtype=float)
+    codes = np.full(signal.shape, NODATA, dtype=DTYPE)
+    valid = ~np.isnan(signal)
+    codes[valid] = np.clip(np.round(signal[valid] * SCALE), NODATA + 1, np.iinfo(np.int16).max)
+    return codes
+
+
+class RasterEncoder:
+    """
+    Incremental encoder: the raster is written by blocks of rows so that it
+    never has to be held in memory as a whole.
+    """
+
+    def __init__(self, center_lon, center_lat, x0, y0, cell_size, shape, level=6):
+        self.shape = tuple(int(n) for n in shape)
+        self._header = _HEADER.pack(MAGIC, center_lon, center_lat, x0, y0, cell_size, *self.shape)
+        self._compressor = zlib.compressobj(level)
+        self._chunks = []
+        self._rows = 0
+
+    def write(self, signal):
+        """Append the next block of rows (signal in dBm, NaN for no value)."""
+        codes = quantize(signal)
+        if codes.ndim != 2 or codes.shape[1] != self.shape[1]:
+            raise ValueError("Raster block does not match the raster shape")
+        self._rows += codes.shape[0]
+        self._chunks.append(self._compressor.compress(codes.tobytes()))
+
+    def finish(self):
+        """Return the encoded raster."""
+        if self._rows != self.shape[0]:
+            raise ValueError(f"Raster has {self._rows} rows, {self.shape[0]} expected")
+        self._chunks.append(self._compressor.flush())
+        return self._header + b''.join(self._chunks)
+
+
+class CompactRaster:
+    """
+    Signal raster stored as int16 centi-dBm codes on a local metric grid.
+    """
+
+    def __init__(self, center_lon, center_lat, x0, y0, cell_size, codes):
+        self.center_lon = float(center_lon)
+        self.center_lat = float(center_lat)
+        self.x0 = float(x0)  # m
+        self.y0 = float(y0)  # m
+        self.cell_size = float(cell_size)  # km
+        self.codes = codes
+
+    @classmethod
+    def from_signal(cls, signal, center_lon, center_lat, x0, y0, cell_size):
+        return cls(center_lon, center_lat, x0, y0, cell_size, quantize(signal))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Decode a raster. codes is a read-only view on the decompressed
+        buffer (no copy).
+        """
+        data = memoryview(data)
+        magic, center_lon, center_lat, x0, y0, cell_size, nx, ny = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not an encoded signal raster")
+        payload = zlib.decompress(data[_HEADER.size:])
+        codes = np.frombuffer(payload, dtype=DTYPE).reshape(nx, ny)
+        return cls(center_lon, center_lat, x0, y0, cell_size, codes)
+
+    def to_bytes(self, level=6):
+        header = _HEADER.pack(MAGIC, self.center_lon, self.center_lat, self.x0, self.y0,
+                              self.cell_size, *self.codes.shape)
+        return header + zlib.compress(np.ascontiguousarray(self.codes, dtype=DTYPE).tobytes(), level)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def crs(self):
+        return local_crs(self.center_lon, self.center_lat)
+
+    @property
+    def mask(self):
+        """Boolean array of the cells with a value."""
+        return self.codes != NODATA
+
+    def signal(self):
+        """Signal strengths in dBm as a float array (NaN for no value)."""
+        signal = self.codes / SCALE
+        signal[~self.mask] = np.nan
+        return signal
+
+    def cells(self):
+        """
+        WGS84 coordinates and signal strength of the cells with a value.
+
+        Returns:
+        - (lon, lat, signal) arrays
+        """
+        cells_i, cells_j = np.nonzero(self.mask)
+        step = self.cell_size * 1000  # m
+        lons, lats = local_to_wgs84(self.center_lon, self.center_lat).transform(
+            self.x0 + cells_i * step, self.y0 + cells_j * step
+        )
+        return np.asarray(lons), np.asarray(lats), self.codes[cells_i, cells_j] / SCALE
+
+    def to_signal_strength(self):
+        """Legacy {"lon,lat": dBm} dictionary (API payloads)."""
+        lons, lats, signal = self.cells()
+        return {f"{lon:.6f},{lat:.6f}": value for lon, lat, value in zip(lons, lats, signal.tolist())}
+
+
+def raster_header(data):
+    """
+    Metadata of an encoded raster, read from its header only.
+    """
+    magic, center_lon, center_lat, x0, y0, cell_size, nx, ny = _HEADER.unpack_from(bytes(data[:_HEADER.size]))
+    if magic != MAGIC:
+        raise ValueError("Not an encoded signal raster")
+    return {
+        'center': [center_lon, center_lat],
+        'x0': x0,
+        'y0': y0,
+        'cell_size': cell_size,
+        'shape': [nx, ny],
+        'scale': SCALE,
+        'nodata': int(NODATA),
+    }
+
+
+
+def raster_to_json(data):
+    """
+    API representation of an encoded raster: its header fields and the
+    encoded bytes (header and compressed int16 codes) in base64.
+    """
+    return {
+        **raster_header(data),
+        'encoding': 'int16-zlib',
+        'data': base64.b64encode(bytes(data)).decode('ascii'),
+    }
+
+
+def legacy_points_requested(query_params):
+    """Whether the query string of an API request opts in to the legacy dictionary (?legacy=1)."""
+    return query_params.get(LEGACY_POINTS_PARAM, '').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,219 @@
+"""
+Content-addressed cache of the simulation results.
+
+Every run is identified by a canonical hash of all its inputs: the fields of
+its SimulationParameter (numbers as floats, empty strings as None), the
+version of the propagation engine, the settings the results depend on
+(signal bands, contour simplification, land-cover classes) and the
+signature of the data files it reads (population and clutter rasters,
+elevation model). A run whose hash is cached reuses the stored result, which
+is then shared by the simulations of all the jobs pointing to it.
+
+settings.SIMULATION_RESULT_CACHE_MB bounds the size of the results indexed
+for reuse: beyond it, the least recently used entries are evicted. It does
+not bound the storage: every result belongs to a simulation, so an evicted
+result is no longer reused but keeps its rows and files until its
+simulations are deleted.
+"""
+import hashlib
+import json
+import os
+
+# Version of the propagation engine, part of every cache key: bump it when a
+# change of the models or of the engine changes the results
+RESULT_MODEL_VERSION = 5
+
+# SimulationParameter fields that do not affect the results (bandwidth is
+# recorded with the run but read by no propagation model)
+EXCLUDED_FIELDS = ('id', 'simulation', 'bandwidth', 'created_at', 'updated_at')
+
+
+def _canonical(value):
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if hasattr(value, 'coords'):
+        # Geometry (antenna location)
+        return [value.srid, [float(v) for v in value.coords]]
+    return str(value) or None
+
+
+def _file_signature(path):
+    """Modification time and size of a data file (and of its .json sidecar)."""
+    signature = []
+    for name in (path, os.path.splitext(path)[0] + '.json'):
+        if os.path.exists(name):
+            stat = os.stat(name)
+            signature.append([os.path.basename(name), stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+def parameters_key(params):
+    """
+    Canonical hash of the inputs of a run.
+
+    Parameters:
+    - params: SimulationParameter
+
+    Returns:
+    - 64-character hex SHA-256 digest
+    """
+    from django.conf import settings
+    from .bands import signal_bands
+    from .clutter import clutter_raster_path
+    from .dem import dem_signature
+    from .population import population_raster_path
+
+    inputs = {
+        'version': RESULT_MODEL_VERSION,
+        'parameters': {
+            field.name: _canonical(getattr(params, field.attname))
+            for field in params._meta.concrete_fields
+            if field.name not in EXCLUDED_FIELDS
+        },
+        'signal_bands': signal_bands(params.technology),
+        'contour_simplify': float(settings.SIMULATION_CONTOUR_SIMPLIFY),
+    }
+    if params.population_raster:
+        inputs['population_raster'] = _file_signature(population_raster_path(params.population_raster))
+    if params.clutter_raster:
+        inputs['clutter_raster'] = _file_signature(clutter_raster_path(params.clutter_raster))
+        inputs['clutter_classes'] = sorted(
+            [float(code), area_type] for code, area_type in settings.SIMULATION_CLUTTER_CLASSES.items()
+        )
+    if params.use_terrain:
+        inputs['dem'] = [list(tile) for tile in dem_signature(settings.SIMULATION_DEM_ROOT)]
+
+    encoded = json.dumps(inputs, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def cache_enabled():
+    from django.conf import settings
+
+    return settings.SIMULATION_RESULT_CACHE_MB > 0
+
+
+def _count(name, n=1):
+    """Add n to a counter of the cache."""
+    from django.db import IntegrityError, transaction
+    from django.db.models import F
+    from .models import ResultCacheCounter
+
+    counters = ResultCacheCounter.objects.filter(name=name)
+    if counters.update(value=F('value') + n):
+        return
+    try:
+        with transaction.atomic():
+            ResultCacheCounter.objects.create(name=name, value=n)
+    except IntegrityError:
+        # Created by another process in the meantime
+        counters.update(value=F('value') + n)
+
+
+def lookup(key, record_miss=True):
+    """
+    Cached result of a key, or None.
+
+    Parameters:
+    - key: Cache key (parameters_key())
+    - record_miss: Count a miss when the key is not cached (False for the
+      lookups repeated before running a job already counted as a miss)
+
+    Returns:
+    - CachedResult (result selected), or None
+    """
+    from django.db.models import F
+    from django.utils import timezone
+    from .models import CachedResult
+
+    if not key or not cache_enabled():
+        return None
+    entry = CachedResult.objects.select_related('result').filter(key=key).first()
+    if entry is None:
+        if record_miss:
+            _count('misses')
+        return None
+    CachedResult.objects.filter(key=key).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    _count('hits')
+    return entry
+
+
+def store(key, result_id, summary):
+    """
+    Cache the result of a run, then evict the least recently used entries
+    beyond the size bound.
+
+    Parameters:
+    - key: Cache key of the run inputs
+    - result_id: Id of the SimulationResult
+    - summary: Scalar results of the run (job summary)
+    """
+    from .models import CachedResult, SimulationResult
+    from .store import get_result_store
+
+    if not key or not cache_enabled():
+        return
+    result = SimulationResult.objects.only('raster_key', 'signal_raster').get(pk=result_id)
+    size = len(result.signal_raster or b'')
+    if result.raster_key:
+        size += get_result_store().size(result.raster_key)
+
+    _, created = CachedResult.objects.get_or_create(key=key, defaults={
+        'result_id': result_id,
+        'summary': summary,
+        'size': size,
+    })
+    if created:
+        evict()
+
+
+def evict(max_bytes=None):
+    """
+    Evict the least recently used entries until the indexed results fit in
+    max_bytes (settings.SIMULATION_RESULT_CACHE_MB by default). Only the
+    index entries are removed: the results stay with their simulations.
+
+    Returns:
+    - Number of evicted entries
+    """
+    from django.conf import settings
+    from django.db.models import Sum
+    from .models import CachedResult
+
+    if max_bytes is None:
+        max_bytes = settings.SIMULATION_RESULT_CACHE_MB * 1024 * 1024
+    total = CachedResult.objects.aggregate(total=Sum('size'))['total'] or 0
+
+    evicted = 0
+    for key, size in CachedResult.objects.order_by('last_used_at').values_list('key', 'size').iterator():
+        if total <= max_bytes:
+            break
+        CachedResult.objects.filter(key=key).delete()
+        total -= size
+        evicted += 1
+    if evicted:
+        _count('evictions', evicted)
+    return evicted
+
+
+def cache_stats():
+    """Size, bound and counters of the cache."""
+    from django.conf import settings
+    from django.db.models import Count, Sum
+    from .models import CachedResult, ResultCacheCounter
+
+    entries = CachedResult.objects.aggregate(entries=Count('key'), size=Sum('size'))
+    counters = dict(ResultCacheCounter.objects.values_list('name', 'value'))
+    hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+    return {
+        'enabled': cache_enabled(),
+        'entries': entries['entries'],
+        'size': entries['size'] or 0,
+        'max_size': settings.SIMULATION_RESULT_CACHE_MB * 1024 * 1024,
+        'hits': hits,
+        'misses': misses,
+        'evictions': counters.get('evictions', 0),
+        'hit_ratio': hits / (hits + misses) if hits + misses else None,
+    }
@@ -0,0 +1,201 @@
+"""
+Single-flight coalescing of identical concurrent computations.
+
+Concurrent callers of the same key wait for one computation and all receive
+its result:
+- within a process, the callers wait on the thread of the first one;
+- across processes, the first one takes a lock in the Django cache
+  (acquire_lock) and publishes its result there for a short time; the
+  others poll for it.
+
+Coalescing across processes needs a cache shared by the processes (Redis,
+see CACHE_URL in the settings); with the default per-process cache only the
+callers of the same process are coalesced.
+
+Locks hold the token of their holder and are released only by it. On Redis
+they are plain keys set with SET NX and released by a compare-and-delete
+script; on the other backends the lock operations of the process are
+serialized (atomic for the per-process memory cache, which is only shared
+by the threads of the process).
+"""
+import threading
+import time
+import uuid
+from functools import lru_cache
+
+# Seconds between two polls of a result computed by another process
+POLL_INTERVAL = 0.25
+
+# Deletes KEYS[1] if it holds ARGV[1] (the token of the holder)
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_MISSING = object()
+
+# Lock operations of the process on the backends without compare-and-delete
+_local_lock = threading.Lock()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Calls coalesced by key within the process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """
+        Result of fn(), computed once for the concurrent callers of key
+        (exceptions are raised to every caller).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+
+_flights = SingleFlight()
+
+
+def coalesce(key, fn, timeout=300, result_ttl=60):
+    """
+    Result of fn(), computed once for the concurrent callers of key in every
+    process sharing the Django cache.
+
+    Parameters:
+    - key: Key of the computation (same key, same result)
+    - fn: Computation; its result must be picklable
+    - timeout: Seconds a caller waits for another process before computing
+      the result itself (also the lifetime of the lock)
+    - result_ttl: Seconds the result stays available to late callers
+    """
+    return _flights.do(key, lambda: _shared_call(key, fn, timeout, result_ttl))
+
+
+def _shared_call(key, fn, timeout, result_ttl):
+    from django.core.cache import cache
+
+    lock_key, result_key = f"singleflight:lock:{key}", f"singleflight:result:{key}"
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + timeout
+    while True:
+        value = cache.get(result_key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        if acquire_lock(lock_key, token, timeout):
+            try:
+                value = fn()
+                cache.set(result_key, value, result_ttl)
+                return value
+            finally:
+                release_lock(lock_key, token)
+
+        if time.monotonic() >= deadline:
+            # The process holding the lock is stuck or gone
+            return fn()
+        time.sleep(POLL_INTERVAL)
+
+
+def _lock_cache():
+    """Default cache backend (not the connection proxy of django.core.cache.cache)."""
+    from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+
+    return caches[DEFAULT_CACHE_ALIAS]
+
+
+@lru_cache(maxsize=None)
+def _redis_client(url):
+    import redis
+
+    return redis.Redis.from_url(url)
+
+
+def _redis(backend):
+    """Redis client of a RedisCache backend (the first server takes the writes), or None."""
+    from django.conf import settings
+    from django.core.cache import DEFAULT_CACHE_ALIAS
+    from django.core.cache.backends.redis import RedisCache
+
+    if not isinstance(backend, RedisCache):
+        return None
+    location = settings.CACHES[DEFAULT_CACHE_ALIAS]['LOCATION']
+    if isinstance(location, str):
+        location = location.split(',')
+    return _redis_client(location[0])
+
+
+def acquire_lock(lock_key, token, timeout):
+    """
+    Take a cache lock for token if it is free.
+
+    Parameters:
+    - lock_key: Cache key of the lock
+    - token: Holder of the lock (string)
+    - timeout: Seconds after which the lock expires
+
+    Returns:
+    - True if the lock was taken
+    """
+    backend = _lock_cache()
+    client = _redis(backend)
+    if client is not None:
+        return bool(client.set(backend.make_and_validate_key(lock_key), token, nx=True, px=max(int(timeout * 1000), 1)))
+    with _local_lock:
+        return backend.add(lock_key, token, timeout)
+
+
+def lock_holder(lock_key):
+    """Token holding a cache lock, or None if it is free."""
+    backend = _lock_cache()
+    client = _redis(backend)
+    if client is not None:
+        token = client.get(backend.make_and_validate_key(lock_key))
+        return token.decode() if token is not None else None
+    return backend.get(lock_key)
+
+
+def release_lock(lock_key, token):
+    """
+    Release a cache lock if it is still held by token: a lock that expired
+    and was taken by another holder in the meantime is kept.
+    """
+    backend = _lock_cache()
+    client = _redis(backend)
+    if client is not None:
+        client.eval(RELEASE_SCRIPT, 1, backend.make_and_validate_key(lock_key), token)
+        return
+    with _local_lock:
+        if backend.get(lock_key) == token:
+            backend.delete(lock_key)
@@ -0,0 +1,149 @@
+"""
+File-backed store of the result rasters.
+
+Every result gets a directory under the store root holding one ``.npy`` file
+per layer (the signal raster, and any per-cell KPI layer) plus a
+``meta.json`` file with the grid geometry. Layers are written and read
+through ``np.memmap`` (``.npy`` files, readable with
+``np.load(path, mmap_mode='r')``), so readers only page in the window they
+access and the files can be served as-is with HTTP range requests.
+"""
+import json
+import os
+import re
+import shutil
+import uuid
+
+import numpy as np
+
+LAYER_NAME = re.compile(r'^[a-z][a-z0-9_]{0,31}$')
+META_FILE = 'meta.json'
+
+
+class ResultStore:
+    """
+    Directory of result rasters, one sub-directory per result key.
+    """
+
+    def __init__(self, root):
+        self.root = os.fspath(root)
+
+    def create(self, center_lon, center_lat, x0, y0, cell_size, shape):
+        """
+        Create an empty result directory.
+
+        Parameters:
+        - center_lon, center_lat: Antenna position (centre of the local frame)
+        - x0, y0: Local coordinates in m of the centre of cell (0, 0)
+        - cell_size: Cell size in km
+        - shape: Raster shape
+
+        Returns:
+        - Key of the new result
+        """
+        key = uuid.uuid4().hex
+        os.makedirs(self.path(key))
+        self._write_meta(key, {
+            'center': [center_lon, center_lat],
+            'x0': x0,
+            'y0': y0,
+            'cell_size': cell_size,
+            'shape': [int(n) for n in shape],
+            'layers': {},
+        })
+        return key
+
+    def path(self, key, layer=None):
+        """Directory of a result, or file of one of its layers."""
+        if not re.fullmatch(r'[0-9a-f]{32}', key):
+            raise ValueError(f"Invalid result key: {key}")
+        if layer is None:
+            return os.path.join(self.root, key)
+        if not LAYER_NAME.match(layer):
+            raise ValueError(f"Invalid layer name: {layer}")
+        return os.path.join(self.root, key, f"{layer}.npy")
+
+    def meta(self, key):
+        with open(os.path.join(self.path(key), META_FILE)) as f:
+            return json.load(f)
+
+    def _write_meta(self, key, meta):
+        # Written to a temporary file first so readers never see a partial file
+        path = os.path.join(self.path(key), META_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
+
+    def create_layer(self, key, layer, dtype=np.float32, fill=np.nan, shape=None):
+        """
+        Create a layer and return it as a writable memmap (of the raster shape
+        by default).
+
+        Parameters:
+        - key: Result key
+        - layer: Layer name (lowercase letters, digits and underscores)
+        - dtype: Layer dtype
+        - fill: Initial value of every cell (None to leave the file zeroed)
+        - shape: Layer shape, if not the raster shape (coarser levels)
+        """
+        meta = self.meta(key)
+        shape = tuple(meta['shape']) if shape is None else tuple(int(n) for n in shape)
+        values = np.lib.format.open_memmap(self.path(key, layer), mode='w+', dtype=dtype, shape=shape)
+        if fill is not None:
+            values[:] = fill
+        meta['layers'][layer] = np.dtype(dtype).str
+        self._write_meta(key, meta)
+        return values
+
+    def layer(self, key, layer, mode='r'):
+        """Memory-mapped layer (read-only by default)."""
+        return np.load(self.path(key, layer), mmap_mode=mode)
+
+    def reader(self, key, layer):
+        """Picklable read-only handle on a layer (see LayerReader)."""
+        return LayerReader(self.path(key, layer))
+
+    def window(self, key, layer, rows=slice(None), cols=slice(None)):
+        """
+        Copy of a window of a layer; only the pages of the window are read.
+        """
+        return np.array(self.layer(key, layer)[rows, cols])
+
+    def layers(self, key):
+        return sorted(self.meta(key)['layers'])
+
+    def size(self, key):
+        """Size in bytes of the files of a result."""
+        with os.scandir(self.path(key)) as entries:
+            return sum(entry.stat().st_size for entry in entries if entry.is_file())
+
+    def delete(self, key):
+        shutil.rmtree(self.path(key), ignore_errors=True)
+
+
+class LayerReader:
+    """
+    Read-only layer indexed like an array, memory-mapped on first access.
+
+    Unlike the memmap itself, a reader pickles as its path: it can be bound
+    to the row evaluator sent to worker processes, each of which then maps
+    the file and pages in the rows of its own tiles only.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._values = None
+
+    def __getstate__(self):
+        return {'path': self.path, '_values': None}
+
+    def __getitem__(self, index):
+        if self._values is None:
+            self._values = np.load(self.path, mmap_mode='r')
+        return self._values[index]
+
+
+def get_result_store():
+    """ResultStore configured by settings.SIMULATION_RESULTS_ROOT."""
+    from django.conf import settings
+    return ResultStore(settings.SIMULATION_RESULTS_ROOT)
@@ -0,0 +1,191 @@
+"""
+Chunked evaluation of the coverage grid.
+
+The grid is processed in blocks of rows: every chunk is evaluated with the
+vectorised kernels, folded into running aggregates and written out before
+the next one is computed, so the working memory depends on the chunk size
+and not on the size of the study area.
+
+Large grids can also be split into tiles (blocks of rows) evaluated across a
+pool of worker processes; the tiles are merged back in row order, so the
+result does not depend on the number of workers or on scheduling.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Signal histogram bins in dBm (values outside fall into the first/last bin)
+HISTOGRAM_EDGES = np.arange(-140, 25, 5)
+
+
+def iter_row_chunks(rows, chunk_rows):
+    """
+    Split range(rows) into consecutive slices of at most chunk_rows rows.
+    """
+    if chunk_rows < 1:
+        raise ValueError("chunk_rows must be positive")
+    for start in range(0, rows, chunk_rows):
+        yield slice(start, min(start + chunk_rows, rows))
+
+
+def evaluate_chunks(rows, chunk_rows, evaluate_rows):
+    """
+    Generator evaluating a grid block of rows at a time.
+
+    Parameters:
+    - rows: Number of rows (axis 0) of the grid
+    - chunk_rows: Number of rows per chunk
+    - evaluate_rows: Callable (rows slice) -> (signal, stats) with signal the
+      2-D signal array of these rows in dBm and stats a dict of keyword
+      arguments for CoverageAggregator.add
+
+    Yields:
+    - (rows slice, signal, stats)
+    """
+    for chunk in iter_row_chunks(rows, chunk_rows):
+        signal, stats = evaluate_rows(chunk)
+        yield chunk, signal, stats
+
+
+# Row evaluator of the current worker process, set once by _init_worker
+_worker_evaluate_rows = None
+
+
+def _init_worker(evaluate_rows):
+    global _worker_evaluate_rows
+    _worker_evaluate_rows = evaluate_rows
+
+
+def _evaluate_tile(rows):
+    return _worker_evaluate_rows(rows)
+
+
+def evaluate_chunks_parallel(rows, chunk_rows, evaluate_rows, workers):
+    """
+    Parallel version of evaluate_chunks over a ProcessPoolExecutor.
+
+    evaluate_rows (and therefore the kernel and parameters it is bound to)
+    is sent to every worker once, when the worker starts; the tasks only
+    carry the row slices. At most two tiles per worker are in flight, and
+    tiles are yielded in row order.
+
+    Parameters:
+    - rows, chunk_rows, evaluate_rows: see evaluate_chunks (evaluate_rows
+      must be picklable, e.g. a functools.partial of a module-level function)
+    - workers: Number of worker processes
+
+    Yields:
+    - (rows slice, signal, stats), in row order
+    """
+    tiles = iter_row_chunks(rows, chunk_rows)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(evaluate_rows,)) as executor:
+        pending = deque()
+        for tile in tiles:
+            pending.append((tile, executor.submit(_evaluate_tile, tile)))
+            if len(pending) >= 2 * workers:
+                tile, future = pending.popleft()
+                yield (tile, *future.result())
+        while pending:
+            tile, future = pending.popleft()
+            yield (tile, *future.result())
+
+
+class CoverageAggregator:
+    """
+    Running coverage statistics of a chunked evaluation.
+    """
+
+    def __init__(self, cell_area, population_density=None, threshold=-100.0, edges=HISTOGRAM_EDGES, band_count=0):
+        self.cell_area = cell_area  # km²
+        self.population_density = population_density
+        self.threshold = threshold
+        self.edges = np.asarray(edges, dtype=float)
+
+        self.grid_cells = 0
+        self.cells = 0
+        self.covered_cells = 0
+        self.fallback_cells = 0
+        self.model_evaluations = 0
+        self.interpolation_error = None
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.band_cells = np.zeros(band_count, dtype=np.int64)
+        # Population from a population raster (None with a uniform density)
+        self.raster_population = None
+        self.covered_population = None
+        self.band_populations = None
+
+    def add(self, signal, grid_cells=0, fallback_cells=0, model_evaluations=0, interpolation_error=None, bands=None,
+            population=None):
+        """
+        Fold a chunk in.
+
+        Parameters:
+        - signal: Array of signal strengths in dBm (NaN for cells without value)
+        - grid_cells: Cells of the chunk inside the simulated area
+        - fallback_cells: Cells of the chunk handled by the validity fallback
+        - model_evaluations: Model evaluations spent on the chunk (None if unknown)
+        - interpolation_error: Interpolation error estimate of the chunk in dB
+        - bands: Band of every cell of the chunk (see bands.classify_bands)
+        - population: Inhabitants of every cell of the chunk, from a
+          population raster (the uniform population density is used otherwise)
+        """
+        values = signal[~np.isnan(signal)]
+        self.grid_cells += int(grid_cells)
+        self.cells += int(values.size)
+        self.covered_cells += int(np.count_nonzero(values >= self.threshold))
+        self.fallback_cells += int(fallback_cells)
+
+        if model_evaluations is None or self.model_evaluations is None:
+            self.model_evaluations = None
+        else:
+            self.model_evaluations += int(model_evaluations)
+
+        if interpolation_error is not None:
+            self.interpolation_error = max(self.interpolation_error or 0.0, interpolation_error)
+
+        clipped = np.clip(values, self.edges[0], self.edges[-1])
+        self.counts += np.histogram(clipped, bins=self.edges)[0]
+
+        if bands is not None:
+            self.band_cells += np.bincount(bands.ravel(), minlength=len(self.band_cells) + 1)[1:]
+
+        if population is not None:
+            if self.raster_population is None:
+                self.raster_population = 0.0
+                self.covered_population = 0.0
+                self.band_populations = np.zeros(len(self.band_cells))
+            self.raster_population += float(population.sum())
+            self.covered_population += float(population[signal >= self.threshold].sum())
+            if bands is not None:
+                self.band_populations += np.bincount(bands.ravel(), weights=population.ravel(),
+                                                     minlength=len(self.band_cells) + 1)[1:]
+
+    @property
+    def covered_area(self):
+        """Covered area in km²."""
+        return self.covered_cells * self.cell_area
+
+    @property
+    def population_covered(self):
+        if self.covered_population is not None:
+            return int(round(self.covered_population))
+        if not self.population_density:
+            return None
+        return int(self.covered_area * self.population_density)
+
+    def band_area(self, band):
+        """Area in km² of the k-th band (1 for the best)."""
+        return int(self.band_cells[band - 1]) * self.cell_area
+
+    def band_population(self, band):
+        if self.band_populations is not None:
+            return int(round(self.band_populations[band - 1]))
+        if not self.population_density:
+            return None
+        return int(self.band_area(band) * self.population_density)
+
+    def histogram(self):
+        """Signal histogram for a JSONField."""
+        return {'edges': self.edges.tolist(), 'counts': self.counts.tolist()}
@@ -0,0 +1,316 @@
+"""
+Parameter sweeps: coverage of every combination of a few parameter axes
+around a base parameter set, on one shared geometry.
+
+Everything that does not depend on the swept parameters is computed once:
+the grid and the distance field of the cells inside the radius, their
+population, their land-cover class and the terrain profiles (the radial
+terrain samples are shared by every antenna height; clearance and
+diffraction are computed once per antenna height, mobile height and
+frequency).
+
+Combinations are then evaluated by loss field: the antenna power only
+shifts the signal, so the combinations differing by their power share one
+path-loss field. Loss fields are evaluated by batches, the single-law
+kernels of a batch in one broadcast over the shared distances. The
+coverage of all the powers of a field comes from one sort of the field:
+a cell is covered at power p if its loss is at most p + 100 dB, so the
+covered cells and their population are read from the cumulative sums of
+the sorted field.
+
+Sweeps are always evaluated on every cell (GRID mode), and return scalar
+results only; the full rasters of chosen combinations are computed by
+regular simulation jobs. Combinations whose parameters are outside the
+domain of their model get no results but the error.
+"""
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+
+from .clutter import open_clutter_raster
+from .dem import get_elevation_model
+from .diffraction import DIFFRACTION_NONE, ProfileDiffraction, line_of_sight_only
+from .engine import FALLBACK_SKIP, evaluate_path_loss_batch
+from .grid import LocalGrid
+from .population import open_population_raster
+from .propagation.kernels import compile_model
+from .propagation.okumura_hata import AREA_TYPES
+from .terrain import RadialProfiles, line_of_sight
+
+# Parameters that can be swept, and their type
+SWEEP_AXES = {
+    'antenna_height': float,
+    'antenna_power': float,
+    'frequency': float,
+    'propagation_model': str,
+    'terrain_type': str,
+    'scenario': str,
+    'los_condition': str,
+    'h_bs': float,
+    'h_ut': float,
+    'diffraction_method': str,
+}
+
+# Coverage threshold in dBm (as CoverageAggregator)
+COVERAGE_THRESHOLD = -100.0
+
+# Loss values held at once (loss fields x cells)
+SWEEP_BATCH = 1 << 24
+
+RESULT_COLUMNS = ('coverage_percentage', 'covered_area', 'population_covered', 'error')
+
+
+def sweep_combinations(axes):
+    """
+    Combinations of the axes values, first axis varying slowest.
+
+    Parameters:
+    - axes: {parameter: [values]}, parameters of SWEEP_AXES
+
+    Returns:
+    - List of {parameter: value} dicts
+    """
+    for name, values in axes.items():
+        if name not in SWEEP_AXES:
+            raise ValueError(f"Paramètre de balayage non pris en charge: {name}")
+        if not isinstance(values, (list, tuple)) or not values:
+            raise ValueError(f"L'axe {name} doit être une liste de valeurs non vide")
+    names = list(axes)
+    values = [[SWEEP_AXES[name](value) for value in axes[name]] for name in names]
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def _mobile_height(params):
+    return (params.h_ut or 1.5) if params.propagation_model == '3GPP_TR_38901' else 1.5
+
+
+def _site_height(params):
+    return (params.h_bs or 10.0) if params.propagation_model == '3GPP_TR_38901' else params.antenna_height
+
+
+class SweepGeometry:
+    """
+    Fields shared by the combinations of a sweep, on the cells inside the
+    radius (flattened).
+    """
+
+    def __init__(self, base, chunk_rows=256, grid=None):
+        """
+        Parameters:
+        - base: Base parameters (SimulationParameter attributes)
+        - chunk_rows: Rows per block when reading the rasters
+        - grid: LocalGrid of the base parameters, if already built
+        """
+        self.base = base
+        if grid is None:
+            grid = LocalGrid(base.location.x, base.location.y, base.radius, base.grid_size)
+        self.grid = grid
+        self.cells = grid.distances() <= grid.radius
+        self.distances = grid.distances()[self.cells]
+        self.total_area = np.pi * grid.radius ** 2
+
+        blocks = [slice(start, start + chunk_rows) for start in range(0, grid.shape[0], chunk_rows)]
+
+        # Inhabitants of every cell (uniform density otherwise)
+        self.population = None
+        if base.population_raster:
+            raster = open_population_raster(base.population_raster)
+            self.population = np.concatenate([raster.cell_population(grid, rows) for rows in blocks])[self.cells]
+
+        # Hata area type of every cell from the land cover
+        self.clutter = None
+        if base.clutter_raster:
+            raster = open_clutter_raster(base.clutter_raster)
+            self.clutter = np.concatenate([
+                raster.cell_classes(grid, rows, default=AREA_TYPES.index(base.terrain_type)) for rows in blocks
+            ])[self.cells]
+
+        # Terrain sampled once along the radials, for every antenna height
+        self.profiles = None
+        if base.use_terrain:
+            self.profiles = RadialProfiles(grid, get_elevation_model().grid_heights(grid), 0.0)
+        self._clearance = {}
+        self._line_of_sight = {}
+        self._diffraction = {}
+
+    def clearance(self, site_height, mobile_height):
+        """Line-of-sight clearance of the cells for an antenna height."""
+        key = (site_height, mobile_height)
+        if key not in self._clearance:
+            profiles = self.profiles.with_antenna_height(site_height)
+            self._clearance[key] = profiles.cell_clearance(mobile_height)[self.cells]
+        return self._clearance[key]
+
+    def line_of_sight(self, site_height, mobile_height, default):
+        """Line of sight of the cells for an antenna height (0: NLOS, 1: LOS)."""
+        key = (site_height, mobile_height, default)
+        if key not in self._line_of_sight:
+            los = line_of_sight(self.clearance(site_height, mobile_height), default=default)
+            self._line_of_sight[key] = los.astype(np.uint8)
+        return self._line_of_sight[key]
+
+    def diffraction(self, site_height, mobile_height, frequency, method, line_of_sight_default=None):
+        """
+        Diffraction loss of the cells for an antenna height and a frequency
+        (on the line-of-sight cells only when line_of_sight_default is given,
+        see line_of_sight()).
+        """
+        key = (site_height, mobile_height, frequency, method, line_of_sight_default)
+        if key not in self._diffraction:
+            if line_of_sight_default is None:
+                profiles = self.profiles.with_antenna_height(site_height)
+                diffraction = ProfileDiffraction(profiles, frequency, mobile_height)
+                self._diffraction[key] = diffraction.cell_loss(method)[self.cells]
+            else:
+                self._diffraction[key] = line_of_sight_only(
+                    self.diffraction(site_height, mobile_height, frequency, method),
+                    self.line_of_sight(site_height, mobile_height, line_of_sight_default),
+                )
+        return self._diffraction[key]
+
+    def loss_plan(self, params):
+        """
+        How to evaluate the path loss of a combination.
+
+        Returns:
+        - (classes, class_kernels, diffraction) as taken by evaluate_grid_rows
+          (on the flattened cells)
+
+        Raises:
+        - ValueError if the parameters are outside the domain of the model
+        """
+        kernel = compile_model(params)
+
+        classes, class_kernels, diffraction = None, [kernel], None
+        if self.profiles is not None:
+            site_height, mobile_height = _site_height(params), _mobile_height(params)
+            los_default = None
+            if params.propagation_model == '3GPP_TR_38901':
+                los_default = (params.los_condition or 'LOS') == 'LOS'
+                classes = self.line_of_sight(site_height, mobile_height, los_default)
+                class_kernels = [compile_model(params, los_condition='NLOS'), compile_model(params, los_condition='LOS')]
+            if params.diffraction_method != DIFFRACTION_NONE:
+                # Not on the TR 38.901 NLOS cells (as in a full run)
+                diffraction = self.diffraction(
+                    site_height, mobile_height, params.frequency, params.diffraction_method, los_default
+                )
+        if self.clutter is not None and params.propagation_model != '3GPP_TR_38901':
+            classes = self.clutter
+            class_kernels = [compile_model(params, terrain_type=area_type) for area_type in AREA_TYPES]
+        return classes, class_kernels, diffraction
+
+    def coverage(self, path_loss, powers):
+        """
+        Coverage of a loss field at several antenna powers.
+
+        Parameters:
+        - path_loss: Loss in dB of the cells (NaN where not evaluated)
+        - powers: Antenna powers in dBm
+
+        Returns:
+        - List of (coverage_percentage, covered_area, population_covered, None)
+        """
+        defined = ~np.isnan(path_loss)
+        order = np.argsort(path_loss[defined], kind='stable')
+        ordered = path_loss[defined][order]
+        covered_cells = np.searchsorted(ordered, np.asarray(powers, dtype=float) - COVERAGE_THRESHOLD, side='right')
+        if self.population is not None:
+            cumulative = np.concatenate([[0.0], np.cumsum(self.population[defined][order])])
+
+        results = []
+        for count in covered_cells:
+            covered_area = float(count * self.grid.cell_area)
+            if self.population is not None:
+                population = int(round(cumulative[count]))
+            elif self.base.population_density:
+                population = int(covered_area * self.base.population_density)
+            else:
+                population = None
+            percentage = covered_area / self.total_area * 100 if self.total_area else 0.0
+            results.append((percentage, covered_area, population, None))
+        return results
+
+
+def run_sweep(base, axes, chunk_rows=256, grid=None, progress=None):
+    """
+    Coverage of every combination of the axes around the base parameters.
+
+    Parameters:
+    - base: Base parameters (SimulationParameter attributes, e.g. a
+      SimpleNamespace)
+    - axes: {parameter: [values]} (see sweep_combinations)
+    - chunk_rows: Rows per block when reading the rasters
+    - grid: LocalGrid of the base parameters, if already built
+    - progress: Callable (fraction, stage) called as the sweep advances, or None
+
+    Returns:
+    - (combinations, rows, geometry): the {parameter: value} combinations,
+      their (coverage_percentage, covered_area, population_covered, error)
+      rows in the same order (results None and the error message for the
+      combinations outside the domain of their model), and the
+      SweepGeometry
+    """
+    report = progress or (lambda fraction, stage: None)
+    combinations = sweep_combinations(axes)
+    report(0.0, 'geometry')
+    geometry = SweepGeometry(base, chunk_rows, grid)
+
+    # Combinations sharing everything but the power share a loss field
+    fields = {}
+    for index, combination in enumerate(combinations):
+        key = tuple(sorted((name, value) for name, value in combination.items() if name != 'antenna_power'))
+        fields.setdefault(key, []).append(index)
+
+    def parameters(index):
+        return SimpleNamespace(**{**vars(base), **combinations[index]})
+
+    rows = [None] * len(combinations)
+    keys = list(fields)
+    batch_size = max(1, SWEEP_BATCH // max(len(geometry.distances), 1))
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        report(start / len(keys), 'sweep')
+        params = [parameters(fields[key][0]) for key in batch]
+        plans, errors = [], []
+        for p in params:
+            try:
+                plans.append(geometry.loss_plan(p))
+                errors.append(None)
+            except ValueError as e:
+                plans.append(None)
+                errors.append(str(e))
+        path_loss = np.full((len(batch), len(geometry.distances)), np.nan)
+
+        # Fields with the same cell classes are evaluated together, one
+        # broadcast per class
+        groups = {}
+        for k, plan in enumerate(plans):
+            if plan is not None:
+                groups.setdefault(id(plan[0]), []).append(k)
+        for members in groups.values():
+            classes, class_count = plans[members[0]][0], len(plans[members[0]][1])
+            for index in range(class_count):
+                part = np.ones(len(geometry.distances), dtype=bool) if classes is None else classes == index
+                if not part.any():
+                    continue
+                path_loss[np.ix_(members, part)] = evaluate_path_loss_batch(
+                    [plans[k][1][index] for k in members],
+                    geometry.distances[part],
+                    [params[k].frequency for k in members],
+                    fallback=base.validity_fallback or FALLBACK_SKIP
+                )
+
+        for k, key in enumerate(batch):
+            plan, indices = plans[k], fields[key]
+            if plan is None:
+                for index in indices:
+                    rows[index] = (None, None, None, errors[k])
+                continue
+            if plan[2] is not None:
+                path_loss[k] += plan[2]
+            powers = [combinations[index].get('antenna_power', base.antenna_power) for index in indices]
+            for index, row in zip(indices, geometry.coverage(path_loss[k], powers)):
+                rows[index] = row
+
+    return combinations, rows, geometry
@@ -1,3 +1,1278 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import os
+import tempfile
+import time
+import uuid
+from functools import partial
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from utils.http_range import ranged_file_response
+
+from .clutter import NpyClutterRaster
+from .contour import coverage_multipolygon, mask_polygons, ring_area, trace_rings
+from .dem import HGT_VOID, ElevationModel
+from .diffraction import DIFFRACTION_METHODS, DIFFRACTION_NONE, ProfileDiffraction, knife_edge_loss
+from .engine import (
+    EVALUATION_ADAPTIVE, EVALUATION_GRID, EVALUATION_RADIAL, FALLBACK_CLAMP, FALLBACK_FREE_SPACE, FALLBACK_SKIP,
+    evaluate_grid_rows, evaluate_path_loss, evaluate_path_loss_batch, evaluate_path_loss_radial, mask_edges,
+)
+from .grid import LocalGrid, local_to_wgs84
+from .jobs import SQLiteBroker
+from .live import JobEventHub, event_batch, event_stream, job_events
+from .models import CachedResult, JobEvent, Simulation, SimulationJob, SimulationParameter, SimulationResult
+from .population import NpyPopulationRaster
+from .propagation import cost_231, okumura_hata
+from .propagation.okumura_hata import AREA_TYPES
+from .propagation.kernels import compile_hata, compile_mmwave, compile_tr38901, evaluate_kernels
+from .propagation_models_5g import MillimeterWavePropagation, PropagationModel5G, ThreeGPP_TR_38901
+from .raster import (
+    NODATA, SCALE, CompactRaster, RasterEncoder, legacy_points_requested, raster_header, raster_to_json,
+)
+from .resultcache import evict, parameters_key
+from .singleflight import acquire_lock, lock_holder, release_lock
+from .store import ResultStore
+from .streaming import evaluate_chunks, evaluate_chunks_parallel
+from .terrain import RadialProfiles, line_of_sight
+from .tilecache import TileCache
+from .views import parameter_values, run_propagation_model, run_sweep_model
+
+
+class HataPathLossTests(SimpleTestCase):
+    """
+    Vectorised Okumura-Hata and COST-231 losses against the values of the
+    former scalar implementation.
+    """
+
+    # (frequency MHz, hb m, hm m, distance km, area type, loss dB)
+    HATA_REFERENCE = [
+        (900, 50, 1.5, 1, 'URBAN', 123.35413763396343),
+        (900, 50, 1.5, 5, 'SUBURBAN', 137.0169681634095),
+        (200, 30, 2, 10, 'RURAL', 119.6063397892353),
+        (1400, 120, 1.5, 20, 'OPEN', 123.23284056320327),
+    ]
+    COST_231_REFERENCE = [
+        (1800, 50, 1.5, 1, 'URBAN', 136.17489151003278),
+        (1800, 50, 1.5, 5, 'SUBURBAN', 147.84177338727264),
+        (2000, 30, 2, 10, 'RURAL', 142.45169067516957),
+        (1500, 120, 1.5, 20, 'OPEN', 127.99335586668343),
+    ]
+
+    def check_reference(self, model, reference):
+        for frequency, hb, hm, distance, area_type, expected in reference:
+            self.assertAlmostEqual(model.calculate_path_loss(frequency, hb, hm, distance, area_type), expected, places=9)
+
+    def test_okumura_hata_matches_scalar_values(self):
+        self.check_reference(okumura_hata, self.HATA_REFERENCE)
+
+    def test_cost_231_matches_scalar_values(self):
+        self.check_reference(cost_231, self.COST_231_REFERENCE)
+
+    def test_array_matches_element_wise_values(self):
+        distances = np.linspace(1, 20, 50)
+        for area_type in okumura_hata.AREA_TYPES:
+            losses = okumura_hata.calculate_path_loss_array(900, 50, 1.5, distances, area_type)
+            self.assertEqual(losses.shape, distances.shape)
+            for distance, loss in zip(distances, losses):
+                self.assertAlmostEqual(loss, okumura_hata.calculate_path_loss(900, 50, 1.5, distance, area_type), places=9)
+
+    def test_grid_matches_the_scalar_model_inside_the_domain(self):
+        distances = np.random.default_rng(7).uniform(0, 25, (40, 40))
+        for model, frequency in ((okumura_hata, 900), (cost_231, 1800)):
+            for area_type in model.AREA_TYPES:
+                def path_loss_func(d):
+                    return model.calculate_path_loss_array(frequency, 30, 1.5, d, area_type)
+
+                path_loss, _ = evaluate_path_loss(path_loss_func, distances, (1, 20), frequency)
+                inside = (distances >= 1) & (distances <= 20)
+                expected = [model.calculate_path_loss(frequency, 30, 1.5, d, area_type) for d in distances[inside]]
+                # Bit for bit, not only within a tolerance
+                np.testing.assert_array_equal(path_loss[inside], expected, err_msg=f"{model.__name__} {area_type}")
+
+    def test_out_of_range_inputs_raise(self):
+        with self.assertRaisesMessage(ValueError, "Frequency must be between 150 and 1500 MHz"):
+            okumura_hata.calculate_path_loss_array(1600, 50, 1.5, np.array([1.0, 2.0]), 'URBAN')
+        with self.assertRaisesMessage(ValueError, "Distance must be between 1 and 20 kilometers"):
+            okumura_hata.calculate_path_loss_array(900, 50, 1.5, np.array([1.0, np.nan]), 'URBAN')
+        with self.assertRaisesMessage(ValueError, "Antenna height must be between 30 and 200 meters"):
+            cost_231.calculate_path_loss_array(1800, 20, 1.5, 1.0, 'URBAN')
+
+
+class TR38901PathLossTests(SimpleTestCase):
+    """
+    Array TR 38.901 losses (3.5 GHz, default heights) against the values of
+    the former scalar implementation.
+    """
+
+    DISTANCES = [50.0, 300.0, 2000.0]  # m
+    REFERENCE = {
+        ('UMa', 'LOS'): [76.39480582184532, 93.38186201386026, 119.71037659675426],
+        ('UMa', 'NLOS'): [91.05888034398458, 121.23406925234565, 153.4257663966069],
+        ('UMi', 'LOS'): [79.08964923389806, 95.30456650809413, 112.60307316186808],
+        ('UMi', 'NLOS'): [94.18067689919928, 121.43718069820505, 150.515146644787],
+        ('RMa', 'LOS'): [91.98090325083096, 123.88510451656035, 157.40555081665786],
+        ('RMa', 'NLOS'): [92.27415562329958, 123.88510451656035, 157.40555081665786],
+        ('InH-Office', 'LOS'): [72.78056985849318, 86.13857313675946, 100.38924766582087],
+        ('InH-Office', 'NLOS'): [96.15479162270206, 125.72771217516441, 157.2768933579998],
+        ('InH-ShoppingMall', 'LOS'): [72.78056985849318, 86.13857313675946, 100.38924766582087],
+        ('InH-ShoppingMall', 'NLOS'): [94.99154719235368, 127.96187898321902, 163.1355091792261],
+    }
+
+    def test_array_matches_scalar_values(self):
+        for (scenario, los_condition), expected in self.REFERENCE.items():
+            losses = ThreeGPP_TR_38901.path_loss_array(3.5e9, np.array(self.DISTANCES), scenario, los_condition)
+            np.testing.assert_allclose(losses, expected, rtol=1e-12, err_msg=f"{scenario} {los_condition}")
+
+    def test_nlos_is_never_below_los(self):
+        distances = np.geomspace(10, 10000, 200)
+        for scenario in ThreeGPP_TR_38901.SCENARIOS:
+            los = ThreeGPP_TR_38901.path_loss_array(3.5e9, distances, scenario, 'LOS')
+            nlos = ThreeGPP_TR_38901.path_loss_array(3.5e9, distances, scenario, 'NLOS')
+            self.assertTrue(np.all(nlos >= los), scenario)
+
+    def test_out_of_range_distance_raises(self):
+        with self.assertRaisesMessage(ValueError, "La distance doit être comprise entre 10 et 10000 mètres"):
+            ThreeGPP_TR_38901.path_loss_array(3.5e9, np.array([5.0, 50.0]), 'UMa', 'LOS')
+
+
+class PathLossKernelTests(SimpleTestCase):
+    """
+    Compiled kernels against the model functions they fold.
+    """
+
+    def test_hata_kernels_match_models(self):
+        distances = np.linspace(1, 20, 100)  # km
+        for model, frequency in ((okumura_hata, 900), (cost_231, 1800)):
+            for area_type in model.AREA_TYPES:
+                kernel = compile_hata(frequency, 50, 1.5, area_type, model=model)
+                expected = model.calculate_path_loss_array(frequency, 50, 1.5, distances, area_type)
+                np.testing.assert_allclose(kernel(distances), expected, rtol=1e-12)
+                self.assertEqual(kernel.distance_range, model.VALIDITY_DOMAIN['distance'])
+
+    def test_tr38901_kernels_match_model(self):
+        distances = np.geomspace(10, 10000, 200)  # m
+        for scenario in ThreeGPP_TR_38901.SCENARIOS:
+            for los_condition in ('LOS', 'NLOS'):
+                kernel = compile_tr38901(3.5e9, scenario, los_condition, h_bs=25.0, h_ut=1.5, h=5.0, w=20.0)
+                expected = ThreeGPP_TR_38901.path_loss_array(
+                    3.5e9, distances, scenario, los_condition, h_bs=25.0, h_ut=1.5, h=5.0, w=20.0
+                )
+                np.testing.assert_allclose(kernel(distances / 1000), expected, rtol=1e-12,
+                                           err_msg=f"{scenario} {los_condition}")
+
+    def test_mmwave_kernel_matches_model(self):
+        distances = np.geomspace(1, 10000, 100)  # m
+        for los_condition in ('LOS', 'NLOS'):
+            kernel = compile_mmwave(28e9, los_condition, material_attenuation=0.1)
+            expected = MillimeterWavePropagation.path_loss_array(28e9, distances, los_condition, 0.1)
+            np.testing.assert_allclose(kernel(distances / 1000), expected, rtol=1e-12)
+
+    def test_batched_evaluation_matches_kernels(self):
+        distances = np.linspace(1, 10, 50)  # km
+        kernels = [
+            compile_hata(900, 50, 1.5, 'URBAN'),
+            compile_tr38901(3.5e9, 'UMa', 'NLOS'),
+            compile_hata(1800, 40, 1.5, 'RURAL', model=cost_231),
+        ]
+        losses = evaluate_kernels(kernels, distances)
+        for kernel, loss in zip(kernels, losses):
+            np.testing.assert_allclose(loss, kernel(distances), rtol=1e-12)
+
+    def test_closed_form_radius_matches_model(self):
+        kernel = compile_hata(900, 50, 1.5, 'URBAN')
+        expected = okumura_hata.calculate_coverage_radius_array(900, 50, 43, -100, 'URBAN')
+        np.testing.assert_allclose(kernel.coverage_radius(143.0), expected, rtol=1e-12)
+
+    def test_out_of_domain_parameters_raise(self):
+        with self.assertRaisesMessage(ValueError, "Mobile height must be between 1 and 10 meters"):
+            compile_hata(900, 50, 12, 'URBAN')
+        with self.assertRaisesMessage(ValueError, "La fréquence doit être comprise entre 24 et 100 GHz pour les ondes mmWave"):
+            compile_mmwave(3.5e9, 'LOS')
+
+
+class ValidityFallbackTests(SimpleTestCase):
+    """
+    Fallback policies of the cells outside the model validity domain (1-20 km for Hata).
+    """
+
+    # Antenna cell, below, on and above the domain edges
+    DISTANCES = np.array([0.0, 0.5, 1.0, 10.0, 20.0, 25.0])  # km
+    OUTSIDE = np.array([True, True, False, False, False, True])
+
+    def setUp(self):
+        self.kernel = compile_hata(900, 30, 1.5, 'URBAN')
+
+    def model(self, distances):
+        return okumura_hata.calculate_path_loss_array(900, 30, 1.5, distances, 'URBAN')
+
+    def evaluate(self, fallback):
+        path_loss, fallback_cells = evaluate_path_loss(self.model, self.DISTANCES, (1, 20), 900, fallback)
+        self.assertEqual(fallback_cells, 3)
+        np.testing.assert_array_equal(path_loss[~self.OUTSIDE], self.model(self.DISTANCES[~self.OUTSIDE]))
+        # Same policy through the compiled kernels
+        batch = evaluate_path_loss_batch([self.kernel], self.DISTANCES, [900], fallback)
+        np.testing.assert_allclose(batch[0], path_loss, rtol=1e-12)
+        return path_loss
+
+    def test_skip(self):
+        path_loss = self.evaluate(FALLBACK_SKIP)
+        self.assertTrue(np.isnan(path_loss[self.OUTSIDE]).all())
+
+    def test_clamp(self):
+        path_loss = self.evaluate(FALLBACK_CLAMP)
+        np.testing.assert_array_equal(path_loss[self.OUTSIDE], self.model(np.array([1.0, 1.0, 20.0])))
+
+    def test_free_space(self):
+        path_loss = self.evaluate(FALLBACK_FREE_SPACE)
+        # The antenna cell takes the free-space loss at 1 m
+        expected = PropagationModel5G.free_space_path_loss_array(900e6, np.array([1.0, 500.0, 25000.0]))
+        np.testing.assert_allclose(path_loss[self.OUTSIDE], expected, rtol=1e-12)
+
+    def test_radial_profile_applies_the_same_policies(self):
+        for fallback in (FALLBACK_SKIP, FALLBACK_CLAMP, FALLBACK_FREE_SPACE):
+            expected, _ = evaluate_path_loss(self.model, self.DISTANCES, (1, 20), 900, fallback)
+            path_loss, fallback_cells, error, _ = evaluate_path_loss_radial(
+                self.model, self.DISTANCES, (1, 20), 900, fallback
+            )
+            self.assertEqual(fallback_cells, 3)
+            np.testing.assert_allclose(path_loss, expected, atol=max(error, 1e-9), err_msg=fallback)
+
+    def test_unknown_policy_raises(self):
+        with self.assertRaisesMessage(ValueError, "Invalid fallback policy: NEAREST"):
+            evaluate_path_loss(self.model, self.DISTANCES, (1, 20), 900, 'NEAREST')
+
+
+class CoverageRadiusTests(SimpleTestCase):
+    """
+    Closed-form and batched coverage radii against a per-configuration bisection.
+    """
+
+    # Powers in dBm from short of 1 km to beyond 20 km at -100 dBm
+    POWERS = np.array([-10.0, 10.0, 20.0, 30.0, 43.0, 50.0, 60.0, 90.0])
+
+    def bisect(self, model, frequency, area_type, power):
+        def path_loss(distance):
+            return model.calculate_path_loss_array(frequency, 40, 1.5, np.clip(distance / 1000, 1, 20), area_type)
+
+        return PropagationModel5G.bisect_coverage_radius(path_loss, power + 100, 1000, 20000, tolerance=0.01) / 1000
+
+    def test_closed_form_matches_bisection(self):
+        for model, frequency in ((okumura_hata, 900), (cost_231, 1800)):
+            for area_type in model.AREA_TYPES:
+                radii = model.calculate_coverage_radius_array(frequency, 40, self.POWERS, -100, area_type)
+                np.testing.assert_allclose(radii, self.bisect(model, frequency, area_type, self.POWERS), atol=1e-5,
+                                           err_msg=f"{model.__name__} {area_type}")
+                for power, radius in zip(self.POWERS, radii):
+                    self.assertEqual(model.calculate_coverage_radius(frequency, 40, power, -100, area_type), radius)
+
+    def test_radius_is_clipped_to_the_model_range(self):
+        for model, frequency in ((okumura_hata, 900), (cost_231, 1800)):
+            radii = model.calculate_coverage_radius_array(frequency, 40, self.POWERS, -100, 'URBAN')
+            self.assertEqual(radii[0], 1.0)
+            self.assertEqual(radii[-1], 20.0)
+            self.assertTrue(((radii > 1) & (radii < 20)).any())
+            self.assertTrue(np.all(np.diff(radii) >= 0))
+
+    def test_batched_bisection_matches_single_configurations(self):
+        frequencies = np.array([[3.5e9], [28e9]])
+        radii = ThreeGPP_TR_38901.coverage_radius_array(frequencies, self.POWERS, -100, 'UMa', 'NLOS')
+        self.assertEqual(radii.shape, (2, len(self.POWERS)))
+        for k, frequency in enumerate(frequencies[:, 0]):
+            for power, radius in zip(self.POWERS, radii[k]):
+                self.assertEqual(ThreeGPP_TR_38901.coverage_radius_array(frequency, power, -100, 'UMa', 'NLOS'), radius)
+
+    def test_free_space_radius(self):
+        radii = MillimeterWavePropagation.coverage_radius_array(28e9, self.POWERS, -100, 'LOS', tolerance=0.01)
+        # Free-space loss solved for the distance, within the model range
+        expected = np.clip(3e8 / (4 * np.pi * 28e9) * 10 ** ((self.POWERS + 100) / 20), 1, 10000)
+        np.testing.assert_allclose(radii, expected, atol=0.01)
+
+
+class RasterCodecTests(SimpleTestCase):
+    """
+    Compact signal rasters written by blocks of rows and read back.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.signal = rng.uniform(-140, -40, (37, 23))
+        self.signal[rng.random(self.signal.shape) < 0.2] = np.nan
+
+    def encode(self, rows=8):
+        encoder = RasterEncoder(2.35, 48.85, -1800.0, -1100.0, 0.1, self.signal.shape)
+        for start in range(0, self.signal.shape[0], rows):
+            encoder.write(self.signal[start:start + rows])
+        return encoder.finish()
+
+    def test_round_trip(self):
+        raster = CompactRaster.from_bytes(self.encode())
+        self.assertEqual(raster.shape, self.signal.shape)
+        self.assertEqual((raster.center_lon, raster.center_lat, raster.x0, raster.y0, raster.cell_size),
+                         (2.35, 48.85, -1800.0, -1100.0, 0.1))
+        np.testing.assert_array_equal(np.isnan(raster.signal()), np.isnan(self.signal))
+        np.testing.assert_allclose(raster.signal(), self.signal, atol=0.5 / SCALE, equal_nan=True)
+
+    def test_re_encoding_is_identical(self):
+        data = self.encode()
+        self.assertEqual(CompactRaster.from_bytes(data).to_bytes(), data)
+
+    def test_header(self):
+        header = raster_header(self.encode())
+        self.assertEqual(header['shape'], list(self.signal.shape))
+        self.assertEqual(header['nodata'], int(NODATA))
+
+    def test_api_representation(self):
+        data = self.encode()
+        encoded = raster_to_json(data)
+        self.assertEqual(encoded['shape'], list(self.signal.shape))
+        self.assertEqual(base64.b64decode(encoded['data']), data)
+
+    def test_legacy_points_are_opt_in(self):
+        self.assertFalse(legacy_points_requested({}))
+        self.assertFalse(legacy_points_requested({'legacy': '0'}))
+        self.assertTrue(legacy_points_requested({'legacy': '1'}))
+
+    def test_incomplete_raster_is_rejected(self):
+        encoder = RasterEncoder(2.35, 48.85, 0.0, 0.0, 0.1, self.signal.shape)
+        encoder.write(self.signal[:10])
+        with self.assertRaises(ValueError):
+            encoder.finish()
+
+    def test_invalid_data_is_rejected(self):
+        with self.assertRaisesMessage(ValueError, "Not an encoded signal raster"):
+            CompactRaster.from_bytes(b'XXXX' + self.encode()[4:])
+
+
+class SignalRasterMigrationTests(TransactionTestCase):
+    """
+    0014 adds a compact raster to the results that only have the legacy
+    "lon,lat" -> dBm dictionary, and keeps the dictionary.
+    """
+
+    migrate_from = ('simulation', '0013_simulationresult_signal_histogram')
+    migrate_to = ('simulation', '0014_simulationresult_signal_raster')
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([target])
+        return executor.loader.project_state([target]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def legacy_signal_strength(self, center_lon, center_lat, radius, grid_size=0.1):
+        """Dictionary as written by the former degree-based grid."""
+        x = np.linspace(center_lon - radius / 111, center_lon + radius / 111, int(2 * radius / grid_size))
+        y = np.linspace(center_lat - radius / 111, center_lat + radius / 111, int(2 * radius / grid_size))
+        signal_strength = {}
+        for lon in x:
+            for lat in y:
+                distance = ((lon - center_lon)**2 + (lat - center_lat)**2)**0.5 * 111
+                if distance <= radius:
+                    signal_strength[f"{lon:.6f},{lat:.6f}"] = -60.0 - 10 * distance
+        return signal_strength
+
+    def test_legacy_results_get_a_raster(self):
+        apps = self.migrate(self.migrate_from)
+        Simulation = apps.get_model('simulation', 'Simulation')
+        SimulationParameter = apps.get_model('simulation', 'SimulationParameter')
+        SimulationResult = apps.get_model('simulation', 'SimulationResult')
+
+        center_lon, center_lat = 2.35, 45.0
+        signal_strength = self.legacy_signal_strength(center_lon, center_lat, 5)
+        simulation = Simulation.objects.create(name='legacy')
+        SimulationParameter.objects.create(
+            simulation=simulation, technology='4G', propagation_model='OKUMURA_HATA', frequency=900,
+            antenna_height=30, antenna_power=43, terrain_type='URBAN', location=Point(center_lon, center_lat),
+            radius=5, grid_size=0.1,
+        )
+        result = SimulationResult.objects.create(
+            simulation=simulation,
+            coverage_area=MultiPolygon(Polygon.from_bbox((2.3, 44.95, 2.4, 45.05))),
+            coverage_percentage=100.0,
+            signal_strength_data=signal_strength,
+        )
+
+        apps = self.migrate(self.migrate_to)
+        result = apps.get_model('simulation', 'SimulationResult').objects.get(pk=result.pk)
+        self.assertEqual(result.signal_strength_data, signal_strength)
+        self.assertIsNotNone(result.signal_raster)
+
+        _, _, values = CompactRaster.from_bytes(result.signal_raster).cells()
+        expected = np.round(np.array(list(signal_strength.values())) * SCALE) / SCALE
+        self.assertEqual(len(values), len(signal_strength))
+        np.testing.assert_allclose(np.sort(values), np.sort(expected), atol=0.5 / SCALE)
+
+
+class SweepTests(TestCase):
+    """
+    Scalar results of a sweep against full runs of the same combinations.
+    """
+
+    BASE = {
+        'technology': '4G',
+        'propagation_model': 'OKUMURA_HATA',
+        'frequency': 900,
+        'antenna_height': 40,
+        'antenna_power': 40,
+        'terrain_type': 'SUBURBAN',
+        'longitude': 2.35,
+        'latitude': 46.5,
+        'radius': 8,
+        'population_density': 50,
+        'grid_size': 0.1,
+    }
+
+    def setUp(self):
+        results_root = tempfile.TemporaryDirectory()
+        self.addCleanup(results_root.cleanup)
+        settings = override_settings(SIMULATION_RESULTS_ROOT=results_root.name, SIMULATION_RESULT_CACHE_MB=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def parameters(self, **changes):
+        simulation = Simulation.objects.create(name='sweep')
+        return SimulationParameter.objects.create(simulation=simulation, **parameter_values({**self.BASE, **changes}))
+
+    def test_sweep_matches_full_runs(self):
+        axes = {'frequency': [450.0, 900.0], 'antenna_power': [30.0, 43.0]}
+        table = run_sweep_model(self.parameters(), axes)
+        self.assertEqual(table['columns'], ['frequency', 'antenna_power', 'coverage_percentage', 'covered_area',
+                                            'population_covered', 'error'])
+        self.assertEqual(table['combinations'], 4)
+
+        for frequency, antenna_power, coverage_percentage, covered_area, population, error in table['rows']:
+            run = run_propagation_model(self.parameters(frequency=frequency, antenna_power=antenna_power))
+            self.assertIsNone(error)
+            self.assertAlmostEqual(coverage_percentage, run['coverage_percentage'], places=6)
+            self.assertEqual(population, run['population_covered'])
+
+    def test_combinations_outside_the_domain_report_the_error(self):
+        table = run_sweep_model(self.parameters(), {'frequency': [900.0, 1800.0]})
+        self.assertIsNone(table['rows'][0][-1])
+        self.assertEqual(table['rows'][1][1:], [None, None, None, "Frequency must be between 150 and 1500 MHz"])
+
+
+class SQLiteBrokerTests(SimpleTestCase):
+    """
+    Delivery of the jobs of the SQLite queue: a job taken by a worker that
+    stops without acknowledging it is delivered again once its lease expires.
+    """
+
+    LEASE = 0.5  # s
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.broker = SQLiteBroker(os.path.join(directory.name, 'jobs.sqlite3'), lease=self.LEASE)
+
+    def test_jobs_are_delivered_in_order(self):
+        for job_id in (3, 1, 2):
+            self.broker.enqueue(job_id)
+        self.assertEqual([self.broker.dequeue(0) for _ in range(4)], ['3', '1', '2', None])
+
+    def test_leased_job_is_not_delivered_twice(self):
+        self.broker.enqueue(1)
+        self.assertEqual(self.broker.dequeue(0), '1')
+        self.assertIsNone(self.broker.dequeue(0))
+
+    def test_expired_lease_is_delivered_again(self):
+        self.broker.enqueue(1)
+        self.assertEqual(self.broker.dequeue(0), '1')
+        time.sleep(self.LEASE + 0.1)
+        self.assertEqual(self.broker.dequeue(0), '1')
+
+    def test_renewed_lease_is_kept(self):
+        self.broker.enqueue(1)
+        self.assertEqual(self.broker.dequeue(0), '1')
+        for _ in range(3):
+            time.sleep(self.LEASE * 0.6)
+            self.broker.renew(1)
+        self.assertIsNone(self.broker.dequeue(0))
+
+    def test_acknowledged_job_is_not_delivered_again(self):
+        self.broker.enqueue(1)
+        self.assertEqual(self.broker.dequeue(0), '1')
+        self.broker.ack(1)
+        time.sleep(self.LEASE + 0.1)
+        self.assertIsNone(self.broker.dequeue(0))
+
+
+class CacheLockTests(SimpleTestCase):
+    """
+    Cache locks are released by their holder only.
+    """
+
+    def setUp(self):
+        self.key = f"test:lock:{uuid.uuid4().hex}"
+        self.addCleanup(lambda: [release_lock(self.key, token) for token in ('old', 'new')])
+
+    def test_lock_is_taken_once(self):
+        self.assertTrue(acquire_lock(self.key, 'old', 30))
+        self.assertFalse(acquire_lock(self.key, 'new', 30))
+        self.assertEqual(lock_holder(self.key), 'old')
+        release_lock(self.key, 'old')
+        self.assertIsNone(lock_holder(self.key))
+
+    def test_stale_token_does_not_release_a_lock_taken_again(self):
+        self.assertTrue(acquire_lock(self.key, 'old', 0.1))
+        time.sleep(0.2)
+        self.assertTrue(acquire_lock(self.key, 'new', 30))
+        release_lock(self.key, 'old')
+        self.assertEqual(lock_holder(self.key), 'new')
+
+
+class RadialProfilesTests(SimpleTestCase):
+    """
+    Line-of-sight sweep along the radial terrain profiles.
+    """
+
+    def setUp(self):
+        self.grid = LocalGrid(2.35, 46.5, 5, 0.05)
+        x, y = np.meshgrid(self.grid.x, self.grid.y, indexing='ij')
+        self.x = x
+        self.inside = np.hypot(x, y) <= self.grid.radius * 1000
+
+    def test_flat_terrain_is_in_line_of_sight(self):
+        profiles = RadialProfiles(self.grid, np.zeros(self.grid.shape), 30.0)
+        clearance = profiles.cell_clearance(1.5)
+        self.assertTrue(line_of_sight(clearance)[self.inside].all())
+        self.assertTrue(np.isinf(clearance[self.grid.origin]))
+
+    def test_cells_behind_a_ridge_are_not_in_line_of_sight(self):
+        # An 80 m ridge 2 km east of the antenna, across the whole grid
+        heights = np.zeros(self.grid.shape)
+        heights[self.grid.origin[0] + 40:self.grid.origin[0] + 43] = 80.0
+        profiles = RadialProfiles(self.grid, heights, 30.0)
+        los = line_of_sight(profiles.cell_clearance(1.5))
+
+        self.assertTrue(los[self.inside & (self.x < 1900)].all())
+        self.assertFalse(los[self.inside & (self.x > 2300)].any())
+
+    def test_row_blocks_match_the_whole_grid(self):
+        heights = np.random.default_rng(5).uniform(0, 50, self.grid.shape)
+        profiles = RadialProfiles(self.grid, heights, 30.0)
+        whole = profiles.cell_clearance(1.5)
+        blocks = np.concatenate([profiles.cell_clearance(1.5, slice(start, start + 64))
+                                 for start in range(0, self.grid.shape[0], 64)])
+        np.testing.assert_array_equal(blocks, whole)
+
+
+class DiffractionTests(SimpleTestCase):
+    """
+    Knife-edge diffraction along terrain profiles.
+    """
+
+    METHODS = [method for method in DIFFRACTION_METHODS if method != DIFFRACTION_NONE]
+
+    def test_flat_terrain_has_no_loss(self):
+        grid = LocalGrid(2.35, 46.5, 5, 0.1)
+        profiles = RadialProfiles(grid, np.zeros(grid.shape), 30.0)
+        for method in self.METHODS:
+            loss = ProfileDiffraction(profiles, 900, 1.5).cell_loss(method)
+            self.assertEqual(float(np.abs(loss).max()), 0.0, method)
+
+    def test_single_ridge_loss_is_the_knife_edge_loss(self):
+        # One radial sampled every 50 m, a 60 m ridge at 2 km, receiver at 4 km
+        distances = np.arange(1, 81) * 50.0
+        terrain = np.zeros((1, len(distances)), dtype=np.float32)
+        terrain[0, 39] = 60.0
+        profiles = SimpleNamespace(angles=np.zeros(1), distances=distances, terrain=terrain, site_height=30.0)
+        diffraction = ProfileDiffraction(profiles, 900, 1.5)
+
+        wavelength = 299792458.0 / 900e6
+        height = 60.0 - (30.0 + (1.5 - 30.0) * 2000 / 4000)
+        v = height * np.sqrt(2 * 4000 / (wavelength * 2000 * 2000))
+        for method in self.METHODS:
+            loss = diffraction.path_loss(np.array([0]), np.array([80]), method)
+            self.assertAlmostEqual(float(loss[0]), float(knife_edge_loss(v)), places=3, msg=method)
+            # Receiver in front of the ridge: clear path
+            self.assertEqual(float(diffraction.path_loss(np.array([0]), np.array([30]), method)[0]), 0.0)
+
+
+class GridEvaluationTests(SimpleTestCase):
+    """
+    ADAPTIVE and RADIAL evaluation of the grid rows against the exact GRID mode.
+    """
+
+    def setUp(self):
+        self.grid = LocalGrid(2.35, 46.5, 8, 0.05)
+        self.kernel = compile_hata(900, 30, 1.5, 'URBAN')
+        # An 80 m ridge 2 km north of the antenna, casting a shadow
+        heights = np.zeros(self.grid.shape)
+        heights[self.grid.origin[0] + 40:self.grid.origin[0] + 43] = 80.0
+        profiles = RadialProfiles(self.grid, heights, 30.0)
+        self.diffraction = ProfileDiffraction(profiles, 900, 1.5).cell_loss()
+
+    def evaluate(self, mode, antenna_power=60.0):
+        rows = slice(0, self.grid.shape[0])
+        return evaluate_grid_rows(self.kernel, self.grid, rows, antenna_power, 900, mode=mode,
+                                  diffraction=self.diffraction)
+
+    def test_adaptive_is_exact_along_the_coverage_boundary(self):
+        # The boundary lies in the shadow of the ridge: the refinement must see the diffraction loss
+        exact, _ = self.evaluate(EVALUATION_GRID)
+        signal, stats = self.evaluate(EVALUATION_ADAPTIVE)
+        covered = exact >= -100
+        defined = ~np.isnan(exact)
+        # Covered cells next to uncovered ones (away from the edge of the disc)
+        boundary = mask_edges(covered) & ~mask_edges(defined) & defined
+        self.assertTrue(boundary[self.diffraction > 0].any())
+        np.testing.assert_allclose(signal[boundary], exact[boundary], rtol=0, atol=1e-9)
+        np.testing.assert_array_equal(signal >= -100, covered)
+        self.assertLess(stats['model_evaluations'], stats['grid_cells'] / 4)
+
+    def test_radial_reports_the_profile_samples(self):
+        exact, _ = self.evaluate(EVALUATION_GRID)
+        signal, stats = self.evaluate(EVALUATION_RADIAL)
+        np.testing.assert_allclose(signal, exact, atol=1e-9)
+        # Profile every tenth of a cell out to the radius, plus the midpoints
+        self.assertGreater(stats['model_evaluations'], 2 * 8 / 0.005)
+        self.assertLess(stats['model_evaluations'], stats['grid_cells'] / 10)
+
+
+def rows_slowest_first(evaluate_rows, rows):
+    """Row evaluator finishing the first tiles last (module level, sent to the worker processes)."""
+    time.sleep(0.2 / (1 + rows.start))
+    return evaluate_rows(rows)
+
+
+class ParallelEvaluationTests(SimpleTestCase):
+    """
+    Tiles evaluated across worker processes against the serial evaluation.
+    """
+
+    def setUp(self):
+        grid = LocalGrid(2.35, 46.5, 8, 0.1)
+        self.rows = grid.shape[0]
+        self.evaluate_rows = partial(evaluate_grid_rows, compile_hata(900, 30, 1.5, 'URBAN'), grid,
+                                     antenna_power=43.0, frequency=900, fallback=FALLBACK_FREE_SPACE)
+
+    def assertSameTiles(self, tiles, expected):
+        self.assertEqual([tile for tile, _, _ in tiles], [tile for tile, _, _ in expected])
+        for (tile, signal, stats), (_, expected_signal, expected_stats) in zip(tiles, expected):
+            np.testing.assert_array_equal(signal, expected_signal, err_msg=str(tile))
+            self.assertEqual(stats, expected_stats)
+
+    def test_tiles_match_the_serial_evaluation(self):
+        # 161 rows: the last tile is shorter than the others
+        for workers, chunk_rows in ((2, 25), (3, 9), (3, 64)):
+            expected = list(evaluate_chunks(self.rows, chunk_rows, self.evaluate_rows))
+            tiles = list(evaluate_chunks_parallel(self.rows, chunk_rows, self.evaluate_rows, workers))
+            self.assertNotEqual(self.rows % chunk_rows, 0)
+            self.assertSameTiles(tiles, expected)
+
+    def test_tiles_are_yielded_in_row_order(self):
+        evaluate_rows = partial(rows_slowest_first, self.evaluate_rows)
+        tiles = list(evaluate_chunks_parallel(self.rows, 40, evaluate_rows, 2))
+        self.assertSameTiles(tiles, list(evaluate_chunks(self.rows, 40, self.evaluate_rows)))
+
+
+def inside_rings(rings, points):
+    """Even-odd rule: whether (n, 2) points lie inside the area bounded by rings."""
+    inside = np.zeros(len(points), dtype=bool)
+    x, y = points[:, 0], points[:, 1]
+    for ring in rings:
+        x0, y0 = ring[:, 0], ring[:, 1]
+        x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+        for a, b, c, d in zip(x0, y0, x1, y1):
+            crosses = (b > y) != (d > y)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                inside ^= crosses & (x < a + (y - b) * (c - a) / (d - b))
+    return inside
+
+
+class ContourTests(SimpleTestCase):
+    """
+    Coverage polygons traced from the cell masks.
+    """
+
+    def assertCoversMask(self, mask, polygons):
+        i, j = np.indices(mask.shape)
+        centres = np.stack([i.ravel() + 0.5, j.ravel() + 0.5], axis=1).astype(float)
+        covered = np.zeros(mask.size, dtype=bool)
+        for shell, holes in polygons:
+            covered |= inside_rings([shell, *holes], centres)
+        np.testing.assert_array_equal(covered.reshape(mask.shape), mask)
+        area = sum(ring_area(shell) + sum(ring_area(hole) for hole in holes) for shell, holes in polygons)
+        self.assertEqual(area, mask.sum())
+
+    def test_full_grid_is_one_rectangle(self):
+        mask = np.ones((5, 4), dtype=bool)
+        rings = trace_rings(mask)
+        self.assertEqual(len(rings), 1)
+        self.assertEqual({tuple(corner) for corner in rings[0]}, {(0, 0), (5, 0), (5, 4), (0, 4)})
+        self.assertEqual(ring_area(rings[0]), 20)
+
+    def test_hole(self):
+        mask = np.ones((6, 6), dtype=bool)
+        mask[2:4, 2:4] = False
+        polygons = mask_polygons(mask)
+        self.assertEqual(len(polygons), 1)
+        shell, holes = polygons[0]
+        self.assertEqual(ring_area(shell), 36)
+        self.assertEqual([ring_area(hole) for hole in holes], [-4])
+        self.assertCoversMask(mask, polygons)
+
+    def test_diagonal_cells_stay_separate(self):
+        mask = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1]], dtype=bool)
+        polygons = mask_polygons(mask)
+        self.assertEqual(len(polygons), 3)
+        self.assertEqual(sorted(ring_area(shell) for shell, _ in polygons), [1, 1, 1])
+        self.assertCoversMask(mask, polygons)
+
+    def test_islands_in_holes_along_the_grid_edge(self):
+        mask = np.zeros((9, 9), dtype=bool)
+        mask[:, :6] = True      # along three edges of the grid
+        mask[1:8, 1:5] = False  # hole
+        mask[4, 3] = True       # island inside the hole
+        mask[8, 8] = True       # corner cell
+        polygons = mask_polygons(mask)
+        self.assertEqual(len(polygons), 3)
+        self.assertCoversMask(mask, polygons)
+
+    def test_random_masks(self):
+        rng = np.random.default_rng(1)
+        for density in (0.3, 0.5, 0.7):
+            mask = rng.random((23, 17)) < density
+            self.assertCoversMask(mask, mask_polygons(mask))
+
+    def test_simplified_multipolygon_keeps_the_covered_area(self):
+        grid = LocalGrid(2.35, 48.85, 3, 0.05)
+        distances = grid.distances()
+        mask = (distances <= 2.0) & ~((distances > 0.8) & (distances <= 1.0))  # disc with a ring-shaped hole
+        to_local = local_to_wgs84(2.35, 48.85)
+        cell_area = (grid.cell_size * 1000) ** 2
+
+        def local_area(multipolygon):
+            area = 0.0
+            for polygon in multipolygon:
+                for k, ring in enumerate(polygon):
+                    x, y = to_local.transform(*np.array(ring.coords).T, direction='INVERSE')
+                    area += abs(ring_area(np.stack([x, y], axis=1)[:-1])) * (1 if k == 0 else -1)
+            return area
+
+        exact = coverage_multipolygon(mask, grid)
+        simplified = coverage_multipolygon(mask, grid, simplify=1.0)
+        self.assertEqual(len(exact), 2)
+        self.assertEqual(len(simplified), 2)
+        self.assertAlmostEqual(local_area(exact) / cell_area, mask.sum(), delta=0.01)
+        self.assertAlmostEqual(local_area(simplified) / mask.sum() / cell_area, 1.0, delta=0.02)
+        self.assertLess(simplified.num_coords, exact.num_coords / 2)
+
+
+class HttpRangeTests(SimpleTestCase):
+    """
+    Files served with single-range "Range: bytes=" requests.
+    """
+
+    def setUp(self):
+        self.content = bytes(range(256)) * 4
+        handle = tempfile.NamedTemporaryFile(delete=False)
+        handle.write(self.content)
+        handle.close()
+        self.path = handle.name
+        self.addCleanup(os.remove, self.path)
+
+    def get(self, header=None):
+        request = RequestFactory().get('/', **({'HTTP_RANGE': header} if header else {}))
+        response = ranged_file_response(request, self.path)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_whole_file_without_range(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(body, self.content)
+
+    def test_single_range(self):
+        response, body = self.get('bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(body, self.content[10:20])
+
+    def test_open_ended_range(self):
+        response, body = self.get('bytes=1000-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[1000:])
+        # An end past the file is cut to the last byte
+        response, body = self.get('bytes=1000-5000')
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1023/{len(self.content)}')
+        self.assertEqual(body, self.content[1000:])
+
+    def test_suffix_range(self):
+        response, body = self.get('bytes=-16')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[-16:])
+        # A suffix longer than the file returns the whole file
+        _, body = self.get('bytes=-5000')
+        self.assertEqual(body, self.content)
+
+    def test_unsatisfiable_range(self):
+        for header in ('bytes=1024-', 'bytes=20-10', 'bytes=-0'):
+            response, _ = self.get(header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_multiple_ranges_return_the_whole_file(self):
+        response, body = self.get('bytes=0-9,20-29')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+
+
+class ResultStoreTests(SimpleTestCase):
+    """
+    File-backed result layers.
+    """
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.store = ResultStore(root.name)
+        self.key = self.store.create(2.35, 48.85, -500.0, -500.0, 0.1, (11, 11))
+
+    def test_layers_round_trip(self):
+        self.store.create_layer(self.key, 'signal', fill=-90.0)
+        self.store.create_layer(self.key, 'signal_1', fill=None, shape=(6, 6))[:] = 1.0
+        self.assertEqual(self.store.layers(self.key), ['signal', 'signal_1'])
+        self.assertEqual(self.store.layer(self.key, 'signal').shape, (11, 11))
+        np.testing.assert_array_equal(self.store.window(self.key, 'signal_1', slice(2, 4)), np.ones((2, 6)))
+
+    def test_layer_names_with_path_separators_are_rejected(self):
+        for layer in ('../signal', 'a/b', 'a\\b', '/signal', 'signal.npy', '', 'Signal'):
+            with self.assertRaisesMessage(ValueError, "Invalid layer name"):
+                self.store.path(self.key, layer)
+            with self.assertRaises(ValueError):
+                self.store.create_layer(self.key, layer)
+
+    def test_invalid_keys_are_rejected(self):
+        for key in ('../' + self.key[3:], self.key.upper(), self.key + '/signal'):
+            with self.assertRaisesMessage(ValueError, "Invalid result key"):
+                self.store.path(key)
+
+
+class ResultCacheTests(TestCase):
+    """
+    Cache keys of the run inputs and results shared between simulations.
+    """
+
+    BASE = {
+        'technology': '4G',
+        'propagation_model': 'OKUMURA_HATA',
+        'frequency': 900,
+        'antenna_height': 40,
+        'antenna_power': 43,
+        'terrain_type': 'URBAN',
+        'longitude': 2.35,
+        'latitude': 46.5,
+        'radius': 5,
+        'population_density': 50,
+    }
+
+    def parameters(self, **changes):
+        simulation = Simulation.objects.create(name='cache')
+        return SimulationParameter.objects.create(simulation=simulation, **parameter_values({**self.BASE, **changes}))
+
+    def result(self, simulation, size=0):
+        return SimulationResult.objects.create(
+            simulation=simulation,
+            coverage_area=MultiPolygon(Polygon.from_bbox((2.3, 46.45, 2.4, 46.55))),
+            coverage_percentage=50.0,
+            signal_raster=b'\0' * size,
+        )
+
+    def test_identical_parameters_share_a_key(self):
+        first, second = self.parameters(), self.parameters()
+        self.assertNotEqual(first.simulation_id, second.simulation_id)
+        self.assertEqual(parameters_key(first), parameters_key(second))
+
+    def test_result_inputs_change_the_key(self):
+        key = parameters_key(self.parameters())
+        changes = {
+            'frequency': 1000, 'antenna_height': 30, 'antenna_power': 40, 'terrain_type': 'RURAL',
+            'longitude': 2.36, 'latitude': 46.6, 'radius': 6, 'population_density': 60, 'technology': '3G',
+            'grid_size': 0.05, 'evaluation_mode': 'ADAPTIVE', 'validity_fallback': 'CLAMP',
+        }
+        keys = {name: parameters_key(self.parameters(**{name: value})) for name, value in changes.items()}
+        for name, changed in keys.items():
+            self.assertNotEqual(changed, key, name)
+        self.assertEqual(len(set(keys.values())), len(changes))
+
+    def test_bandwidth_does_not_change_the_key(self):
+        params = self.parameters()
+        key = parameters_key(params)
+        params.bandwidth = 20.0
+        self.assertEqual(parameters_key(params), key)
+
+    def test_deleting_the_leader_keeps_the_followers_results(self):
+        leader, follower = self.parameters(), self.parameters()
+        result = self.result(leader.simulation)
+        for params in (leader, follower):
+            SimulationJob.objects.create(simulation=params.simulation, parameters=params, state='SUCCEEDED',
+                                         result=result, cache_key=parameters_key(params))
+
+        leader.simulation.delete()
+        result.refresh_from_db()
+        self.assertEqual(result.simulation_id, follower.simulation_id)
+        self.assertEqual(list(follower.simulation.all_results()), [result])
+
+        # Deleting the last simulation using the result deletes it
+        follower.simulation.delete()
+        self.assertFalse(SimulationResult.objects.filter(pk=result.pk).exists())
+
+    def test_eviction_removes_the_index_entries_only(self):
+        results = []
+        for k in range(3):
+            params = self.parameters(frequency=800 + k)
+            result = self.result(params.simulation, size=1000)
+            CachedResult.objects.create(key=parameters_key(params), result=result, summary={}, size=1000)
+            results.append(result)
+            time.sleep(0.01)
+
+        self.assertEqual(evict(max_bytes=2000), 1)
+        # Least recently used first
+        self.assertEqual(sorted(CachedResult.objects.values_list('result_id', flat=True)),
+                         sorted(result.pk for result in results[1:]))
+        self.assertEqual(SimulationResult.objects.filter(pk__in=[result.pk for result in results]).count(), 3)
+
+
+class ElevationModelTests(SimpleTestCase):
+    """
+    Elevation tiles, bilinear interpolation and tile cache.
+    """
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        # 5 x 5 samples every 0.25 degree, first row at 46N and first column at 2E
+        rows, cols = np.mgrid[0:5, 0:5]
+        self.samples = (100 * rows + 10 * cols).astype('>i2')
+
+    def write_hgt(self, samples, name='N45E002.hgt'):
+        samples.astype('>i2').tofile(os.path.join(self.root, name))
+        return ElevationModel(self.root, TileCache(1024 * 1024))
+
+    def expected(self, lons, lats):
+        return 100 * (46 - lats) / 0.25 + 10 * (lons - 2) / 0.25
+
+    def test_heights_are_interpolated_bilinearly(self):
+        dem = self.write_hgt(self.samples)
+        rng = np.random.default_rng(3)
+        lons, lats = rng.uniform(2, 3, 200), rng.uniform(45, 46, 200)
+        np.testing.assert_allclose(dem.heights(lons, lats), self.expected(lons, lats), atol=1e-6)
+        # Samples and tile corners
+        np.testing.assert_allclose(dem.heights([2.0, 3.0, 2.5], [46.0, 45.0, 45.25]), [0, 440, 320])
+
+    def test_points_outside_the_tiles_are_nan(self):
+        dem = self.write_hgt(self.samples)
+        heights = dem.heights([1.9, 3.1, 2.5, np.nan], [45.5, 45.5, 46.2, 45.5])
+        self.assertTrue(np.isnan(heights).all())
+
+    def test_void_samples_are_left_out(self):
+        samples = self.samples.copy()
+        samples[2, 2] = HGT_VOID
+        dem = self.write_hgt(samples)
+        # Half way between the void sample and its eastern neighbour
+        self.assertAlmostEqual(float(dem.heights(2.625, 45.5)), 230.0)
+        # On the void sample: mean of the valid samples of its cell
+        self.assertAlmostEqual(float(dem.heights(2.5, 45.5)), (230 + 320 + 330) / 3, places=4)
+        # Away from the void sample
+        self.assertAlmostEqual(float(dem.heights(2.125, 45.875)), self.expected(2.125, 45.875))
+
+    def test_geotiff_tiles(self):
+        from django.contrib.gis.gdal import GDALRaster
+
+        values = np.arange(12, dtype=np.float32).reshape(3, 4) * 10
+        values[1, 1] = -9999
+        GDALRaster({
+            'name': os.path.join(self.root, 'dem.tif'), 'driver': 'GTiff', 'srid': 4326,
+            'width': 4, 'height': 3, 'origin': [2.0, 46.0], 'scale': [0.5, -0.5], 'datatype': 6,
+            'bands': [{'data': values.ravel().tolist(), 'nodata_value': -9999}],
+        })
+        dem = ElevationModel(self.root, TileCache(1024 * 1024))
+
+        # Pixel centres at 2.25 + 0.5 col, 45.75 - 0.5 row
+        np.testing.assert_allclose(dem.heights([2.25, 3.75, 3.25], [45.75, 44.75, 45.0]), [0, 110, 80])
+        self.assertAlmostEqual(float(dem.heights(2.75, 45.25)), (60 + 90 + 100) / 3, places=4)
+        self.assertTrue(np.isnan(dem.heights(2.1, 45.5)))
+
+    def test_tiles_are_read_once(self):
+        dem = self.write_hgt(self.samples)
+        dem.heights([2.5, 2.6], [45.5, 45.6])
+        dem.heights(2.7, 45.7)
+        self.assertEqual(dem.cache.stats()['misses'], 1)
+        self.assertEqual(dem.cache.stats()['hits'], 1)
+
+    def test_least_recently_used_tiles_are_evicted(self):
+        tiles = {name: np.zeros(100, dtype=np.float64) for name in 'abcd'}
+        cache = TileCache(2 * 800)
+        for name in ('a', 'b', 'a', 'c'):
+            cache.get(name, lambda name=name: tiles[name].copy())
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats()['bytes'], 1600)
+
+        loads = []
+        for name in ('a', 'c', 'b'):
+            cache.get(name, lambda name=name: loads.append(name) or tiles[name].copy())
+        # b was evicted by c, then a by b
+        self.assertEqual(loads, ['b'])
+        cache.get('a', lambda: loads.append('a') or tiles['a'].copy())
+        self.assertEqual(loads, ['b', 'a'])
+
+        # Tiles larger than the whole cache are not kept
+        cache.get('d', lambda: np.zeros(300))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+
+class PopulationRasterTests(SimpleTestCase):
+    """
+    Population of the simulation cells from a population raster.
+    """
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        self.grid = LocalGrid(2.35, 46.5, 5, 0.1)
+
+    def write_raster(self, values, pixel, nodata=-1):
+        """WGS84 raster of the given pixel size in degrees, centred on the antenna."""
+        rows, cols = values.shape
+        path = os.path.join(self.root, 'population.npy')
+        np.save(path, values)
+        with open(os.path.join(self.root, 'population.json'), 'w') as f:
+            json.dump({
+                'crs': 'EPSG:4326',
+                'geotransform': [2.35 - cols * pixel / 2, pixel, 0, 46.5 + rows * pixel / 2, 0, -pixel],
+                'nodata': nodata,
+            }, f)
+        return NpyPopulationRaster(path)
+
+    def test_population_is_conserved_for_small_pixels(self):
+        values = np.random.default_rng(11).uniform(0, 20, (100, 100)).astype(np.float32)
+        values[::7, ::5] = -1
+        raster = self.write_raster(values, 0.0002)
+        total = float(values[values >= 0].sum())
+
+        population = raster.cell_population(self.grid)
+        self.assertAlmostEqual(float(population.sum()), total, delta=total * 1e-6)
+        # Read a block of rows at a time
+        blocks = sum(float(raster.cell_population(self.grid, slice(start, start + 16)).sum())
+                     for start in range(0, self.grid.shape[0], 16))
+        self.assertAlmostEqual(blocks, total, delta=total * 1e-6)
+
+    def test_density_is_sampled_for_large_pixels(self):
+        values = np.full((8, 8), 1000, dtype=np.float32)
+        values[0, 0] = -1
+        raster = self.write_raster(values, 0.005)
+        total = float(values[values >= 0].sum())
+        # Cells along the edge of the raster are counted whole or not at all
+        self.assertAlmostEqual(float(raster.cell_population(self.grid).sum()), total, delta=total * 0.05)
+
+
+@override_settings(SIMULATION_CLUTTER_CLASSES={10: 'SUBURBAN', 50: 'URBAN', 80: 'OPEN'})
+class ClutterRasterTests(SimpleTestCase):
+    """
+    Area types of the simulation cells from a land-cover raster.
+    """
+
+    URBAN, SUBURBAN, RURAL, OPEN = (AREA_TYPES.index(name) for name in ('URBAN', 'SUBURBAN', 'RURAL', 'OPEN'))
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        self.grid = LocalGrid(2.35, 46.5, 5, 0.5)
+
+    def write_raster(self, values, pixel):
+        """Raster of the given pixel size in m in the grid frame, centred on the antenna."""
+        rows, cols = values.shape
+        path = os.path.join(self.root, 'clutter.npy')
+        np.save(path, values)
+        with open(os.path.join(self.root, 'clutter.json'), 'w') as f:
+            json.dump({
+                'crs': self.grid.crs.to_wkt(),
+                'geotransform': [-cols * pixel / 2, pixel, 0, rows * pixel / 2, 0, -pixel],
+                'nodata': 10,
+            }, f)
+        return NpyClutterRaster(path)
+
+    def cell(self, x, y):
+        """Index of the cell centred at (x, y) m."""
+        return self.grid.origin[0] + round(x / 500), self.grid.origin[1] + round(y / 500)
+
+    def test_cell_centres_read_large_pixels(self):
+        # 1500 m pixels: north-west urban, north-east open, south-west unmapped, south-east nodata
+        raster = self.write_raster(np.array([[50, 50, 80], [50, 42, 80], [42, 42, 10]], dtype=np.int16), 1500)
+        classes = raster.cell_classes(self.grid, default=self.RURAL)
+
+        self.assertEqual(classes[self.cell(-1000, 1000)], self.URBAN)
+        self.assertEqual(classes[self.cell(1000, 1000)], self.OPEN)
+        self.assertEqual(classes[self.cell(0, 0)], self.RURAL)
+        # Nodata pixel, although 10 is a mapped code
+        self.assertEqual(classes[self.cell(1000, -1000)], self.RURAL)
+        # Outside of the raster
+        self.assertEqual(classes[self.cell(4000, 0)], self.RURAL)
+        self.assertEqual(int(raster.cell_classes(self.grid)[self.cell(0, 0)]), 255)
+
+    def test_cells_take_the_majority_of_small_pixels(self):
+        # 50 m pixels, 10 x 10 per cell, over the 5 x 5 cells around the antenna
+        values = np.full((50, 50), 42, dtype=np.int16)
+        values[:10, :10] = 50
+        values[:10, :3] = 80
+        values[10:20, :10] = 80
+        values[10:20, :4] = 50
+        values[20:30, 20:30] = 10
+        values[30:40, 30:40] = 42
+        values[30:40, 30:34] = 50
+        raster = self.write_raster(values, 50)
+        classes = raster.cell_classes(self.grid, default=self.RURAL)
+
+        self.assertEqual(classes[self.cell(-1000, 1000)], self.URBAN)
+        self.assertEqual(classes[self.cell(-1000, 500)], self.OPEN)
+        self.assertEqual(classes[self.cell(0, 0)], self.RURAL)
+        # Unmapped pixels do not vote
+        self.assertEqual(classes[self.cell(500, -500)], self.URBAN)
+        self.assertEqual(classes[self.cell(4000, 0)], self.RURAL)
+        # Row blocks
+        blocks = np.concatenate([raster.cell_classes(self.grid, slice(start, start + 4), default=self.RURAL)
+                                 for start in range(0, self.grid.shape[0], 4)])
+        np.testing.assert_array_equal(blocks, classes)
+
+
+class FakeJobEvents:
+    """In-memory stand-in for live.job_events: events and state of one job."""
+
+    def __init__(self, count=0):
+        self.events = []
+        self.ended = False
+        self.calls = 0
+        for _ in range(count):
+            self.add()
+
+    def add(self):
+        event_id = len(self.events) + 1
+        self.events.append({'id': event_id, 'kind': 'progress', 'data': {'step': event_id}})
+
+    async def __call__(self, job_id, after=0):
+        self.calls += 1
+        return self.ended, [event for event in self.events if event['id'] > after]
+
+
+class LiveEventTests(SimpleTestCase):
+    """
+    Server-Sent Events of the jobs: backlog replay, live events and end of the stream.
+    """
+
+    def setUp(self):
+        self.job = FakeJobEvents(3)
+        for target, value in (('job_events', self.job), ('POLL_INTERVAL', 0.01)):
+            patcher = mock.patch(f'simulation.live.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    async def end_event():
+        return {'state': 'SUCCEEDED'}
+
+    @staticmethod
+    def event_ids(messages):
+        return [int(line[4:]) for message in messages for line in message.split('\n') if line.startswith('id: ')]
+
+    async def test_stream_replays_the_backlog_then_the_live_events(self):
+        messages = []
+        stream = event_stream('job', 1, self.end_event)
+        async for message in stream:
+            messages.append(message)
+            if len(messages) == 2:
+                # The feed of the hub also polls events 1 to 3: they must not be sent again
+                await asyncio.sleep(0.05)
+                self.job.add()
+                self.job.add()
+            elif len(messages) == 4:
+                self.job.ended = True
+
+        self.assertEqual(self.event_ids(messages), [2, 3, 4, 5])
+        self.assertTrue(messages[-1].startswith('event: end\n'))
+        self.assertIn('"SUCCEEDED"', messages[-1])
+
+    async def test_stream_of_an_ended_job_ends_after_the_backlog(self):
+        self.job.ended = True
+        messages = [message async for message in event_stream('job', 0, self.end_event)]
+        self.assertEqual(self.event_ids(messages), [1, 2, 3])
+        self.assertTrue(messages[-1].startswith('event: end\n'))
+
+    async def test_listeners_share_one_feed(self):
+        hub = JobEventHub()
+        first, second = hub.subscribe('job'), hub.subscribe('job')
+        self.assertEqual(len(hub._feeds), 1)
+        for listener in (first, second):
+            self.assertEqual([(await listener.get())['id'] for _ in range(3)], [1, 2, 3])
+
+        self.job.ended = True
+        self.assertIsNone(await asyncio.wait_for(first.get(), 1))
+        self.assertIsNone(await asyncio.wait_for(second.get(), 1))
+        self.assertEqual(hub._feeds, {})
+
+    async def test_feed_stops_when_its_listeners_leave(self):
+        hub = JobEventHub()
+        listener = hub.subscribe('job')
+        hub.unsubscribe('job', listener)
+        await asyncio.sleep(0.05)
+        self.assertEqual(hub._feeds, {})
+        self.assertLessEqual(self.job.calls, 1)
+
+    async def test_batch_returns_the_events_after_an_id(self):
+        batch = await event_batch('job', 2, self.end_event)
+        self.assertTrue(batch.startswith('retry: '))
+        self.assertEqual(self.event_ids([batch]), [3])
+        self.assertNotIn('event: end', batch)
+
+        self.job.ended = True
+        batch = await event_batch('job', 3, self.end_event)
+        self.assertEqual(self.event_ids([batch]), [])
+        self.assertIn('event: end', batch)
+
+
+class JobEventsTests(TestCase):
+    """
+    Events of the jobs read from the database.
+    """
+
+    def setUp(self):
+        simulation = Simulation.objects.create(name='events')
+        parameters = SimulationParameter.objects.create(simulation=simulation, **parameter_values(ResultCacheTests.BASE))
+        self.leader = SimulationJob.objects.create(simulation=simulation, parameters=parameters, state='RUNNING')
+        self.follower = SimulationJob.objects.create(simulation=simulation, parameters=parameters, state='RUNNING',
+                                                     leader=self.leader)
+        self.events = [JobEvent.objects.create(job=self.leader, kind='progress', data={'step': k}) for k in range(3)]
+
+    async def test_events_after_an_id(self):
+        ended, events = await job_events(self.leader.pk, self.events[0].pk)
+        self.assertFalse(ended)
+        self.assertEqual([event['id'] for event in events], [event.pk for event in self.events[1:]])
+
+    async def test_followers_read_the_events_of_their_leader(self):
+        _, events = await job_events(self.follower.pk)
+        self.assertEqual(len(events), 3)
+
+    async def test_ended_and_missing_jobs(self):
+        await SimulationJob.objects.filter(pk=self.leader.pk).aupdate(state='SUCCEEDED')
+        ended, _ = await job_events(self.leader.pk)
+        self.assertTrue(ended)
+        self.assertEqual(await job_events(uuid.uuid4()), (True, []))
@@ -0,0 +1,77 @@
+"""
+Size-bounded LRU cache of decoded raster tiles.
+
+A cache lives for the whole worker process, so the tiles read by one
+simulation (population, elevation, land cover...) are reused by the next
+ones instead of being read from disk again. The cache is bounded by the
+total size of the cached arrays; the least recently used tiles are evicted
+first.
+"""
+import threading
+from collections import OrderedDict
+
+
+class TileCache:
+    """
+    LRU cache of numpy arrays bounded by their total size in bytes.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def get(self, key, load):
+        """
+        Tile stored under key, loaded with load() on a miss.
+
+        Parameters:
+        - key: Hashable tile key (include the file identity, e.g. path and
+          modification time, so that replaced files are read again)
+        - load: Callable returning the tile as a numpy array
+
+        Returns:
+        - The cached array (shared between callers: do not modify it)
+        """
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return tile
+            self.misses += 1
+
+        # Loaded outside of the lock: other tiles stay available meanwhile
+        tile = load()
+        tile.flags.writeable = False
+
+        with self._lock:
+            if key not in self._tiles:
+                self._tiles[key] = tile
+                self.nbytes += tile.nbytes
+            # Tiles larger than the whole cache are returned but not kept
+            while self.nbytes > self.max_bytes and self._tiles:
+                _, evicted = self._tiles.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return tile
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Hit/miss counters and size of the cache."""
+        return {
+            'tiles': len(self._tiles),
+            'bytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
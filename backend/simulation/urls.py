@@ -3,5 +3,14 @@ from . import views
 
 urlpatterns = [
     path('run/', views.run_simulation, name='run_simulation'),
+    path('sweep/', views.sweep_simulation, name='sweep_simulation'),
     path('export/<int:simulation_id>/', views.export_simulation_pdf, name='export_simulation_pdf'),
+    path('coverage/<int:simulation_id>/', views.coverage_level, name='coverage_level'),
+    path('raster/<int:simulation_id>/<str:layer>.npy', views.raster_layer, name='raster_layer'),
+    path('population/', views.population_rasters, name='population_rasters'),
+    path('clutter/', views.clutter_rasters, name='clutter_rasters'),
+    path('cache/', views.result_cache, name='result_cache'),
+    path('jobs/<uuid:job_id>/', views.job_status, name='job_status'),
+    path('jobs/<uuid:job_id>/result/', views.job_result, name='job_result'),
+    path('jobs/<uuid:job_id>/events/', views.job_events, name='job_events'),
 ]
\ No newline at end of file
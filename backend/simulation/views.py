@@ -1,21 +1,44 @@
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.urls import reverse
+from django.conf import settings
+from django.db import transaction
 from rest_framework.decorators import api_view, permission_classes
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.permissions import IsAuthenticated,AllowAny
 from rest_framework.response import Response
 from rest_framework import status
+from asgiref.sync import sync_to_async
+import hashlib
 import json
+from contextlib import closing
+from functools import partial
+from types import SimpleNamespace
 import folium
 import numpy as np
-from django.contrib.gis.geos import Point, MultiPolygon, Polygon
-from .models import Simulation, SimulationParameter, SimulationResult
-from .propagation.okumura_hata import calculate_path_loss as okumura_hata_path_loss
-from .propagation.cost_231 import calculate_path_loss as cost_231_path_loss
-from .propagation_models_5g import (
-    ThreeGPP_TR_38901 as FiveGPropagationModel,
-    MillimeterWavePropagation
-)
+from django.contrib.gis.geos import Point
+from .models import Simulation, SimulationParameter, SimulationResult, SignalBand, SimulationJob
+from .engine import evaluate_grid_rows, ADAPTIVE_COARSE_STEP
+from .grid import LocalGrid, grid_cell_count
+from .pyramid import build_pyramid, select_level, level_layer, level_to_json, level_from_json
+from .raster import CompactRaster, RasterEncoder, raster_to_json, legacy_points_requested
+from .store import get_result_store
+from .jobs import enqueue_simulation, enqueue_sweep
+from .sweep import run_sweep, sweep_combinations, RESULT_COLUMNS
+from .resultcache import cache_stats
+from .singleflight import coalesce
+from .live import event_batch, event_stream
+from .streaming import CoverageAggregator, evaluate_chunks, evaluate_chunks_parallel, iter_row_chunks
+from .contour import coverage_multipolygon
+from .bands import signal_bands, classify_bands
+from .population import open_population_raster, list_population_rasters
+from .clutter import open_clutter_raster, list_clutter_rasters, clutter_warning
+from .dem import get_elevation_model
+from .terrain import RadialProfiles, line_of_sight
+from .diffraction import ProfileDiffraction, DIFFRACTION_NONE, line_of_sight_only
+from .propagation.kernels import compile_model
+from .propagation.okumura_hata import AREA_TYPES
 
 def get_available_5g_models():
     """Retourne la liste des modèles 5G disponibles"""
@@ -57,6 +80,7 @@ def get_5g_model_parameters(model_id):
         }
     return None
 from utils.export import generate_pdf_report
+from utils.http_range import ranged_file_response
 
 @csrf_exempt
 @api_view(['POST'])
@@ -84,160 +108,539 @@ def run_simulation(request):
         #data = json.loads(request.body)
         
         # Create simulation parameters
-        location = Point(
-            float(data['longitude']),
-            float(data['latitude']),
-            srid=4326
-        )
-        
-        params = SimulationParameter.objects.create(
-            simulation=simulation,
-            technology=data['technology'],
-            propagation_model=data['propagation_model'],
-            frequency=float(data['frequency']),
-            antenna_height=float(data['antenna_height']),
-            antenna_power=float(data['antenna_power']),
-            terrain_type=data['terrain_type'],
-            location=location,
-            radius=float(data['radius']),
-            population_density=float(data.get('population_density', 0))
-        )
+        values = parameter_values(data)
+        check_grid_budget(values['radius'], values['grid_size'])
+        params = SimulationParameter.objects.create(simulation=simulation, **values)
         
-        # Run the simulation
-        result = run_propagation_model(params)
+        # Queue the run: the propagation is computed by a job worker, the
+        # client follows the job at its status URL (runs found in the result
+        # cache are returned as succeeded jobs)
+        job = enqueue_simulation(params)
         
-        return Response({
-            'simulation_id': simulation.id,
-            'result': result
-        }, status=status.HTTP_201_CREATED)
+        return Response(job_to_json(job, request), status=job_status_code(job),
+                        headers={'Location': job_url(request, 'job_status', job.id)})
         
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-def run_propagation_model(params):
+def parameter_values(data):
     """
-    Run the selected propagation model and generate coverage data.
+    SimulationParameter field values of a run request.
+    """
+    return {
+        'technology': data['technology'],
+        'propagation_model': data['propagation_model'],
+        'frequency': float(data['frequency']),
+        'antenna_height': float(data['antenna_height']),
+        'antenna_power': float(data['antenna_power']),
+        'terrain_type': data['terrain_type'],
+        'location': Point(float(data['longitude']), float(data['latitude']), srid=4326),
+        'radius': float(data['radius']),
+        'population_density': float(data.get('population_density', 0)),
+        'population_raster': data.get('population_raster') or None,
+        'clutter_raster': data.get('clutter_raster') or None,
+        'validity_fallback': data.get('validity_fallback', 'SKIP'),
+        'evaluation_mode': data.get('evaluation_mode', 'GRID'),
+        'grid_size': float(data.get('grid_size', 0.1)),
+        'use_terrain': bool(data.get('use_terrain', False)),
+        'diffraction_method': data.get('diffraction_method', 'DEYGOUT'),
+    }
+
+@csrf_exempt
+@api_view(['POST'])
+#@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
+def sweep_simulation(request):
+    """
+    Queue a parameter sweep: the coverage of every combination of a few
+    parameter axes around a base run request, computed by a job on one
+    shared geometry (the table is the result of the job).
+    
+    Body: a run request, plus
+    - axes: {parameter: [values]} (parameters of SWEEP_AXES)
+    - keep_rasters: true to also queue full runs of every combination, or
+      the list of the rows (indexes) to queue
     """
-    # Choose the appropriate propagation model
-    if params.propagation_model == '3GPP_TR_38901':
-        # Récupérer les paramètres 5G spécifiques
-        network_5g_params = getattr(params, 'network5gparams', {}) or {}
+    if isinstance(request.data, str):
+        data = json.loads(request.data)
+    else:
+        data = request.data
+    
+    try:
+        values = {
+            **parameter_values(data),
+            'scenario': data.get('scenario') or None,
+            'los_condition': data.get('los_condition') or None,
+            **{name: float(data[name]) if data.get(name) is not None else None for name in ('h_bs', 'h_ut', 'h', 'w')},
+        }
+        axes = data.get('axes') or {}
+        if not isinstance(axes, dict) or not axes:
+            raise ValueError("Le balayage demande au moins un axe (axes: {paramètre: [valeurs]})")
         
-        # Créer une instance du modèle 5G approprié
-        scenario = network_5g_params.get('scenario', 'UMa')
-        los_condition = network_5g_params.get('los_condition', 'LOS')
+        # Everything is validated before anything is recorded: server-side
+        # budgets (combinations, cells of the shared grid), axes, kept rows
+        combination_count = int(np.prod([len(v) if isinstance(v, (list, tuple)) else 1 for v in axes.values()]))
+        if combination_count > settings.SIMULATION_MAX_SWEEP_COMBINATIONS:
+            raise ValueError(
+                f"Le balayage demandé compte {combination_count} combinaisons (maximum "
+                f"{settings.SIMULATION_MAX_SWEEP_COMBINATIONS})"
+            )
+        check_grid_budget(values['radius'], values['grid_size'])
+        combinations = sweep_combinations(axes)
         
-        # Fonction de calcul de l'affaiblissement de parcours
-        def path_loss_func(distance, **kwargs):
-            # Convertir la distance en mètres (car le modèle attend des mètres)
-            distance_m = distance * 1000
-            
-            # Calculer la perte de propagation avec les paramètres 5G
-            return FiveGPropagationModel.path_loss(
-                frequency=params.frequency * 1e6,  # Convertir en Hz
-                distance=distance_m,
-                scenario=scenario,
-                los_condition=los_condition,
-                h_bs=float(network_5g_params.get('h_bs', 10.0)),
-                h_ut=float(network_5g_params.get('h_ut', 1.5)),
-                h=float(network_5g_params.get('h', 20.0)),
-                w=float(network_5g_params.get('w', 20.0))
+        keep = data.get('keep_rasters') or []
+        if keep is True:
+            keep = list(range(len(combinations)))
+        if not isinstance(keep, list) or not all(
+            isinstance(index, int) and not isinstance(index, bool) and 0 <= index < len(combinations)
+            for index in keep
+        ):
+            raise ValueError(
+                f"keep_rasters doit valoir true ou lister des combinaisons (0 à {len(combinations) - 1})"
             )
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    def new_parameters(parameters):
+        simulation = Simulation.objects.create(
+            name=data.get('name', 'New Simulation'),
+            description=data.get('description', ''),
+        )
+        return SimulationParameter.objects.create(simulation=simulation, **parameters)
+    
+    with transaction.atomic():
+        job = enqueue_sweep(new_parameters(values), axes)
+        # Full rasters only for the chosen combinations, as regular runs
+        runs = {
+            str(index): job_to_json(enqueue_simulation(new_parameters({**values, **combinations[index]})), request)
+            for index in sorted(set(keep))
+        }
+    
+    return Response({**job_to_json(job, request), 'combinations': len(combinations), 'runs': runs},
+                    status=status.HTTP_202_ACCEPTED,
+                    headers={'Location': job_url(request, 'job_status', job.id)})
+
+def check_grid_budget(radius, grid_size):
+    """
+    Reject a grid over settings.SIMULATION_MAX_GRID_CELLS (or with a cell
+    size that is not positive), from its estimated size.
+    """
+    if not grid_size > 0:
+        raise ValueError("grid_size doit être strictement positif")
+    cells = grid_cell_count(radius, grid_size)
+    if cells > settings.SIMULATION_MAX_GRID_CELLS:
+        raise ValueError(
+            f"La grille demandée compte {cells} cellules (maximum "
+            f"{settings.SIMULATION_MAX_GRID_CELLS}): augmentez grid_size ou réduisez le rayon"
+        )
+
+def run_sweep_model(params, axes, progress=None):
+    """
+    Run a parameter sweep around a SimulationParameter (see simulation.sweep).
+    
+    Parameters:
+    - params: Base SimulationParameter
+    - axes: {parameter: [values]}
+    - progress: Callable (fraction, stage) called as the sweep advances, or None
+    
+    Returns:
+    - Table of the sweep: columns (the axes, then RESULT_COLUMNS), one row
+      per combination, and the geometry of the shared grid
+    """
+    check_grid_budget(params.radius, params.grid_size)
+    grid = LocalGrid(params.location.x, params.location.y, params.radius, params.grid_size)
+    base = SimpleNamespace(**{field.attname: getattr(params, field.attname) for field in params._meta.concrete_fields})
+    combinations, rows, geometry = run_sweep(base, axes, settings.SIMULATION_CHUNK_ROWS, grid=grid, progress=progress)
+    
+    names = list(axes)
+    # Clutter raster given with models that do not use it
+    warnings = []
+    if params.clutter_raster:
+        models = dict.fromkeys(combination.get('propagation_model', params.propagation_model)
+                               for combination in combinations)
+        warnings = [warning for warning in map(clutter_warning, models) if warning]
+    return {
+        'columns': names + list(RESULT_COLUMNS),
+        'rows': [[combination[name] for name in names] + list(row) for combination, row in zip(combinations, rows)],
+        'combinations': len(combinations),
+        'warnings': warnings,
+        'grid': {
+            'shape': list(grid.shape),
+            'cell_size': grid.cell_size,
+            'cells': int(geometry.cells.sum()),
+        },
+    }
+
+def run_propagation_model(params, progress=None, on_chunk=None):
+    """
+    Run the selected propagation model and generate coverage data.
+    
+    Parameters:
+    - params: SimulationParameter
+    - progress: Callable (fraction, stage) called as the run advances (e.g.
+      by a queued job), or None
+    - on_chunk: Callable (grid, rows, signal, aggregator) called after every
+      block of rows (live statistics and preview), or None
+    """
+    report = progress or (lambda fraction, stage: None)
+    
+    # Compile the selected propagation model once: every parameter-only term
+    # (frequency, heights, area corrections, breakpoint...) is folded into
+    # the kernel constants and the kernel is then evaluated on the whole grid
+    try:
+        kernel = compile_model(params)
+    except ValueError:
+        kernel = None
+    
+    # Server-side cell budget, checked before any grid array is allocated
+    check_grid_budget(params.radius, params.grid_size)
+    
+    # Generate grid points within the radius, in a local metric frame
+    # centred on the antenna (fixed cell size in metres at any latitude)
+    grid = LocalGrid(params.location.x, params.location.y, params.radius, params.grid_size)
+    chunk_rows = settings.SIMULATION_CHUNK_ROWS
+    
+    # File-backed result store (memory-mapped .npy layers); the per-cell
+    # terrain and land cover inputs are written to it a block of rows at a
+    # time and read back by the evaluation one block at a time
+    store = get_result_store()
+    raster_key = store.create(params.location.x, params.location.y, grid.x[0], grid.y[0], grid.cell_size, grid.shape)
+    
+    try:
+        # Terrain: line-of-sight clearance of every cell from one radial sweep
+        # over the elevation model (no per-cell profile)
+        kernel_classes = None
+        class_kernels = None
+        diffraction = None
+        los_cells = None
+        if params.use_terrain:
+            report(0.0, 'terrain')
+            is_tr38901 = params.propagation_model == '3GPP_TR_38901'
+            antenna_height = (params.h_bs or 10.0) if is_tr38901 else params.antenna_height
+            mobile_height = (params.h_ut or 1.5) if is_tr38901 else 1.5
+            profiles = RadialProfiles(grid, get_elevation_model().grid_heights(grid), antenna_height)
+            clearance_layer = store.create_layer(raster_key, 'clearance', fill=None)
             
-    elif params.propagation_model == 'OKUMURA_HATA':
-        path_loss_func = okumura_hata_path_loss
-    else:  # COST_231
-        path_loss_func = cost_231_path_loss
-    
-    # Generate grid points within the radius
-    center_lon, center_lat = params.location.x, params.location.y
-    grid_size = 0.1  # km
-    radius_km = params.radius
-    
-    # Create a grid of points
-    x = np.linspace(center_lon - radius_km/111, center_lon + radius_km/111, int(2*radius_km/grid_size))
-    y = np.linspace(center_lat - radius_km/111, center_lat + radius_km/111, int(2*radius_km/grid_size))
-    
-    # Calculate signal strength at each point
-    signal_strength = {}
-    coverage_polygons = []
-    
-    for lon in x:
-        for lat in y:
-            # Calculate distance from center in km
-            distance = ((lon - center_lon)**2 + (lat - center_lat)**2)**0.5 * 111  # Approximate km
+            # TR 38.901: per-cell LOS/NLOS instead of the single los_condition
+            # (which is kept for the cells without terrain data)
+            los_layer = None
+            if is_tr38901 and kernel is not None:
+                los_layer = store.create_layer(raster_key, 'line_of_sight', dtype=np.uint8, fill=None)  # 0: NLOS, 1: LOS
+                class_kernels = [compile_model(params, los_condition='NLOS'), compile_model(params, los_condition='LOS')]
             
-            if distance <= radius_km:
-                try:
-                    # Calculate path loss
-                    if params.propagation_model == '3GPP_TR_38901':
-                        path_loss = path_loss_func(distance)
-                    else:
-                        path_loss = path_loss_func(
-                            params.frequency,
-                            params.antenna_height,
-                            1.5,  # Default mobile height
-                            distance,
-                            params.terrain_type
-                        )
-                    
-                    # Calculate received signal strength
-                    signal = params.antenna_power - path_loss
-                    
-                    # Store signal strength
-                    key = f"{lon:.6f},{lat:.6f}"
-                    signal_strength[key] = signal
-                    
-                    # If signal is above threshold, add to coverage
-                    if signal >= -100:  # -100 dBm threshold
-                        # Create a small square around this point
-                        square = Polygon.from_bbox((
-                            lon - grid_size/222,
-                            lat - grid_size/222,
-                            lon + grid_size/222,
-                            lat + grid_size/222
-                        ))
-                        coverage_polygons.append(square)
-                        
-                except ValueError:
-                    # Skip points that are out of the valid range for the model
-                    pass
-    
-    # Create coverage multipolygon
-    if coverage_polygons:
-        coverage_area = MultiPolygon(coverage_polygons)
-    else:
-        # Create an empty multipolygon if no coverage
-        coverage_area = MultiPolygon([])
-    
-    # Calculate coverage percentage
-    if params.radius > 0:
-        total_area = np.pi * (params.radius ** 2)
-        covered_area = sum(p.area * (111**2) for p in coverage_polygons)
-        coverage_percentage = (covered_area / total_area) * 100
+            # Knife-edge diffraction over the obstacles of the same profiles (not
+            # on the TR 38.901 NLOS cells, whose law already includes the obstruction)
+            profile_diffraction = None
+            if params.diffraction_method != DIFFRACTION_NONE and kernel is not None:
+                profile_diffraction = ProfileDiffraction(profiles, params.frequency, mobile_height)
+                diffraction_layer = store.create_layer(raster_key, 'diffraction', fill=None)
+            
+            # Cells of the disc in line of sight of the antenna, counted on the way
+            los_cells = 0
+            for rows in iter_row_chunks(grid.shape[0], chunk_rows):
+                clearance = profiles.cell_clearance(mobile_height, rows)
+                clearance_layer[rows] = clearance
+                los_cells += int(np.count_nonzero((clearance >= 0) & (grid.distances(rows) <= grid.radius)))
+                if los_layer is not None:
+                    los_layer[rows] = line_of_sight(clearance, default=(params.los_condition or 'LOS') == 'LOS')
+                if profile_diffraction is not None:
+                    loss = profile_diffraction.cell_loss(params.diffraction_method, rows)
+                    diffraction_layer[rows] = line_of_sight_only(loss, los_layer[rows]) if is_tr38901 else loss
+            
+            clearance_layer.flush()
+            del clearance_layer
+            if los_layer is not None:
+                los_layer.flush()
+                del los_layer
+                kernel_classes = store.reader(raster_key, 'line_of_sight')
+            if profile_diffraction is not None:
+                diffraction_layer.flush()
+                del diffraction_layer
+                diffraction = store.reader(raster_key, 'diffraction')
+        
+        # Land cover: Hata area type of every cell from the clutter raster (the
+        # cells outside of it keep terrain_type), one kernel per area type; a
+        # raster given to a model without area types is reported in the warnings
+        warnings = []
+        if params.clutter_raster and clutter_warning(params.propagation_model):
+            warnings.append(clutter_warning(params.propagation_model))
+        elif params.clutter_raster and kernel is not None:
+            clutter = open_clutter_raster(params.clutter_raster)
+            clutter_layer = store.create_layer(raster_key, 'clutter', dtype=np.uint8, fill=None)
+            for rows in iter_row_chunks(grid.shape[0], chunk_rows):
+                clutter_layer[rows] = clutter.cell_classes(grid, rows, default=AREA_TYPES.index(params.terrain_type))
+            clutter_layer.flush()
+            del clutter_layer
+            kernel_classes = store.reader(raster_key, 'clutter')
+            class_kernels = [compile_model(params, terrain_type=area_type) for area_type in AREA_TYPES]
+    except Exception:
+        store.delete(raster_key)
+        raise
+    
+    # Population raster, resampled on the grid (uniform population_density otherwise)
+    population = open_population_raster(params.population_raster) if params.population_raster else None
+    
+    # Signal classes of the technology, best first
+    bands = signal_bands(params.technology)
+    thresholds = [band['min_signal'] for band in bands]
+    
+    aggregator = CoverageAggregator(grid.cell_area, params.population_density, band_count=len(bands))
+    encoder = RasterEncoder(params.location.x, params.location.y, grid.x[0], grid.y[0], grid.cell_size, grid.shape)
+    
+    # Row evaluator with every parameter bound (plain values only, so it can
+    # be sent once to the worker processes)
+    evaluate_rows = partial(
+        evaluate_grid_rows,
+        kernel,
+        grid,
+        antenna_power=params.antenna_power,
+        frequency=params.frequency,
+        mode=params.evaluation_mode,
+        fallback=params.validity_fallback,
+        classes=kernel_classes,
+        class_kernels=class_kernels,
+        diffraction=diffraction
+    )
+    
+    # The grid is evaluated by blocks of rows; each block is folded into the
+    # running aggregates and written out before the next one is computed.
+    # Large grids are split into tiles evaluated across a process pool.
+    workers = settings.SIMULATION_WORKERS
+    if workers > 1 and grid.cell_count >= settings.SIMULATION_PARALLEL_MIN_CELLS:
+        # Several tiles per worker to balance the load (the tiles close to
+        # the antenna are the most expensive in ADAPTIVE mode), in multiples
+        # of the adaptive lattice step
+        tile_rows = -(-grid.shape[0] // (4 * workers))
+        tile_rows = min(settings.SIMULATION_CHUNK_ROWS, -(-tile_rows // ADAPTIVE_COARSE_STEP) * ADAPTIVE_COARSE_STEP)
+        chunks = evaluate_chunks_parallel(grid.shape[0], tile_rows, evaluate_rows, workers)
     else:
-        coverage_percentage = 0
+        chunks = evaluate_chunks(grid.shape[0], chunk_rows, evaluate_rows)
     
-    # Calculate population covered
-    if params.population_density:
-        population_covered = int(covered_area * params.population_density)
+    try:
+        with closing(chunks):
+            # Signal and band rasters written to the result store as they are computed
+            raster = store.create_layer(raster_key, 'signal', fill=None)
+            band_raster = store.create_layer(raster_key, 'band', dtype=np.uint8, fill=None)
+            if population is not None:
+                population_layer = store.create_layer(raster_key, 'population', fill=None)
+            
+            report(0.05, 'evaluation')
+            for rows, signal, stats in chunks:
+                classes = classify_bands(signal, thresholds)
+                # Inhabitants of the cells: windowed read of the population tiles under the rows
+                cell_population = population.cell_population(grid, rows) if population is not None else None
+                aggregator.add(signal, bands=classes, population=cell_population, **stats)
+                raster[rows] = signal
+                band_raster[rows] = classes
+                if population is not None:
+                    population_layer[rows] = cell_population
+                
+                # Compact int16 raster stored with the result
+                encoder.write(signal)
+                
+                if on_chunk is not None:
+                    on_chunk(grid, rows, signal, aggregator)
+                report(0.05 + 0.8 * rows.stop / grid.shape[0], 'evaluation')
+            
+            # Coarser levels for the maps (level 0 is the signal raster itself),
+            # stored as layers next to it; only their geometry goes in the row
+            pyramid = build_pyramid(raster, grid.x[0], grid.y[0], grid.cell_size)
+            for level in pyramid[1:]:
+                store.create_layer(raster_key, level_layer(level['level']), fill=None,
+                                   shape=level['values'].shape)[:] = level['values']
+            signal_pyramid = {
+                'center': [params.location.x, params.location.y],
+                'levels': [level_to_json(level) for level in pyramid],
+            }
+            raster.flush()
+            if population is not None:
+                population_layer.flush()
+                del population_layer
+            del raster, pyramid
+        
+        signal_raster = encoder.finish()
+        
+        report(0.85, 'polygons')
+        
+        # Coverage multipolygon traced from the covered cells (-100 dBm
+        # threshold) of the stored signal raster (a few polygons with holes
+        # instead of one square per cell)
+        coverage_area = coverage_multipolygon(store.layer(raster_key, 'signal') >= aggregator.threshold, grid,
+                                              simplify=settings.SIMULATION_CONTOUR_SIMPLIFY)
+        
+        # One polygon set per signal class, traced from the band raster
+        band_geometries = [
+            coverage_multipolygon(band_raster == rank, grid, simplify=settings.SIMULATION_CONTOUR_SIMPLIFY)
+            for rank in range(1, len(bands) + 1)
+        ]
+        band_raster.flush()
+        del band_raster
+        
+        # Calculate coverage percentage (cells have a fixed metric area)
+        if params.radius > 0:
+            total_area = np.pi * (params.radius ** 2)
+            coverage_percentage = (aggregator.covered_area / total_area) * 100
+        else:
+            coverage_percentage = 0
+        
+        # Calculate population covered
+        population_covered = aggregator.population_covered
+        
+        # Save the results
+        report(0.95, 'saving')
+        result = SimulationResult.objects.create(
+            simulation=params.simulation,
+            coverage_area=coverage_area,
+            coverage_percentage=coverage_percentage,
+            population_covered=population_covered,
+            signal_raster=signal_raster,
+            fallback_cells=aggregator.fallback_cells,
+            interpolation_error=aggregator.interpolation_error,
+            model_evaluations=aggregator.model_evaluations,
+            signal_histogram=aggregator.histogram(),
+            signal_pyramid=signal_pyramid,
+            raster_key=raster_key
+        )
+        
+        result_bands = SignalBand.objects.bulk_create([
+            SignalBand(
+                result=result,
+                rank=rank,
+                name=band['name'],
+                label=band['label'],
+                color=band.get('color', ''),
+                min_signal=band['min_signal'],
+                max_signal=band['max_signal'],
+                area=aggregator.band_area(rank),
+                population_covered=aggregator.band_population(rank),
+                geometry=geometry
+            )
+            for rank, (band, geometry) in enumerate(zip(bands, band_geometries), start=1)
+        ])
+    except Exception:
+        store.delete(raster_key)
+        raise
+    
+    # Model evaluations saved compared to evaluating every cell of the disc
+    if aggregator.model_evaluations is not None:
+        evaluations_saved = aggregator.grid_cells - aggregator.model_evaluations
     else:
-        population_covered = None
-    
-    # Save the results
-    result = SimulationResult.objects.create(
-        simulation=params.simulation,
-        coverage_area=coverage_area,
-        coverage_percentage=coverage_percentage,
-        population_covered=population_covered,
-        signal_strength_data=signal_strength
-    )
+        evaluations_saved = None
     
     return {
+        'result_id': result.id,
         'coverage_percentage': coverage_percentage,
         'population_covered': population_covered,
-        'signal_strength_data': signal_strength
+        'fallback_cells': aggregator.fallback_cells,
+        'interpolation_error': aggregator.interpolation_error,
+        'model_evaluations': aggregator.model_evaluations,
+        'evaluations_saved': evaluations_saved,
+        'los_cells': los_cells,
+        'warnings': warnings,
+        'signal_histogram': aggregator.histogram(),
+        'signal_bands': [band_to_json(band) for band in result_bands],
+    }
+
+# Scalar results of a run kept with its job
+RESULT_SUMMARY_FIELDS = (
+    'result_id', 'coverage_percentage', 'population_covered', 'fallback_cells', 'interpolation_error',
+    'model_evaluations', 'evaluations_saved', 'los_cells', 'warnings',
+)
+
+def result_payload(result, summary, legacy=False):
+    """
+    Full result of a run (as returned by run_propagation_model) rebuilt from
+    the stored SimulationResult and the summary of its job, with the encoded
+    signal raster. The legacy {"lon,lat": dBm} dictionary is only added when
+    legacy is True (old clients), or for results that only have it.
+    """
+    payload = {
+        **summary,
+        'signal_histogram': result.signal_histogram,
+        'signal_bands': [band_to_json(band) for band in result.signal_bands.all()],
+        'signal_raster': raster_to_json(result.signal_raster) if result.signal_raster else None,
+    }
+    if legacy or not result.signal_raster:
+        payload['signal_strength_data'] = result.signal_strength()
+    return payload
+
+def job_url(request, name, *args):
+    """Absolute URL of a view."""
+    return request.build_absolute_uri(reverse(name, args=args))
+
+def job_status_code(job):
+    """Status of the response to a run request: 200 if already done (cache hit), 202 if queued."""
+    return status.HTTP_200_OK if job.state == 'SUCCEEDED' else status.HTTP_202_ACCEPTED
+
+def job_to_json(job, request):
+    """
+    API representation of a SimulationJob, with links to the results once
+    it has succeeded.
+    """
+    links = {
+        'status': job_url(request, 'job_status', job.id),
+        'events': job_url(request, 'job_events', job.id),
+    }
+    if job.state == 'SUCCEEDED' and job.sweep is not None:
+        links['result'] = job_url(request, 'job_result', job.id)
+    elif job.state == 'SUCCEEDED' and job.result is not None:
+        simulation_id = job.simulation_id
+        links.update({
+            'result': job_url(request, 'job_result', job.id),
+            'simulation': job_url(request, 'simulation-detail', simulation_id),
+            'coverage': job_url(request, 'coverage_level', simulation_id),
+            'export': job_url(request, 'export_simulation_pdf', simulation_id),
+            'rasters': {
+                layer: job_url(request, 'raster_layer', simulation_id, layer)
+                for layer in (get_result_store().layers(job.result.raster_key) if job.result.raster_key else [])
+            },
+        })
+    
+    # A job following an identical in-flight job reports the progress of that job
+    run = job.leader if job.leader is not None and job.state in ('QUEUED', 'RUNNING') else job
+    
+    return {
+        'job_id': str(job.id),
+        'simulation_id': job.simulation_id,
+        'state': run.state,
+        'progress': run.progress,
+        'stage': run.stage,
+        'leader_id': str(job.leader_id) if job.leader_id else None,
+        'sweep': job.sweep,
+        'summary': job.summary,
+        'cached': job.stage == 'cached',
+        'error': job.error or None,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'links': links,
+    }
+
+def band_to_json(band, geometry=True):
+    """
+    API representation of a SignalBand (geometry as a GeoJSON object,
+    left out when geometry is False).
+    """
+    data = {
+        'rank': band.rank,
+        'name': band.name,
+        'label': band.label,
+        'color': band.color,
+        'min_signal': band.min_signal,
+        'max_signal': band.max_signal,
+        'area': band.area,
+        'population_covered': band.population_covered,
     }
+    if geometry:
+        data['geometry'] = json.loads(band.geometry.geojson)
+    return data
+
+def export_key(simulation):
+    """Key of the PDF report of a simulation, changed by any edit of the simulation or of its results."""
+    parameters = list(simulation.parameters.values_list('id', 'updated_at'))
+    results = list(simulation.all_results().values_list('id', flat=True))
+    state = json.dumps([simulation.id, simulation.updated_at, parameters, results], default=str)
+    return f"export:{hashlib.sha256(state.encode('utf-8')).hexdigest()}"
 
 @csrf_exempt
 @api_view(['GET'])
@@ -249,11 +652,195 @@ def export_simulation_pdf(request,simulation_id):
     """
     simulation = get_object_or_404(Simulation, id=simulation_id, user=None)
     
-    # Generate PDF
-    pdf_file = generate_pdf_report(simulation)
+    # Generate PDF: concurrent exports of the same simulation state share one
+    # report (and one headless browser), across processes through the cache
+    pdf_file = coalesce(export_key(simulation), lambda: generate_pdf_report(simulation).getvalue(),
+                        timeout=settings.SIMULATION_EXPORT_TIMEOUT)
     
     # Create response
     response = HttpResponse(pdf_file, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="simulation_{simulation_id}.pdf"'
     
+    return response
+
+@csrf_exempt
+@api_view(['GET'])
+#@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
+def coverage_level(request, simulation_id):
+    """
+    Return the coverage raster of a simulation at the pyramid level matching
+    the map zoom (?zoom=) or at an explicit level (?level=), encoded as the
+    stored signal raster; the legacy {"lon,lat": dBm} dictionary is only
+    added on request (?legacy=1).
+    """
+    simulation = get_object_or_404(Simulation, id=simulation_id)
+    result = simulation.all_results().first()
+    if result is None or not result.signal_pyramid or not result.signal_raster:
+        return Response({'error': 'Aucune couverture disponible pour cette simulation'},
+                        status=status.HTTP_404_NOT_FOUND)
+    
+    levels = result.signal_pyramid['levels']
+    center_lon, center_lat = result.signal_pyramid['center']
+    try:
+        if 'level' in request.query_params:
+            level = min(max(int(request.query_params['level']), 0), len(levels) - 1)
+        else:
+            zoom = float(request.query_params.get('zoom', 0))
+            level = select_level([l['cell_size'] for l in levels], zoom, center_lat)
+    except ValueError:
+        return Response({'error': 'Paramètre level ou zoom invalide'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if level == 0:
+        signal_raster = result.signal_raster
+    else:
+        if 'layer' in levels[level]:
+            # Level stored in the result store
+            values = result.open_raster_layer(levels[level]['layer'])
+        else:
+            values = level_from_json(levels[level])['values']
+        signal_raster = CompactRaster.from_signal(
+            values, center_lon, center_lat, levels[level]['x0'], levels[level]['y0'], levels[level]['cell_size']
+        ).to_bytes()
+    
+    data = {
+        'level': level,
+        'levels': len(levels),
+        'cell_size': levels[level]['cell_size'],
+        'signal_bands': [band_to_json(band, geometry=False) for band in result.signal_bands.all()],
+        'signal_raster': raster_to_json(signal_raster),
+    }
+    if legacy_points_requested(request.query_params):
+        data['signal_strength_data'] = (
+            result.signal_strength() if level == 0 else CompactRaster.from_bytes(signal_raster).to_signal_strength()
+        )
+    # The level as a .npy layer, fetched with range requests (see raster_layer)
+    if result.raster_key and 'layer' in levels[level]:
+        data['raster'] = job_url(request, 'raster_layer', simulation_id, levels[level]['layer'])
+    return Response(data)
+
+@csrf_exempt
+@api_view(['GET'])
+#@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
+def raster_layer(request, simulation_id, layer):
+    """
+    Serve a layer of the result store as a .npy file, with support for
+    HTTP range requests (clients can read only the rows they need).
+    """
+    simulation = get_object_or_404(Simulation, id=simulation_id)
+    result = simulation.all_results().first()
+    store = get_result_store()
+    if result is None or not result.raster_key or layer not in store.layers(result.raster_key):
+        return Response({'error': 'Couche de résultat introuvable'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return ranged_file_response(
+        request,
+        store.path(result.raster_key, layer),
+        filename=f"simulation_{simulation_id}_{layer}.npy"
+    )
+
+@csrf_exempt
+@api_view(['GET'])
+#@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
+def population_rasters(request):
+    """
+    List the registered population rasters (values of population_raster).
+    """
+    return Response({'population_rasters': list_population_rasters()})
+
+@csrf_exempt
+@api_view(['GET'])
+#@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
+def clutter_rasters(request):
+    """
+    List the registered land-cover rasters (values of clutter_raster).
+    """
+    return Response({'clutter_rasters': list_clutter_rasters()})
+
+@csrf_exempt
+@api_view(['GET'])
+#@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
+def result_cache(request):
+    """
+    Size, bound and hit/miss counters of the result cache.
+    """
+    return Response(cache_stats())
+
+@csrf_exempt
+@api_view(['GET'])
+#@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
+def job_status(request, job_id):
+    """
+    State and progress of a simulation job, with the result links once done.
+    """
+    job = get_object_or_404(SimulationJob.objects.select_related('result', 'leader'), id=job_id)
+    return Response(job_to_json(job, request))
+
+@csrf_exempt
+@api_view(['GET'])
+#@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
+def job_result(request, job_id):
+    """
+    Result of a succeeded simulation job (same content as the former
+    synchronous run response), or table of a succeeded sweep.
+    """
+    job = get_object_or_404(SimulationJob.objects.select_related('result'), id=job_id)
+    if job.state == 'SUCCEEDED' and job.sweep is not None:
+        return Response({'simulation_id': job.simulation_id, 'sweep': job.summary})
+    if job.state != 'SUCCEEDED' or job.result is None:
+        return Response({'error': "La simulation n'est pas terminée", 'state': job.state},
+                        status=status.HTTP_409_CONFLICT)
+    
+    return Response({
+        'simulation_id': job.simulation_id,
+        'result': result_payload(job.result, job.summary, legacy=legacy_points_requested(request.query_params))
+    })
+
+async def job_events(request, job_id):
+    """
+    Server-Sent Events stream of a simulation job: progress, stage timings,
+    running coverage statistics and preview rows, then a final 'end' event
+    with the state and links of the job (see simulation.live). Streamed
+    without holding a thread per listener under the ASGI application; under
+    WSGI every request returns the events recorded so far and the client
+    reconnects for the next ones.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Méthode non autorisée'}, status=405)
+    if not await SimulationJob.objects.filter(id=job_id).aexists():
+        return JsonResponse({'error': 'Tâche introuvable'}, status=404)
+    
+    try:
+        after = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        after = 0
+    
+    def end_data():
+        job = SimulationJob.objects.select_related('result', 'leader').filter(id=job_id).first()
+        if job is None:
+            return {'job_id': str(job_id), 'state': None, 'error': 'Tâche introuvable'}
+        return job_to_json(job, request)
+    
+    if not isinstance(request, ASGIRequest):
+        # WSGI buffers streamed responses: no stream held open for the job
+        response = HttpResponse(
+            await event_batch(job_id, after, sync_to_async(end_data)),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        return response
+    
+    response = StreamingHttpResponse(
+        event_stream(job_id, after, sync_to_async(end_data)),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Proxies (nginx) must not buffer the stream
+    response['X-Accel-Buffering'] = 'no'
     return response
\ No newline at end of file
@@ -83,7 +83,7 @@ def generate_pdf_report(simulation):
     elements.append(Paragraph("Résultats de Simulation", styles['Heading2']))
     elements.append(Spacer(1, 6))
     
-    result = simulation.results.first()
+    result = simulation.all_results().first()
     if result:
         result_data = [
             ["Métrique", "Valeur"],
@@ -93,6 +93,13 @@ def generate_pdf_report(simulation):
         if result.population_covered:
             result_data.append(["Population couverte", f"{result.population_covered} habitants"])
         
+        # Area (and population) of every signal class
+        for band in result.signal_bands.all():
+            band_value = f"{band.area:.2f} km²"
+            if band.population_covered is not None:
+                band_value += f" - {band.population_covered} habitants"
+            result_data.append([f"Signal {band.label.lower()} (≥ {band.min_signal:g} dBm)", band_value])
+        
         result_table = Table(result_data, colWidths=[200, 300])
         result_table.setStyle(TableStyle([
             ('BACKGROUND', (0, 0), (1, 0), colors.grey),
@@ -108,7 +115,7 @@ def generate_pdf_report(simulation):
         elements.append(Spacer(1, 12))
         
         # Generate coverage map
-        if result.signal_strength_data:
+        if result.signal_raster:
             elements.append(Paragraph("Carte de Couverture", styles['Heading2']))
             elements.append(Spacer(1, 6))
             
@@ -156,59 +163,26 @@ def create_coverage_map(params, result):
         icon=folium.Icon(color='red', icon='antenna', prefix='fa')
     ).add_to(m)
     
-    # Add coverage circles
-    signal_data = result.signal_strength_data
-    
-    # Group signal strengths into categories
-    excellent = []
-    good = []
-    fair = []
-    poor = []
-    
-    for coord, signal in signal_data.items():
-        if isinstance(coord, str):
-            lon, lat = map(float, coord.split(','))
-        else:
-            lon, lat = coord
-        #lon, lat = map(float, coord.split(','))
-        if signal >= -70:
-            excellent.append([lat, lon])
-        elif signal >= -85:
-            good.append([lat, lon])
-        elif signal >= -100:
-            fair.append([lat, lon])
-        else:
-            poor.append([lat, lon])
-    
-    # Add heatmap layers
-    if excellent:
-        HeatMap(
-            excellent,
-            radius=15,
-            gradient={0.4: 'blue', 0.65: 'lime', 1: 'red'},
-            min_opacity=0.5,
-            max_val=1.0,
-            blur=10
-        ).add_to(m)
-    
-    if good:
-        HeatMap(
-            good,
-            radius=12,
-            gradient={0.4: 'green', 0.65: 'yellow', 1: 'red'},
-            min_opacity=0.3,
-            max_val=0.8,
-            blur=15
+    # Signal classes precomputed with the result, one layer per band
+    bands = list(result.signal_bands.all())
+    for band in bands:
+        folium.GeoJson(
+            band.geometry.geojson,
+            name=band.label,
+            style_function=lambda feature, color=band.color: {
+                'fillColor': color,
+                'color': color,
+                'weight': 1,
+                'fillOpacity': 0.5
+            }
         ).add_to(m)
     
-    if fair:
-        HeatMap(
-            fair,
-            radius=10,
-            gradient={0.4: 'blue', 0.65: 'purple', 1: 'red'},
-            min_opacity=0.2,
-            max_val=0.6,
-            blur=20
+    # Results without bands: coverage area only
+    if not bands and not result.coverage_area.empty:
+        folium.GeoJson(
+            result.coverage_area.geojson,
+            name="Couverture",
+            style_function=lambda feature: {'fillColor': '#4CAF50', 'color': '#4CAF50', 'weight': 1, 'fillOpacity': 0.5}
         ).add_to(m)
         
     from io import BytesIO
@@ -296,7 +270,7 @@ def generate_pdf_report(simulation):
     elements.append(Paragraph("Résultats de Simulation", styles['Heading2']))
     elements.append(Spacer(1, 6))
     
-    result = simulation.results.first()
+    result = simulation.all_results().first()
     if result:
         result_data = [
             ["Métrique", "Valeur"],
@@ -306,6 +280,13 @@ def generate_pdf_report(simulation):
         if result.population_covered:
             result_data.append(["Population couverte", f"{result.population_covered} habitants"])
         
+        # Area (and population) of every signal class
+        for band in result.signal_bands.all():
+            band_value = f"{band.area:.2f} km²"
+            if band.population_covered is not None:
+                band_value += f" - {band.population_covered} habitants"
+            result_data.append([f"Signal {band.label.lower()} (≥ {band.min_signal:g} dBm)", band_value])
+        
         result_table = Table(result_data, colWidths=[200, 300])
         result_table.setStyle(TableStyle([
             ('BACKGROUND', (0, 0), (1, 0), colors.grey),
@@ -321,7 +302,7 @@ def generate_pdf_report(simulation):
         elements.append(Spacer(1, 12))
         
         # Generate coverage map
-        if result.signal_strength_data:
+        if result.signal_raster:
             elements.append(Paragraph("Carte de Couverture", styles['Heading2']))
             elements.append(Spacer(1, 6))
             
@@ -369,59 +350,26 @@ def create_coverage_map(params, result):
         icon=folium.Icon(color='red', icon='antenna', prefix='fa')
     ).add_to(m)
     
-    # Add coverage circles
-    signal_data = result.signal_strength_data
-    
-    # Group signal strengths into categories
-    excellent = []
-    good = []
-    fair = []
-    poor = []
-    
-    for coord, signal in signal_data.items():
-        if isinstance(coord, str):
-            lon, lat = map(float, coord.split(','))
-        else:
-            lon, lat = coord
-        #lon, lat = map(float, coord.split(','))
-        if signal >= -70:
-            excellent.append([lat, lon])
-        elif signal >= -85:
-            good.append([lat, lon])
-        elif signal >= -100:
-            fair.append([lat, lon])
-        else:
-            poor.append([lat, lon])
-    
-    # Add heatmap layers
-    if excellent:
-        HeatMap(
-            excellent,
-            radius=15,
-            gradient={0.4: 'blue', 0.65: 'lime', 1: 'red'},
-            min_opacity=0.5,
-            max_val=1.0,
-            blur=10
-        ).add_to(m)
-    
-    if good:
-        HeatMap(
-            good,
-            radius=12,
-            gradient={0.4: 'green', 0.65: 'yellow', 1: 'red'},
-            min_opacity=0.3,
-            max_val=0.8,
-            blur=15
+    # Signal classes precomputed with the result, one layer per band
+    bands = list(result.signal_bands.all())
+    for band in bands:
+        folium.GeoJson(
+            band.geometry.geojson,
+            name=band.label,
+            style_function=lambda feature, color=band.color: {
+                'fillColor': color,
+                'color': color,
+                'weight': 1,
+                'fillOpacity': 0.5
+            }
         ).add_to(m)
     
-    if fair:
-        HeatMap(
-            fair,
-            radius=10,
-            gradient={0.4: 'blue', 0.65: 'purple', 1: 'red'},
-            min_opacity=0.2,
-            max_val=0.6,
-            blur=20
+    # Results without bands: coverage area only
+    if not bands and not result.coverage_area.empty:
+        folium.GeoJson(
+            result.coverage_area.geojson,
+            name="Couverture",
+            style_function=lambda feature: {'fillColor': '#4CAF50', 'color': '#4CAF50', 'weight': 1, 'fillOpacity': 0.5}
         ).add_to(m)
         
     m.save(temp_html)
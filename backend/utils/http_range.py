@@ -0,0 +1,60 @@
+import os
+import re
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+
+def _read_range(path, start, length):
+    """Yield length bytes of the file starting at offset start."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def ranged_file_response(request, path, content_type='application/octet-stream', filename=None):
+    """
+    Serve a file, honouring a single-range "Range: bytes=" request header.
+
+    Returns a FileResponse with the whole file when there is no (or a
+    multi-range) Range header, a 206 response with the requested bytes
+    otherwise, and 416 for a range outside of the file.
+    """
+    size = os.path.getsize(path)
+    match = RANGE_HEADER.match(request.headers.get('Range', '').strip())
+
+    if match is None or match.groups() == ('', ''):
+        response = FileResponse(open(path, 'rb'), content_type=content_type,
+                                as_attachment=filename is not None, filename=filename or '')
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+
+    if start >= size or start > end:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    length = end - start + 1
+    response = StreamingHttpResponse(_read_range(path, start, length), status=206, content_type=content_type)
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    if filename:
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
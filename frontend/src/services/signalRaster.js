@@ -0,0 +1,60 @@
+// Décodage des rasters de signal compacts renvoyés par l'API (format RSR1 de
+// simulation.raster) : en-tête fixe puis int16 en centi-dBm compressés (zlib)
+
+// magic (4 octets), 5 doubles, 2 entiers non signés
+const HEADER_SIZE = 52;
+const EARTH_RADIUS = 6371008.8; // m
+
+function base64ToBytes(data) {
+  const binary = atob(data);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  return bytes;
+}
+
+async function inflate(bytes) {
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+  return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+// Position WGS84 d'un point du repère local (projection azimutale équidistante
+// centrée sur l'antenne, x vers l'est et y vers le nord, en m)
+function localToLatLng(centerLon, centerLat, x, y) {
+  const rho = Math.hypot(x, y);
+  if (rho === 0) {
+    return [centerLat, centerLon];
+  }
+  const c = rho / EARTH_RADIUS;
+  const phi = centerLat * Math.PI / 180;
+  const lat = Math.asin(Math.cos(c) * Math.sin(phi) + y * Math.sin(c) * Math.cos(phi) / rho);
+  const lon = centerLon * Math.PI / 180
+    + Math.atan2(x * Math.sin(c), rho * Math.cos(phi) * Math.cos(c) - y * Math.sin(phi) * Math.sin(c));
+  return [lat * 180 / Math.PI, lon * 180 / Math.PI];
+}
+
+/**
+ * Cellules d'un raster de signal de l'API
+ * @param {Object} raster - signal_raster d'un résultat (en-tête et données en base64)
+ * @returns {Promise<Array>} - [lat, lng, signal en dBm] de chaque cellule ayant une valeur
+ */
+export async function decodeSignalRaster(raster) {
+  const bytes = base64ToBytes(raster.data);
+  const codes = new Int16Array((await inflate(bytes.subarray(HEADER_SIZE))).buffer);
+  const [nx, ny] = raster.shape;
+  const [centerLon, centerLat] = raster.center;
+  const step = raster.cell_size * 1000; // m
+
+  const cells = [];
+  for (let i = 0; i < nx; i++) {
+    for (let j = 0; j < ny; j++) {
+      const code = codes[i * ny + j];
+      if (code !== raster.nodata) {
+        const [lat, lng] = localToLatLng(centerLon, centerLat, raster.x0 + i * step, raster.y0 + j * step);
+        cells.push([lat, lng, code / raster.scale]);
+      }
+    }
+  }
+  return cells;
+}
@@ -12,6 +12,57 @@ if (token) {
   axios.defaults.headers.common['Authorization'] = `Token ${token}`
 }
 
+// Reconnexions successives sans événement reçu avant le repli sur l'interrogation
+const MAX_STREAM_ERRORS = 3
+
+// Suivi d'une tâche de simulation jusqu'à sa fin : flux d'événements (progression,
+// statistiques, aperçu) si disponible, interrogation de l'URL de statut sinon
+function followJob(job, commit) {
+  if (typeof EventSource === 'undefined' || !job.links.events) {
+    return pollJob(job, commit)
+  }
+  return new Promise(resolve => {
+    const source = new EventSource(job.links.events)
+    const progress = { state: job.state, stage: job.stage, progress: job.progress, stats: null, timings: {} }
+    const preview = { grid: null, rows: {} }
+    let errors = 0
+    const listen = (kind, handler) => source.addEventListener(kind, event => {
+      errors = 0
+      handler(JSON.parse(event.data))
+    })
+    listen('progress', data => commit('SET_JOB_PROGRESS', Object.assign(progress, data, { state: 'RUNNING' })))
+    listen('stage', data => commit('SET_JOB_PROGRESS', Object.assign(progress, { stage: data.stage, timings: data.timings })))
+    listen('stats', data => commit('SET_JOB_PROGRESS', Object.assign(progress, { stats: data })))
+    listen('grid', data => commit('SET_JOB_PREVIEW', Object.assign(preview, { grid: data })))
+    listen('preview', data => {
+      data.values.forEach((values, index) => { preview.rows[data.row + index] = values })
+      commit('SET_JOB_PREVIEW', preview)
+    })
+    listen('end', data => {
+      source.close()
+      resolve(data)
+    })
+    source.onerror = () => {
+      // Flux fermé ou indisponible (proxy, serveur arrêté...) : l'EventSource se reconnecte
+      // tant qu'il reçoit des événements, repli sur l'interrogation sinon
+      errors += 1
+      if (source.readyState === EventSource.CLOSED || errors >= MAX_STREAM_ERRORS) {
+        source.close()
+        resolve(pollJob(job, commit))
+      }
+    }
+  })
+}
+
+async function pollJob(job, commit) {
+  while (job.state === 'QUEUED' || job.state === 'RUNNING') {
+    commit('SET_JOB_PROGRESS', { state: job.state, stage: job.stage, progress: job.progress })
+    await new Promise(resolve => setTimeout(resolve, 1000))
+    job = (await axios.get(job.links.status)).data
+  }
+  return job
+}
+
 export default createStore({
   modules: {
     dashboard
@@ -22,6 +73,8 @@ export default createStore({
     simulations: [],
     currentSimulation: null,
     loading: false,
+    jobProgress: null,
+    jobPreview: null,
     error: null
   },
   getters: {
@@ -30,9 +83,17 @@ export default createStore({
     simulations: state => state.simulations,
     currentSimulation: state => state.currentSimulation,
     isLoading: state => state.loading,
+    jobProgress: state => state.jobProgress,
+    jobPreview: state => state.jobPreview,
     error: state => state.error
   },
   mutations: {
+    SET_JOB_PROGRESS(state, progress) {
+      state.jobProgress = progress && { ...progress }
+    },
+    SET_JOB_PREVIEW(state, preview) {
+      state.jobPreview = preview && { ...preview, rows: { ...preview.rows } }
+    },
     SET_USER(state, user) {
       state.user = user
     },
@@ -297,14 +358,26 @@ export default createStore({
     async runSimulation({ commit, state }, simulationData) {
       try {
         commit('SET_LOADING', true)
-        const response = await axios.post(`${API_URL}/simulation/run/`, simulationData, {
+        // La simulation est mise en file : suivi de la tâche jusqu'à sa fin
+        let { data: job } = await axios.post(`${API_URL}/simulation/run/`, simulationData, {
           //headers: { Authorization: `Token ${state.token}` }
         })
+        if (job.state === 'QUEUED' || job.state === 'RUNNING') {
+          job = await followJob(job, commit)
+        }
+        if (job.state !== 'SUCCEEDED') {
+          const error = new Error(job.error || 'La simulation a échoué')
+          error.response = { data: { error: job.error } }
+          throw error
+        }
+        const response = await axios.get(job.links.result)
         return response.data
       } catch (error) {
         commit('SET_ERROR', error.response ? error.response.data : error.message)
         throw error
       } finally {
+        commit('SET_JOB_PROGRESS', null)
+        commit('SET_JOB_PREVIEW', null)
         commit('SET_LOADING', false)
       }
     },
@@ -343,6 +416,18 @@ export default createStore({
         commit('SET_ERROR', error.response ? error.response.data : error.message)
         throw error
       }
+    },
+    async fetchCoverageLevel({ commit }, { simulationId, zoom }) {
+      // Niveau de la pyramide de couverture adapté au zoom de la carte
+      try {
+        const response = await axios.get(`${API_URL}/simulation/coverage/${simulationId}/`, {
+          params: { zoom }
+        })
+        return response.data
+      } catch (error) {
+        commit('SET_ERROR', error.response ? error.response.data : error.message)
+        throw error
+      }
     }
   }
 })
\ No newline at end of file